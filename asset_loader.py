@@ -0,0 +1,207 @@
+import os
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, BrokenExecutor, wait
+
+from mesh_bake import get_baked_path, is_fresh, bake, index_obj, get_header, read_mesh
+
+UPLOAD_BUDGET = 8*1024*1024 #bytes sent to the gpu per frame at most, whatever is streaming in
+IMAGE_WORKERS = 4 #image decoding threads (pygame lets go of the gil while decoding)
+MESH_WORKERS = 2 #obj parsing processes, only used when a mesh has no up to date baked file
+
+def prepare_mesh(link):
+    #runs in a worker process: bakes the obj, or parses and indexes it when its folder is read only
+    try:
+        bake(link, force=True)
+        return None
+    except OSError:
+        return index_obj(link)
+
+class MeshUpload:
+    #vertex then index data sent to their buffers in slices, then handed to the mesh registry
+    def __init__(self, loader, entry, link, header, vertices, indices):
+        self.loader = loader
+        self.entry = entry
+        self.link = link
+        self.header = header
+        self.vertices = vertices
+        self.indices = indices
+        self.buffer = self.get_buffer(vertices)
+        self.index_buffer = self.get_buffer(indices) if indices is not None else None
+        self.parts = [(self.buffer, vertices)]+([(self.index_buffer, indices)] if indices is not None else [])
+        self.part = 0
+        self.offset = 0
+        self.done = False
+
+    def get_buffer(self, array):
+        return self.loader.ctx.buffer(reserve=max(array.nbytes, 4))
+
+    def step(self, budget):
+        written = 0
+        while self.part < len(self.parts) and written < budget:
+            buffer, array = self.parts[self.part]
+            data = array.reshape(-1).view('u1')
+            size = int(min(budget-written, len(data)-self.offset))
+            buffer.write(data[self.offset:self.offset+size], offset=self.offset)
+            self.offset += size
+            written += size
+            if self.offset == len(data):
+                self.part += 1
+                self.offset = 0
+        if self.part == len(self.parts):
+            self.done = True
+            vao = self.loader.app.mesh.vao
+            vbo = vao.vbo.get_object(self.link, buffer=self.buffer, header=self.header, vertices=self.vertices,
+                                     index_buffer=self.index_buffer, indices=self.indices)
+            vao.registry.finish_load(self.entry, vbo)
+            self.loader.refresh_models(self.entry.names)
+        return written
+
+    def is_cancelled(self):
+        return self.entry.cancelled
+
+    def cancel(self):
+        self.buffer.release()
+        if self.index_buffer != None:
+            self.index_buffer.release()
+
+class TextureUpload:
+    #decoded image sent to its texture a few rows at a time, mipmaps are built once every row is there
+    def __init__(self, loader, handle, size, data, dropped):
+        self.loader = loader
+        self.handle = handle
+        self.size = size
+        self.data = data
+        self.dropped = dropped
+        self.texture = loader.ctx.texture(size=size, components=3)
+        self.row = 0
+        self.done = False
+
+    def step(self, budget):
+        width, height = self.size
+        rows = int(min(max(1, budget//(width*3)), height-self.row))
+        start = self.row*width*3
+        self.texture.write(self.data[start:start+rows*width*3], viewport=(0, self.row, width, rows))
+        self.row += rows
+        if self.row == height:
+            self.done = True
+            self.handle.set_texture(self.texture, self.size, self.dropped)
+            self.handle.pending = False
+            self.handle.registry.trim(self.handle)
+        return rows*width*3
+
+    def is_cancelled(self):
+        #the registry was destroyed meanwhile
+        return self.handle.registry.handles.get(self.handle.key) is not self.handle
+
+    def cancel(self):
+        self.texture.release()
+
+class AssetLoader:
+    #parses and decodes on worker pools, the gpu uploads happen on the render thread under a per frame budget
+    #until then the meshes show the cube and the textures the white image
+    def __init__(self, app, budget=UPLOAD_BUDGET):
+        self.app = app
+        self.ctx = app.ctx
+        self.budget = budget
+        self.image_pool = ThreadPoolExecutor(IMAGE_WORKERS)
+        self.mesh_pool = None #started the first time an obj has to be parsed
+        self.jobs = [] #(future, callback, retry or None) running on the pools
+        self.uploads = [] #finished jobs waiting for the gpu, oldest first
+        self.uploaded_bytes = 0 #this frame
+
+    #meshes
+    def load_mesh(self, entry, link):
+        #the registry entry keeps its placeholder until the upload is done
+        if is_fresh(link):
+            self.add_mesh_upload(entry, link, None)
+            return
+        if self.mesh_pool == None:
+            self.mesh_pool = ProcessPoolExecutor(MESH_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        future = self.mesh_pool.submit(prepare_mesh, os.path.abspath(link))
+        #if the process pool cannot start (frozen or unguarded main module), the same work goes to a thread
+        retry = lambda: self.image_pool.submit(prepare_mesh, os.path.abspath(link))
+        self.jobs.append((future, lambda result: self.add_mesh_upload(entry, link, result), retry))
+
+    def add_mesh_upload(self, entry, link, parsed):
+        if entry.cancelled:
+            return
+        if parsed == None:
+            #baked: memory mapped, the slices go straight from the file to the buffer
+            header, vertices, indices = read_mesh(get_baked_path(link))
+        else:
+            vertices, indices, ranges, source_count, lods = parsed
+            header = get_header(vertices, ranges, indices, source_count, lods)
+        self.uploads.append(MeshUpload(self, entry, link, header, vertices, indices))
+
+    def refresh_models(self, names):
+        #models already placed with the placeholder take the real mesh (vao, bounds, mesh scale)
+        entities = self.app.entities
+        for obj in entities.objs:
+            if obj != None and obj.vao_name in names and entities.contains(obj):
+                obj.on_init_vao(obj.vao_name)
+                if hasattr(obj, 'shadow_vao'):
+                    obj.on_init()
+
+    #textures
+    def load_texture(self, handle, dropped=0):
+        handle.pending = True
+        future = self.image_pool.submit(handle.decode, dropped)
+        self.jobs.append((future, lambda result: self.add_texture_upload(handle, result, dropped), None))
+
+    def add_texture_upload(self, handle, result, dropped):
+        size, data = result
+        self.uploads.append(TextureUpload(self, handle, size, data, dropped))
+
+    #other files (world chunks), read on the threads
+    def load_file(self, reader, path, callback):
+        future = self.image_pool.submit(reader, path)
+        self.jobs.append((future, callback, None))
+
+    #once per frame, on the render thread
+    def update(self, budget=None):
+        budget = self.budget if budget == None else budget
+        for job in [job for job in self.jobs if job[0].done()]:
+            future, callback, retry = job
+            self.jobs.remove(job)
+            try:
+                result = future.result()
+            except BrokenExecutor:
+                if retry != None:
+                    self.jobs.append((retry(), callback, None))
+                continue
+            except Exception as error:
+                print(f"asset loading failed: {error}")
+                continue
+            callback(result)
+
+        self.uploaded_bytes = 0
+        while len(self.uploads) > 0 and self.uploaded_bytes < budget:
+            upload = self.uploads[0]
+            if upload.is_cancelled():
+                upload.cancel()
+                self.uploads.pop(0)
+                continue
+            self.uploaded_bytes += upload.step(budget-self.uploaded_bytes)
+            if upload.done:
+                self.uploads.pop(0)
+
+    def is_busy(self):
+        return len(self.jobs) > 0 or len(self.uploads) > 0
+
+    def finish(self):
+        #blocks until everything requested so far is on the gpu (saving, tests, benchmarks)
+        while self.is_busy():
+            wait([job[0] for job in self.jobs])
+            self.update(budget=float('inf'))
+
+    def get_stats(self):
+        return {'jobs': len(self.jobs), 'uploads': len(self.uploads), 'uploaded_bytes': self.uploaded_bytes, 'budget': self.budget}
+
+    def destroy(self):
+        self.image_pool.shutdown(wait=False, cancel_futures=True)
+        if self.mesh_pool != None:
+            self.mesh_pool.shutdown(wait=False, cancel_futures=True)
+        for upload in self.uploads:
+            upload.cancel()
+        self.uploads = []
+        self.jobs = []
@@ -0,0 +1,243 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy') #no window, pygame is only there for fonts and images
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+import sys
+import json
+import math
+import time
+import argparse
+import platform
+
+import numpy as np
+import glm
+
+from function import lerp_points, quadratic_interpolation_curves
+from main import GraphicEngine
+from model import Cube
+import lights
+from uniform_buffers import MAX_LIGHTS
+from cpu_profiler import COUNTERS
+
+RESOLUTION = (1280, 720)
+OBJECTS = 1000
+LIGHTS = 2
+LIGHT_TYPE = 'mixed' #point, directional or mixed (a sun, then point lights)
+POINT_LIGHTS = 0 #shadowless point lights (clustered_lights.py) on top of the shadowed ones
+FRAMES = 240 #measured per path
+WARMUP = 30 #frames drawn from the first pose before measuring (shaders, uploads, shadow maps)
+DELTA_TIME = 16 #ms between two frames, fixed so every run sees the same animation
+SPACING = 3.0 #ground per object, the scene grows with its object count
+SEED = 0
+PERCENTILES = (50, 90, 95, 99)
+TOLERANCE = 0.1 #slower than the baseline by more than this is a regression
+COMPARED = ('p50', 'p95') #statistics compared to the baseline
+
+#camera paths on a scene of half size 1: segments ('line', start, end) or ('curve', start, end, control)
+#and what the camera looks at, the scene center or the way ahead
+PATHS = {
+    'orbit': {'look': 'center', 'segments': [
+        ('curve', (1.2,0.6,0), (0,0.6,1.2), (1.2,0.6,1.2)),
+        ('curve', (0,0.6,1.2), (-1.2,0.6,0), (-1.2,0.6,1.2)),
+        ('curve', (-1.2,0.6,0), (0,0.6,-1.2), (-1.2,0.6,-1.2)),
+        ('curve', (0,0.6,-1.2), (1.2,0.6,0), (1.2,0.6,-1.2))]},
+    'flyover': {'look': 'ahead', 'segments': [
+        ('curve', (-1,0.3,-1), (0,0.1,0), (-0.6,0.05,0.2)),
+        ('curve', (0,0.1,0), (1,0.4,1), (0.6,0.05,-0.2))]},
+    'dolly': {'look': 'center', 'segments': [
+        ('line', (0,0.15,1.5), (0,0.05,0.1))]},
+}
+
+def get_path_point(path, t):
+    #point of the path at t in [0, 1], every segment takes the same time
+    segments = path['segments']
+    i = min(int(t*len(segments)), len(segments)-1)
+    local = t*len(segments)-i
+    segment = segments[i]
+    if segment[0] == 'line':
+        return lerp_points(segment[1], segment[2], local)
+    return quadratic_interpolation_curves(segment[1], segment[2], segment[3], local)
+
+def get_pose(path, t, half_size):
+    #(position, yaw, pitch) of the camera, in the angles of Camera
+    position = glm.vec3(get_path_point(path, t))*half_size
+    if path['look'] == 'center':
+        target = glm.vec3(0, 0, 0)
+    else:
+        target = glm.vec3(get_path_point(path, min(t+0.01, 1.0)))*half_size
+        if glm.length(target-position) < 1e-6:
+            target = position+glm.vec3(get_path_point(path, 1.0))-glm.vec3(get_path_point(path, 0.99))
+    direction = glm.normalize(target-position)
+    yaw = math.degrees(math.atan2(direction.z, direction.x))
+    pitch = max(-89, min(89, math.degrees(math.asin(max(-1, min(1, direction.y))))))
+    return position, yaw, pitch
+
+def get_stats(values):
+    values = np.asarray(values, dtype='f8')
+    stats = {'mean': float(values.mean()), 'min': float(values.min()), 'max': float(values.max())}
+    for percentile in PERCENTILES:
+        stats[f"p{percentile}"] = float(np.percentile(values, percentile))
+    return stats
+
+class BenchmarkEngine(GraphicEngine):
+    #the engine offscreen with a synthetic scene instead of the saved one, lights and world
+    def __init__(self, config):
+        self.config = config
+        self.half_size = math.sqrt(config['objects'])*SPACING/2
+        super().__init__(tuple(config['resolution']), headless=True)
+
+    def light_set_up(self):
+        rng = np.random.default_rng(self.config['seed']+1)
+        for i in range(self.config['lights']):
+            point = self.config['light_type'] == 'point' or (self.config['light_type'] == 'mixed' and i > 0)
+            if point:
+                position = (rng.uniform(-0.7, 0.7)*self.half_size, 4.0, rng.uniform(-0.7, 0.7)*self.half_size)
+                color = tuple(rng.uniform(80, 200, 3))
+                self.lights.append(lights.Light(self, position, color, 2.0, name=f"point{i}", param="point"))
+            else:
+                self.lights.append(lights.Light(self, (1.0, 30.0, 1.0), (210.0, 180.0, 160.0), 8.0, name=f"sun{i}"))
+        count = self.config.get('point_lights', 0)
+        if count > 0:
+            positions = np.stack([rng.uniform(-1, 1, count)*self.half_size, rng.uniform(1.0, 5.0, count), rng.uniform(-1, 1, count)*self.half_size], axis=1)
+            self.point_lights.add_many(positions, rng.uniform(80, 255, (count, 3)), rng.uniform(0.5, 2.0, count), rng.uniform(3.0, 8.0, count))
+
+    def scene_set_up(self):
+        self.world = None #a streamed world of the saving folder is not part of the benchmark
+        rng = np.random.default_rng(self.config['seed'])
+        count = self.config['objects']
+        positions = np.zeros((count+1, 3), dtype='f4')
+        positions[1:,[0,2]] = rng.uniform(-self.half_size, self.half_size, (count, 2))
+        positions[1:,1] = rng.uniform(0.5, 2.5, count)
+        rotations = np.zeros((count+1, 3), dtype='f4')
+        rotations[1:,1] = rng.uniform(0, 360, count)
+        scales = np.ones((count+1, 3), dtype='f4')
+        scales[1:] *= rng.uniform(0.3, 1.0, (count, 1))
+        #ground first, it receives the shadows
+        positions[0] = (0, -0.2, 0)
+        scales[0] = (self.half_size*1.2, self.half_size*1.2, 0.2)
+        tex_ids = [2]+rng.integers(0, 2, count).tolist()
+        vao_names = ['cube']+[['cube', 'pyramid'][i] for i in rng.integers(0, 2, count).tolist()]
+        objs = Cube.instantiate(self, positions, rotations, scales, tex_ids, vao_names)
+        self.entities.add_many_to_scene(objs)
+        self.loader.finish()
+
+    def set_pose(self, position, yaw, pitch):
+        camera = self.camera
+        camera.position = position
+        camera.yaw, camera.pitch = yaw, pitch
+        camera.update_camera_vectors()
+        camera.reload_matrices()
+
+    def run_path(self, path, frames, warmup):
+        #cpu: render() until it returns, gpu: sum of the passes timed by app.gpu_timers, frame: until the gpu is done
+        #(gl time queries do not nest, so there is no query around render() itself)
+        cpu, gpu, frame = [], [], []
+        profiler = self.cpu_profiler
+        timers = self.gpu_timers
+        for i in range(warmup+frames):
+            if i == warmup and self.config.get('profile'):
+                profiler.enable()
+                profiler.history.clear()
+            t = max(0, i-warmup)/max(frames-1, 1)
+            self.set_pose(*get_pose(path, t, self.half_size))
+            self.time += DELTA_TIME
+            self.delta_time = DELTA_TIME
+            start = time.perf_counter()
+            self.render()
+            submitted = time.perf_counter()
+            self.ctx.finish()
+            done = time.perf_counter()
+            timers.flush() #the gpu is done, this frame is read back now instead of a few frames later
+            number, _, passes = timers.history[-1] if len(timers.history) > 0 else (None, None, [])
+            if i >= warmup:
+                cpu.append((submitted-start)*1000)
+                frame.append((done-start)*1000)
+                gpu.append(sum(elapsed for _, _, _, elapsed in passes) if number == timers.frame_number else 0.0)
+        result = {'frames': frames, 'cpu_ms': get_stats(cpu), 'gpu_ms': get_stats(gpu), 'frame_ms': get_stats(frame)}
+        if profiler.enabled:
+            #gl work per frame, the last one closes here instead of at the next render
+            profiler.next_frame()
+            result['work'] = {name: float(profiler.get(name).mean()) for name in COUNTERS}
+            profiler.disable()
+        return result
+
+def run(config):
+    engine = BenchmarkEngine(config)
+    report = {'config': config,
+              'system': {'renderer': engine.ctx.info['GL_RENDERER'], 'gl': engine.ctx.info['GL_VERSION'],
+                         'python': platform.python_version(), 'platform': platform.platform()},
+              'paths': {}}
+    for name in config['paths']:
+        report['paths'][name] = engine.run_path(PATHS[name], config['frames'], config['warmup'])
+    engine.loader.destroy()
+    return report
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    #[(path, metric, statistic, baseline, now, ratio, regressed)] for every path of both
+    if baseline['config'] != report['config']:
+        print("warning: the baseline was measured with another configuration", file=sys.stderr)
+    if baseline.get('system', {}).get('renderer') != report['system']['renderer']:
+        print("warning: the baseline was measured on another renderer", file=sys.stderr)
+    rows = []
+    for name, path in report['paths'].items():
+        if name not in baseline['paths']:
+            continue
+        for metric in ['cpu_ms', 'gpu_ms', 'frame_ms']:
+            for statistic in COMPARED:
+                before, now = baseline['paths'][name][metric][statistic], path[metric][statistic]
+                ratio = now/before if before > 0 else float('inf')
+                rows.append((name, metric, statistic, before, now, ratio, ratio > 1+tolerance))
+        #per frame counts when both were profiled, more work is a regression too
+        for counter, now in path.get('work', {}).items():
+            before = baseline['paths'][name].get('work', {}).get(counter)
+            if before != None:
+                ratio = now/before if before > 0 else (1.0 if now == 0 else float('inf'))
+                rows.append((name, counter, 'mean', before, now, ratio, ratio > 1+tolerance))
+    return rows
+
+def print_comparison(rows):
+    for name, metric, statistic, before, now, ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        unit = " ms" if metric.endswith('_ms') else ""
+        print(f"{name:>8} {metric:>8} {statistic:>4}: {before:8.2f} -> {now:8.2f}{unit} ({ratio-1:+.1%}){flag}", file=sys.stderr)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="offscreen fly-through benchmark, frame times as json")
+    parser.add_argument('--objects', type=int, default=OBJECTS)
+    parser.add_argument('--lights', type=int, default=LIGHTS, help=f"up to {MAX_LIGHTS}")
+    parser.add_argument('--light-type', choices=['point', 'directional', 'mixed'], default=LIGHT_TYPE)
+    parser.add_argument('--point-lights', type=int, default=POINT_LIGHTS, help="shadowless point lights, shaded per cluster")
+    parser.add_argument('--paths', nargs='+', choices=list(PATHS), default=list(PATHS))
+    parser.add_argument('--frames', type=int, default=FRAMES)
+    parser.add_argument('--warmup', type=int, default=WARMUP)
+    parser.add_argument('--resolution', type=int, nargs=2, default=RESOLUTION, metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--profile', action='store_true', help="also count draw calls, uniform writes, uploads, binds and new gpu objects per frame")
+    parser.add_argument('--output', help="json report, printed when not given")
+    parser.add_argument('--baseline', help="json report to compare with, exits with 1 on a regression")
+    parser.add_argument('--save-baseline', help="also write the report there, as the next baseline")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+    if not 0 <= args.lights <= MAX_LIGHTS:
+        parser.error(f"--lights goes from 0 to {MAX_LIGHTS}")
+    if args.point_lights < 0:
+        parser.error("--point-lights can not be negative")
+
+    config = {'objects': args.objects, 'lights': args.lights, 'light_type': args.light_type, 'point_lights': args.point_lights, 'paths': args.paths,
+              'frames': args.frames, 'warmup': args.warmup, 'resolution': list(args.resolution), 'seed': args.seed,
+              'profile': args.profile}
+    report = run(config)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text)
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            file.write(text)
+    if args.baseline:
+        with open(args.baseline) as file:
+            rows = compare(report, json.load(file), args.tolerance)
+        print_comparison(rows)
+        if any(row[-1] for row in rows):
+            sys.exit(1)
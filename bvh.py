@@ -0,0 +1,211 @@
+import heapq
+
+import numpy as np
+
+LEAF_SIZE = 4 #primitives per leaf
+MESH_LEAF_SIZE = 8 #triangles per leaf of a mesh bvh
+LEVEL_STEP = 2 #levels crossed by every traversal step (4 boxes per node tested at once)
+NEAREST_STEP = 4 #levels expanded per heap entry in the nearest first traversal
+
+def get_median_order(centers, depth):
+    #balanced tree order: every node splits its primitives in two halves at the median of its longest axis
+    #padding centers are inf, so they always end up at the end of their node
+    order = np.arange(len(centers))
+    for level in range(depth):
+        nodes = 1<<level
+        size = len(centers)//nodes
+        node_centers = centers[order].reshape(nodes, size, 3)
+        real = np.isfinite(node_centers[:,:,0])[:,:,None]
+        extent = np.where(real, node_centers, -np.inf).max(axis=1)-np.where(real, node_centers, np.inf).min(axis=1)
+        axis = np.argmax(np.nan_to_num(extent, nan=0, neginf=0), axis=1)
+        key = np.take_along_axis(node_centers, axis[:,None,None], axis=2)[:,:,0]
+        half = np.argpartition(key, size//2, axis=1)
+        order = np.take_along_axis(order.reshape(nodes, size), half, axis=1).ravel()
+    return order
+
+def ray_box(origins, inv_dirs, box_min, box_max):
+    #slab test, returns (near, far) distances along the rays, a miss has far < max(near, 0)
+    t0 = (box_min-origins)*inv_dirs
+    t1 = (box_max-origins)*inv_dirs
+    near = np.minimum(t0, t1).max(axis=-1)
+    far = np.maximum(t0, t1).min(axis=-1)
+    return near, far
+
+def get_inv_dirs(dirs):
+    #1/dir, a null component becomes a huge number so the slab test never sees 0*inf
+    dirs = np.where(np.abs(dirs) < 1e-30, 1e-30, dirs)
+    return 1.0/dirs
+
+def get_nearest(rays, t, ray_count):
+    #for every ray, the smallest t and the index of the pair it comes from (-1 and inf when nothing was hit)
+    best_t = np.full(ray_count, np.inf)
+    best = np.full(ray_count, -1, dtype=np.int64)
+    if len(rays) == 0:
+        return best, best_t
+    order = np.lexsort((t, rays))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = rays[order][1:] != rays[order][:-1]
+    best[rays[order][first]] = order[first]
+    best_t[rays[order][first]] = t[order][first]
+    return best, best_t
+
+class BVH:
+    #balanced hierarchy of boxes, stored as an implicit heap (node i has children 2i and 2i+1)
+    def __init__(self, boxes, leaf_size=LEAF_SIZE):
+        self.leaf_size = leaf_size
+        self.build(boxes)
+
+    def build(self, boxes):
+        #boxes: (n,2,3) [min corner, max corner] of every primitive
+        self.boxes = np.array(boxes, dtype='f4').reshape(-1,2,3)
+        count = len(self.boxes)
+        self.leaf_count = 1
+        while self.leaf_count*self.leaf_size < count:
+            self.leaf_count *= 2
+        self.depth = self.leaf_count.bit_length()-1
+
+        #slots: the primitives in tree order, leaf after leaf, -1 for the padding
+        centers = np.full((self.leaf_count*self.leaf_size, 3), np.inf, dtype='f4')
+        centers[:count] = self.boxes.mean(axis=1)
+        self.slots = get_median_order(centers, self.depth)
+        self.slots[self.slots >= count] = -1
+        self.slot_of = np.empty(count, dtype=np.int64)
+        self.slot_of[self.slots[self.slots >= 0]] = np.flatnonzero(self.slots >= 0)
+
+        self.node_min = np.full((2*self.leaf_count, 3), np.inf, dtype='f4')
+        self.node_max = np.full((2*self.leaf_count, 3), -np.inf, dtype='f4')
+        self.refit()
+
+    def get_leaf_bounds(self, leaves):
+        #leaves are heap indices (leaf_count to 2*leaf_count-1)
+        slots = self.slots.reshape(-1, self.leaf_size)[leaves-self.leaf_count]
+        if len(self.boxes) == 0:
+            return np.full((len(leaves),3), np.inf), np.full((len(leaves),3), -np.inf)
+        prim_min = np.where((slots>=0)[...,None], self.boxes[slots,0], np.inf)
+        prim_max = np.where((slots>=0)[...,None], self.boxes[slots,1], -np.inf)
+        return prim_min.min(axis=1), prim_max.max(axis=1)
+
+    def refit(self, indices=None, boxes=None):
+        #new boxes for some primitives (all of them if indices is None), the tree order stays the same
+        if indices is None:
+            nodes = np.arange(self.leaf_count, 2*self.leaf_count)
+        else:
+            indices = np.asarray(indices, dtype=np.int64)
+            if len(indices) == 0:
+                return
+            self.boxes[indices] = boxes
+            nodes = np.unique(self.slot_of[indices]//self.leaf_size)+self.leaf_count
+        self.node_min[nodes], self.node_max[nodes] = self.get_leaf_bounds(nodes)
+        #then every parent up to the root
+        while nodes[0] > 1:
+            nodes = np.unique(nodes//2)
+            self.node_min[nodes] = np.minimum(self.node_min[2*nodes], self.node_min[2*nodes+1])
+            self.node_max[nodes] = np.maximum(self.node_max[2*nodes], self.node_max[2*nodes+1])
+
+    def get_candidates(self, origins, dirs, max_t=np.inf):
+        #every (ray, primitive) pair whose primitive box is crossed before max_t
+        #the whole set of rays goes down the tree together, a few levels per step
+        origins = np.asarray(origins, dtype='f4').reshape(-1,3)
+        inv_dirs = get_inv_dirs(np.asarray(dirs, dtype='f4').reshape(-1,3))
+        rays = np.arange(len(origins))
+        nodes = np.ones(len(origins), dtype=np.int64)
+        level = 0
+        while True:
+            near, far = ray_box(origins[rays], inv_dirs[rays], self.node_min[nodes], self.node_max[nodes])
+            hit = (far >= np.maximum(near, 0)) & (near <= max_t)
+            rays, nodes = rays[hit], nodes[hit]
+            if level == self.depth or len(rays) == 0:
+                break
+            step = min(LEVEL_STEP, self.depth-level)
+            level += step
+            children = np.arange(1<<step)
+            rays = np.repeat(rays, 1<<step)
+            nodes = (np.repeat(nodes, 1<<step)<<step)+np.tile(children, len(nodes))
+
+        #leaves -> primitives, tested against their own box
+        slots = (nodes[:,None]-self.leaf_count)*self.leaf_size+np.arange(self.leaf_size)
+        prims = self.slots[slots].ravel()
+        rays = np.repeat(rays, self.leaf_size)
+        used = prims >= 0
+        rays, prims = rays[used], prims[used]
+        near, far = ray_box(origins[rays], inv_dirs[rays], self.boxes[prims,0], self.boxes[prims,1])
+        hit = (far >= np.maximum(near, 0)) & (near <= max_t)
+        return rays[hit], prims[hit], np.maximum(near[hit], 0)
+
+    def get_nearest_first(self, origin, direction, test, max_t=np.inf, step=NEAREST_STEP):
+        #one ray, nodes taken nearest box first from a heap: once the best hit is closer than the next box, the rest is skipped
+        #test(prims) -> (t, hit) of the ray against those primitives, returns (primitive or -1, t or inf)
+        origin = np.asarray(origin, dtype='f4').reshape(3)
+        inv_dir = get_inv_dirs(np.asarray(direction, dtype='f4').reshape(1,3))[0]
+        best, best_t = -1, max_t
+        heap = [(0.0, 1, 0)]
+        while len(heap) > 0:
+            near, node, level = heapq.heappop(heap)
+            if near > best_t:
+                break
+            node_step = min(step, self.depth-level)
+            children = (node<<node_step)+np.arange(1<<node_step)
+            near, far = ray_box(origin, inv_dir, self.node_min[children], self.node_max[children])
+            near = np.maximum(near, 0)
+            hit = (far >= near) & (near <= best_t)
+            if level+node_step < self.depth:
+                for child, child_near in zip(children[hit].tolist(), near[hit].tolist()):
+                    heapq.heappush(heap, (child_near, child, level+node_step))
+                continue
+            #the crossed leaves are tested together, a single leaf is too small to be worth a heap entry
+            slots = (children[hit,None]-self.leaf_count)*self.leaf_size+np.arange(self.leaf_size)
+            prims = self.slots[slots.ravel()]
+            prims = prims[prims >= 0]
+            t, hit = test(prims)
+            hit &= t <= best_t
+            if hit.any():
+                i = np.argmin(np.where(hit, t, np.inf))
+                best, best_t = int(prims[i]), float(t[i])
+        return best, (best_t if best >= 0 else np.inf)
+
+def ray_triangles(origins, dirs, triangles):
+    #moller trumbore, one ray per triangle, both sides count: returns (t, hit)
+    edge1 = triangles[:,1]-triangles[:,0]
+    edge2 = triangles[:,2]-triangles[:,0]
+    p = np.cross(dirs, edge2)
+    det = np.einsum('ij,ij->i', edge1, p)
+    valid = np.abs(det) > 1e-12
+    inv_det = 1.0/np.where(valid, det, 1.0)
+    s = origins-triangles[:,0]
+    u = np.einsum('ij,ij->i', s, p)*inv_det
+    q = np.cross(s, edge1)
+    v = np.einsum('ij,ij->i', dirs, q)*inv_det
+    t = np.einsum('ij,ij->i', edge2, q)*inv_det
+    hit = valid & (u >= 0) & (v >= 0) & (u+v <= 1) & (t >= 0)
+    return t, hit
+
+class MeshBVH(BVH):
+    #triangle hierarchy of one mesh, in the space of the mesh (before any model matrix)
+    def __init__(self, positions, leaf_size=MESH_LEAF_SIZE):
+        self.triangles = np.ascontiguousarray(positions, dtype='f4').reshape(-1,3,3)
+        super().__init__(np.stack([self.triangles.min(axis=1), self.triangles.max(axis=1)], axis=1), leaf_size)
+
+    def intersect(self, origins, dirs, max_t=np.inf):
+        #nearest triangle for every ray: (triangle index or -1, t or inf), t is in units of dirs
+        origins = np.asarray(origins, dtype='f4').reshape(-1,3)
+        dirs = np.asarray(dirs, dtype='f4').reshape(-1,3)
+        if len(origins) == 1:
+            #a single ray (picking) goes nearest first and stops early instead of collecting every candidate
+            def test(tris):
+                return ray_triangles(np.broadcast_to(origins, (len(tris),3)), np.broadcast_to(dirs, (len(tris),3)), self.triangles[tris])
+            triangle, t = self.get_nearest_first(origins[0], dirs[0], test, max_t)
+            return np.array([triangle], dtype=np.int64), np.array([t])
+        rays, tris, _ = self.get_candidates(origins, dirs, max_t)
+        t, hit = ray_triangles(origins[rays], dirs[rays], self.triangles[tris])
+        hit &= t <= max_t
+        tris = tris[hit]
+        best, best_t = get_nearest(rays[hit], t[hit], len(origins))
+        triangle = np.full(len(origins), -1, dtype=np.int64)
+        triangle[best >= 0] = tris[best[best >= 0]]
+        return triangle, best_t
+
+    def get_normals(self, triangles):
+        #unit geometric normals (winding order) of some triangles
+        tri = self.triangles[triangles]
+        normals = np.cross(tri[:,1]-tri[:,0], tri[:,2]-tri[:,0])
+        return normals/np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
@@ -2,8 +2,12 @@ import glm
 import pygame as pg
 import sys, os
 import math
+import numpy as np
 
 from model import *
+from picking import ScenePicker
+from command_log import CommandLog
+from scene_file import write_scene, load_scene_file
 import lights
 
 FOV = 70
@@ -11,6 +15,10 @@ NEAR = 0.1
 FAR = 100
 SPEED = 0.01
 SENSITIVITY = 0.2
+PLACE_CUBE = 1 #distance from the surface to the center of a new cube (half its size)
+PLACE_LIGHT = 0.5 #and to a new light
+SCENE_FILE = "saving_sys/saved_scene.scene"
+SCENE_CSV = "saving_sys/saved_scene.csv" #format of the older saves, still read when there is no binary scene
 
 class Camera():
     def __init__(self, app, position = (0,0,0), yaw=90, pitch=0):
@@ -32,10 +40,10 @@ class Camera():
         self.lock = False
         self.selected_obj = None
         self.old_selected_obj = None
+        self.picker = ScenePicker(app) #bvh over the scene and the light gizmos
 
-        #ctrl z and y system
-        self.previous = []
-        self.next = []
+        #ctrl z and y system, diffs keyed by entity id (command_log.py)
+        self.commands = CommandLog(app)
 
         self.update_camera_vectors()
 
@@ -101,25 +109,37 @@ class Camera():
             if event.type == pg.QUIT or (event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE):
                 self.save_lights()
                 self.save_scene()
+                self.app.loader.destroy()
                 self.app.mesh.destroy()
+                self.app.text_renderer.destroy()
                 self.app.scene_renderer.destroy()
+                self.app.frame_uniforms.destroy()
+                self.app.point_lights.destroy()
+                self.app.cpu_profiler.disable()
+                self.app.editor.destroy()
                 pg.quit()
                 sys.exit()
             if event.type == pg.KEYDOWN and event.key == pg.K_1:
                 vector = self.vector_world(pg.mouse.get_pos(), self.m_view, self.m_proj, self.app.WIN_SIZE[0], self.app.WIN_SIZE[1])
-                new_pos = self.position+vector*3
+                new_pos = self.get_placement(vector, PLACE_CUBE)
                 self.app.add_cube(new_pos)
             if event.type == pg.KEYDOWN and event.key == pg.K_2:
                 vector = self.vector_world(pg.mouse.get_pos(), self.m_view, self.m_proj, self.app.WIN_SIZE[0], self.app.WIN_SIZE[1])
-                new_pos = self.position+vector*3
+                new_pos = self.get_placement(vector, PLACE_LIGHT)
                 self.app.add_light(new_pos)
-            if event.type == pg.KEYDOWN and event.key == pg.K_x and len(self.previous)!=0: #before
-                a = self.previous.pop()
-                self.load_previous(a[0],a[1],a[2])
-
-            if event.type == pg.KEYDOWN and event.key == pg.K_c and len(self.next)!=0: #after
-                a = self.next.pop()
-                self.load_next(a[0],a[1],a[2])
+            if event.type == pg.KEYDOWN and event.key == pg.K_F3:
+                self.app.gpu_timers.shown = not self.app.gpu_timers.shown #gpu time per pass on screen
+            if event.type == pg.KEYDOWN and event.key == pg.K_F4:
+                print(f"gpu trace saved to {self.app.gpu_timers.export_trace()}") #open it in chrome://tracing
+            if event.type == pg.KEYDOWN and event.key == pg.K_F5:
+                self.app.cpu_profiler.toggle() #timers and gl counters, logged to cpu_profile.csv while on
+            if event.type == pg.KEYDOWN and event.key == pg.K_F6:
+                self.app.editor.toggle() #property panel
+            if event.type == pg.KEYDOWN and event.key == pg.K_x: #before
+                self.commands.undo()
+
+            if event.type == pg.KEYDOWN and event.key == pg.K_c: #after
+                self.commands.redo()
                 
             if event.type == pg.MOUSEBUTTONDOWN:
                 #click on objects or uis
@@ -165,110 +185,23 @@ class Camera():
                 self.lock = False
 
     def ray_dist(self, point, vector):
-        #we need to use the raymarching approach to find the object we are looking at
-        # we know the safe dist is three :  _ _ _ we check new safe dist : _ if too small, we hit an object (raymarching approch)
-        min_return = 0.25
-        max_return = 100
-
-        smallest_dist = 100
-        new_point = point #the new point
-
-        #new list joining scene and lights
-        list_objs = self.app.scene.copy()
-        for light in self.app.lights:
-            list_objs.append(light.light_ui)
-        for obj in list_objs:
-            dist = self.sdBox(obj.position, obj.scale, point)
-            if dist <= min_return:
-                #hit
-                return obj
-            if dist > max_return:
-                #no hit we missed it =C
-                return None
-            if smallest_dist>dist:
-                #we raymarch again
-                smallest_dist=dist
-
-        new_point = point+vector*smallest_dist
-        return self.ray_dist(new_point, vector)
-
-    def sdBox(self, center, scale, point):
-        dist_x = abs(point.x-center.x)
-        dist_y = abs(point.y-center.y)
-        dist_z = abs(point.z-center.z)
-        return (math.sqrt((max(dist_x-scale.x,0))**2 + (max(dist_y-scale.z,0))**2 + (max(dist_z-scale.y,0))**2)) #we are using 2 diff system so y is z
-    
-
-    def load_previous(self, name, obj, property):
-        #new list joining scene and lights
-        list_objs = self.app.scene.copy()
-        for light in self.app.lights:
-            list_objs.append(light.light_ui)
-        if obj in list_objs:
-            if name == "name":
-                self.next.append((name,obj,obj.name))
-                obj.name = property
-            if name == "vao":
-                self.next.append((name,obj,obj.vao_name))
-                obj.on_init_vao(property)
-            if name == "position":
-                self.next.append((name,obj,obj.position))
-                obj.position = property
-            if name == "rotation":
-                self.next.append((name,obj,obj.rotation))
-                obj.rotation = property
-            if name == "scale":
-                self.next.append((name,obj,obj.scale))
-                obj.scale = property
-            if name == "texture":
-                self.next.append((name,obj,obj.tex_id))
-                obj.tex_id = property
-            if name == "intensity":
-                self.next.append((name,obj,obj.intensity))
-                obj.intensity = property
-            if name == "color":
-                self.next.append((name,obj,obj.color))
-                obj.color = property
-            obj.m_model = obj.get_model_matrix(self.app)
-            obj.on_init()
-
-    def load_next(self, name, obj, property):
-        #new list joining scene and lights
-        list_objs = self.app.scene.copy()
-        for light in self.app.lights:
-            list_objs.append(light.light_ui)
-        if obj in list_objs:
-            if name == "name":
-                self.previous.append((name,obj,obj.name))
-                obj.name = property
-            if name == "vao":
-                self.previous.append((name,obj,obj.vao_name))
-                obj.on_init_vao(property)
-            if name == "position":
-                self.previous.append((name,obj,obj.position))
-                obj.position = property
-            if name == "rotation":
-                self.previous.append((name,obj,obj.rotation))
-                obj.rotation = property
-            if name == "scale":
-                self.previous.append((name,obj,obj.scale))
-                obj.scale = property
-            if name == "texture":
-                self.previous.append((name,obj,obj.tex_id))
-                obj.tex_id = property
-            if name == "intensity":
-                self.previous.append((name,obj,obj.intensity))
-                obj.intensity = property
-            if name == "color":
-                self.previous.append((name,obj,obj.color))
-                obj.color = property
-            obj.m_model = obj.get_model_matrix(self.app)
-            obj.on_init()
+        #nearest object (or light gizmo) along the ray, None past the far plane
+        obj, dist = self.picker.pick(point, vector, FAR)
+        return obj
+
+    def get_placement(self, vector, offset):
+        #snaps on the surface under the ray (pushed out along its normal), else 3 units in front like before
+        surface = self.picker.pick_surface(self.position, vector, FAR)
+        if surface == None:
+            return self.position+vector*3
+        point, normal = surface
+        return point+normal*offset
 
     def save_imports(self, name, link_tex, link_model):
         with open("saving_sys/saved_imports.csv",mode="a",encoding="utf-8") as file: #saves the textures and models in a csv file
             file.write(f"{name};{link_tex};{link_model};\n")
-    def load_imports(self):
+    def load_imports(self, lazy=False):
+        #lazy: the meshes and textures load once a model uses them (streamed worlds)
         with open("saving_sys/saved_imports.csv","r",encoding="utf-8") as file: #reads all lines in the csv file and loads the textures and models
             list = file.readlines()
             if len(list) != 0:
@@ -276,34 +209,41 @@ class Camera():
                     list_attribs = line.split(';')
                     #if the 3rd attributs is none then this is only a texture
                     if list_attribs[2] == "None":
-                        self.app.mesh.texture.load_texture_obj(f"{list_attribs[0]}",list_attribs[1])
+                        self.app.mesh.texture.load_texture_obj(f"{list_attribs[0]}",list_attribs[1], lazy)
                     else:
                         if list_attribs[1] == "None":
                             list_attribs[1] = None
-                        self.app.mesh.load_texture_obj(f"{list_attribs[0]}",link_tex=list_attribs[1], link=f"{list_attribs[2]}")
+                        self.app.mesh.load_texture_obj(f"{list_attribs[0]}",link_tex=list_attribs[1], link=f"{list_attribs[2]}", lazy=lazy)
 
 
     def save_scene(self):
-        with open("saving_sys/saved_scene.csv",mode="w",encoding="utf-8") as file: #saves the textures and models in a csv file
-            for object in self.app.scene: #CLASSE NAME  ,pos, rot, scale, tex_id, vao_name,name
-                file.write(f"cube;{object.position[0]};{object.position[1]};{object.position[2]};{object.rotation[0]};{object.rotation[1]};{object.rotation[2]};{object.scale[0]};{object.scale[1]};{object.scale[2]};{object.tex_id};{object.vao_name};{object.name};\n")
-    def load_scene(self):
-        with open("saving_sys/saved_scene.csv",mode="r",encoding="utf-8") as file: #saves the textures and models in a csv file
-            list = file.readlines()
-            if len(list) != 0:
-                for line in list:
-                    l = line.split(';')
-                    #first attrib is classe
-                    if l[10][0] in ["0","1","2","3","4","5","6","7","8","9"]:
-                        l[10] = int(l[10])
-                    if l[0] == 'cube':
-                        self.app.scene.append(Cube(self.app, (float(l[1]),float(l[2]),float(l[3])), (float(l[4]),float(l[5]),float(l[6])), (float(l[7]),float(l[8]),float(l[9])), tex_id=l[10], name=l[12]))
-                    self.app.scene[-1].on_init_vao(l[11])
+        #columns of packed arrays (scene_file.py), CLASSE NAME is always cube like in the csv
+        if self.app.world != None:
+            self.app.world.save() #the chunks that changed, in their own files
+            return
+        write_scene(SCENE_FILE, self.app.scene)
+    def load_scene(self, path=None):
+        #the binary scene, or the csv of the saves before it (any .csv or .scene given as path is imported the same way)
+        if path == None:
+            path = SCENE_FILE if os.path.exists(SCENE_FILE) else SCENE_CSV
+        if not os.path.exists(path):
+            return []
+        columns, tables = load_scene_file(path)
+        #ids -> values of the tables, the texture ids keep their type (numbers or imported texture names)
+        tex_ids = np.array(tables['textures'], dtype=object)[columns['texture']].tolist()
+        vao_names = np.array(tables['meshes'], dtype=object)[columns['mesh']].tolist()
+        names = np.array(tables['names'], dtype=object)[columns['name']].tolist()
+        objs = Cube.instantiate(self.app, columns['position'], columns['rotation'], columns['scale'], tex_ids, vao_names, names)
+        return self.app.entities.add_many_to_scene(objs)
 
     def save_lights(self):
         with open("saving_sys/saved_lights.csv",mode="w",encoding="utf-8") as file: #saves the textures and models in a csv file
             for light in self.app.lights:  #pos, colour, intensity, name, param
                 file.write(f"{light.position[0]};{light.position[1]};{light.position[2]};{light.color[0]};{light.color[1]};{light.color[2]};{light.intensity};{light.name};{light.type_of_light};\n")
+            point_lights = self.app.point_lights
+            for i in range(point_lights.count): #the shadowless ones, with their radius
+                position, color = point_lights.position[i], point_lights.color[i]
+                file.write(f"{position[0]};{position[1]};{position[2]};{color[0]};{color[1]};{color[2]};{point_lights.intensity[i]};None;shadowless;{point_lights.radius[i]};\n")
     def load_lights(self):
         with open("saving_sys/saved_lights.csv",mode="r",encoding="utf-8") as file: #saves the textures and models in a csv file
             list = file.readlines()
@@ -312,6 +252,9 @@ class Camera():
                     l = line.split(';')
                     if l[8] == "None":
                         l[8] = None
+                    if l[8] == "shadowless":
+                        self.app.point_lights.add((float(l[0]),float(l[1]),float(l[2])), (float(l[3]),float(l[4]),float(l[5])), float(l[6]), float(l[9]))
+                        continue
 
                     self.app.lights.append(lights.Light(self.app, (float(l[0]),float(l[1]),float(l[2])), (float(l[3]),float(l[4]),float(l[5])), intensity=float(l[6]), name=l[7], param=l[8]))
 
@@ -0,0 +1,228 @@
+import math
+
+import numpy as np
+import moderngl as mgl
+
+CLUSTERED = True #shadowless point lights are shaded per cluster, off they are kept but not drawn
+CLUSTERS = (16, 9, 24) #tiles across the screen (x, y), then slices of the view depth
+RADIUS = 8.0 #reach of a point light when none is given, it fades to nothing there
+INDEX_WIDTH = 4096 #light numbers per row of the index texture, keep in sync with default.frag
+LIGHTS_UNIT = 5 #texture units of the cluster data, after the albedo (0) and the 4 shadow maps (1-4)
+GRID_UNIT = 6
+INDICES_UNIT = 7
+
+def get_slices(near, far, count):
+    #view depth where every slice starts (and the last one ends), exponential so near slices stay thin
+    return near*(far/near)**(np.arange(count+1)/count)
+
+def get_slice(depths, near, far, count):
+    return np.clip(np.floor(np.log(depths/near)/math.log(far/near)*count), 0, count-1).astype(np.int64)
+
+def get_cluster_bounds(px, py, near, far, counts=CLUSTERS):
+    #view space extent of the clusters: x (min, max) per (slice, column), y (min, max) per (slice, row), depth (min, max) per slice
+    #px, py: m_proj[0][0] and m_proj[1][1], a view point (x, y, -d) is at ndc (x*px/d, y*py/d)
+    cx, cy, cz = counts
+    xs, ys, ds = np.linspace(-1, 1, cx+1), np.linspace(-1, 1, cy+1), get_slices(near, far, cz)
+    d0, d1 = ds[:-1,None], ds[1:,None]
+    x_min, x_max = np.minimum(xs[:-1]*d0, xs[:-1]*d1)/px, np.maximum(xs[1:]*d0, xs[1:]*d1)/px #(cz, cx), growing along the columns
+    y_min, y_max = np.minimum(ys[:-1]*d0, ys[:-1]*d1)/py, np.maximum(ys[1:]*d0, ys[1:]*d1)/py #(cz, cy)
+    return [bounds.astype('f4') for bounds in (x_min, x_max, y_min, y_max, ds[:-1], ds[1:])]
+
+def get_tiles(low, high, count):
+    #ndc range -> first and last tile it covers
+    return (np.clip(np.floor((low+1)/2*count), 0, count-1).astype(np.int32),
+            np.clip(np.floor((high+1)/2*count), 0, count-1).astype(np.int32))
+
+def get_gap(low, high, values):
+    return np.maximum(np.maximum(low-values, values-high), 0)
+
+def expand(counts):
+    #rows of counts items -> row of every item, number of the item in its row
+    rows = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+    return rows, np.arange(len(rows), dtype=np.int32)-(np.cumsum(counts)-counts).astype(np.int32)[rows]
+
+def assign_lights(centers, radii, bounds, px, py, near, far, counts=CLUSTERS):
+    #view space spheres -> (offset and count of every cluster (n, 2), light numbers of every cluster one after the other)
+    #a light takes its slices, then in each slice the columns its sphere still reaches, then in each column the rows:
+    #the ranges are exact (a box of a cluster is touched when the distance to it is under the radius), nothing is tested twice
+    cx, cy, cz = counts
+    x_low, x_high, y_low, y_high, d_low, d_high = bounds
+    x, y, depth = centers[:,0], centers[:,1], -centers[:,2]
+    seen = (depth+radii > near) & (depth-radii < far)
+    d0, d1 = np.clip(depth-radii, near, far), np.clip(depth+radii, near, far)
+    first, last = get_slice(d0, near, far, cz).astype(np.int32), get_slice(d1, near, far, cz).astype(np.int32)
+    #tiles of the screen box of the sphere (x/d is extreme on the corners), the boxes of the clusters stick out of their frustums
+    depths = np.stack([d0, d1], axis=1)[:,None,:]
+    ndc_x = (x[:,None]+radii[:,None]*[-1,1])[:,:,None]/depths*px
+    ndc_y = (y[:,None]+radii[:,None]*[-1,1])[:,:,None]/depths*py
+    tx0, tx1 = get_tiles(ndc_x.min(axis=(1,2)), ndc_x.max(axis=(1,2)), cx)
+    ty0, ty1 = get_tiles(ndc_y.min(axis=(1,2)), ndc_y.max(axis=(1,2)), cy)
+
+    #(light, slice): what is left of the radius squared past the depth gap, then the columns it reaches
+    lights, z = expand(np.where(seen, last-first+1, 0))
+    z += first[lights]
+    gap = get_gap(d_low[z], d_high[z], depth[lights])
+    left = radii[lights]**2-gap*gap
+    reach, row = np.sqrt(np.maximum(left, 0)), x[lights]
+    x0 = np.maximum(np.count_nonzero(x_high[z] < (row-reach)[:,None], axis=1), tx0[lights])
+    x1 = np.minimum(np.count_nonzero(x_low[z] <= (row+reach)[:,None], axis=1), tx1[lights]+1)
+    #(light, slice, column): the same with the x gap, for the rows
+    rows, column = expand(np.where(left >= 0, np.maximum(x1-x0, 0), 0))
+    lights, z, left = lights[rows], z[rows], left[rows]
+    column += x0[rows].astype(np.int32)
+    gap = get_gap(x_low[z, column], x_high[z, column], x[lights])
+    left = left-gap*gap
+    reach, row = np.sqrt(np.maximum(left, 0)), y[lights]
+    y0 = np.maximum(np.count_nonzero(y_high[z] < (row-reach)[:,None], axis=1), ty0[lights])
+    y1 = np.minimum(np.count_nonzero(y_low[z] <= (row+reach)[:,None], axis=1), ty1[lights]+1)
+    #(light, cluster)
+    rows, clusters = expand(np.where(left >= 0, np.maximum(y1-y0, 0), 0))
+    clusters = (z[rows]*cy+y0[rows]+clusters)*cx+column[rows]
+    lights = lights[rows]
+
+    order = np.argsort(clusters.astype(np.uint16), kind='stable') #a radix sort, the cluster numbers fit in 16 bits
+    counts_per_cluster = np.bincount(clusters, minlength=cx*cy*cz)
+    grid = np.stack([np.cumsum(counts_per_cluster)-counts_per_cluster, counts_per_cluster], axis=1).astype('u4')
+    return grid, lights[order].astype('u4')
+
+class ClusteredLights:
+    #shadowless point lights, in arrays like the entity store, as many as the data textures hold
+    #every frame they are sorted into the clusters of the view on the cpu and each fragment only shades the lights of its cluster
+    #the shadowed lights (app.lights, up to MAX_LIGHTS) are a separate set, shaded as before
+    def __init__(self, app, capacity=64):
+        self.app = app
+        self.ctx = app.ctx
+        self.enabled = CLUSTERED
+        self.counts = CLUSTERS
+        self.count = 0
+        self.capacity = 0
+        self.position = np.zeros((0,3), dtype='f4')
+        self.color = np.zeros((0,3), dtype='f4') #0-255 like the shadowed lights
+        self.intensity = np.zeros(0, dtype='f4')
+        self.radius = np.zeros(0, dtype='f4')
+        self.changed = True #light data to upload again
+        self.shaded = 0 #lights in the view last frame
+        self.assigned = 0 #(light, cluster) pairs last frame
+        self.bounds = None
+        self.projection = None #(px, py, near, far) the bounds were made for
+
+        #data textures: 2 texels per light (position and radius, color and intensity), offset and count per cluster, light numbers
+        cx, cy, cz = self.counts
+        self.grid = self.get_texture((cx*cy, cz), 2, 'u4')
+        self.indices = self.get_texture((INDEX_WIDTH, 1), 1, 'u4')
+        self.light_data = None
+        self.grow(capacity)
+
+        programs = self.app.mesh.vao.program.programs
+        for name in ['default', 'default_instanced']:
+            for uniform, unit in [('cluster_lights', LIGHTS_UNIT), ('cluster_grid', GRID_UNIT), ('cluster_indices', INDICES_UNIT)]:
+                if programs[name].get(uniform, None) != None:
+                    programs[name][uniform] = unit
+
+    def get_texture(self, size, components, dtype):
+        texture = self.ctx.texture(size, components, dtype=dtype)
+        texture.filter = (mgl.NEAREST, mgl.NEAREST) #texelFetch only, integer textures have to be nearest
+        return texture
+
+    def grow(self, capacity):
+        old = self.capacity
+        self.capacity = capacity
+        for name in ['position', 'color', 'intensity', 'radius']:
+            array = getattr(self, name)
+            new = np.zeros((capacity,)+array.shape[1:], dtype=array.dtype)
+            new[:old] = array
+            setattr(self, name, new)
+        if self.light_data != None:
+            self.light_data.release()
+        self.light_data = self.get_texture((capacity, 2), 4, 'f4')
+        self.changed = True
+
+    #lights
+    def add(self, position, color=(255,255,255), intensity=1.0, radius=RADIUS):
+        return self.add_many([position], [color], [intensity], [radius])[0]
+
+    def add_many(self, positions, colors, intensities, radii=None):
+        #numbers of the new lights, they stay the same until a light before them is removed
+        count = len(positions)
+        if self.count+count > self.capacity:
+            self.grow(max(self.capacity*2, self.count+count))
+        new = slice(self.count, self.count+count)
+        self.position[new] = positions
+        self.color[new] = colors
+        self.intensity[new] = intensities
+        self.radius[new] = RADIUS if radii is None else radii
+        self.count += count
+        self.changed = True
+        return list(range(new.start, new.stop))
+
+    def remove(self, index):
+        #the last light takes the number of the removed one, like app.lights
+        last = self.count-1
+        for name in ['position', 'color', 'intensity', 'radius']:
+            getattr(self, name)[index] = getattr(self, name)[last]
+        self.count -= 1
+        self.changed = True
+
+    def clear(self):
+        self.count = 0
+        self.changed = True
+
+    def set(self, index, position=None, color=None, intensity=None, radius=None):
+        for name, value in [('position', position), ('color', color), ('intensity', intensity), ('radius', radius)]:
+            if value is not None:
+                getattr(self, name)[index] = value
+        self.changed = True
+
+    #once per frame, before the frame uniforms
+    def update(self):
+        self.shaded = self.assigned = 0
+        if not self.enabled or self.count == 0:
+            return
+        camera = self.app.camera
+        m_proj = camera.m_proj
+        near, far = m_proj[3][2]/(m_proj[2][2]-1), m_proj[3][2]/(m_proj[2][2]+1) #back from the perspective matrix
+        projection = (m_proj[0][0], m_proj[1][1], near, far)
+        if projection != self.projection:
+            self.projection = projection
+            self.bounds = get_cluster_bounds(*projection, self.counts)
+
+        m_view = np.array(camera.m_view.to_list(), dtype='f4') #columns
+        positions = self.position[:self.count]
+        centers = positions @ m_view[:3,:3]+m_view[3,:3]
+        grid, indices = assign_lights(centers, self.radius[:self.count], self.bounds, *projection, self.counts)
+        self.shaded = np.count_nonzero(np.bincount(indices, minlength=self.count))
+        self.assigned = len(indices)
+
+        if self.changed:
+            data = np.zeros((2, self.capacity, 4), dtype='f4')
+            data[0,:self.count,:3], data[0,:self.count,3] = positions, self.radius[:self.count]
+            data[1,:self.count,:3], data[1,:self.count,3] = self.color[:self.count], self.intensity[:self.count]
+            self.light_data.write(data)
+            self.changed = False
+        self.grid.write(grid)
+        rows = max(1, -(-len(indices)//INDEX_WIDTH))
+        if rows > self.indices.height:
+            height = max(rows, self.indices.height*2)
+            self.indices.release()
+            self.indices = self.get_texture((INDEX_WIDTH, height), 1, 'u4')
+        data = np.zeros(rows*INDEX_WIDTH, dtype='u4')
+        data[:len(indices)] = indices
+        self.indices.write(data, viewport=(0, 0, INDEX_WIDTH, rows))
+
+        self.light_data.use(location=LIGHTS_UNIT)
+        self.grid.use(location=GRID_UNIT)
+        self.indices.use(location=INDICES_UNIT)
+
+    def get_block(self):
+        #cluster part of the Lights block: (clusters x, y, z, lights), (screen width, height, slice scale, slice bias)
+        cx, cy, cz = self.counts
+        count = self.count if self.enabled else 0
+        if count == 0 or self.projection == None:
+            return (cx, cy, cz, 0), (1, 1, 0, 0)
+        near, far = self.projection[2:]
+        scale = cz/math.log(far/near)
+        return (cx, cy, cz, count), (*self.app.WIN_SIZE, scale, -math.log(near)*scale)
+
+    def destroy(self):
+        for texture in [self.light_data, self.grid, self.indices]:
+            texture.release()
@@ -0,0 +1,196 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+import glm
+
+from entity_store import SLOT_BITS, SLOT_MASK
+
+MEMORY_LIMIT = 16*1024*1024 #bytes of diffs kept (undo and redo), the oldest commands are dropped past it
+MAX_COMMANDS = 1000
+MERGE_TIME = 0.5 #s, an edit of the same field of the same entities this soon after the last one extends it (drags)
+VALUE_BYTES = 64 #rough size of a python value kept in a diff (names, texture ids, mesh names, intensities)
+
+#fields kept as (n, 3) float arrays, the transforms are written straight into the entity store columns
+VECTORS = ['position', 'rotation', 'scale', 'color']
+COLUMNS = ['position', 'rotation', 'scale']
+
+def get_values(field, values):
+    #values as stored in a change: (n, 3) float32 for the vectors, a list for the rest
+    if field not in VECTORS:
+        return list(values)
+    if isinstance(values, np.ndarray):
+        return values.astype('f4').reshape(-1, 3)
+    return np.array([tuple(value) for value in values], dtype='f4').reshape(-1, 3)
+
+class Change:
+    #one field of a group of entities, before and after
+    __slots__ = ('field', 'ids', 'before', 'after')
+
+    def __init__(self, field, ids, before, after):
+        self.field = field
+        self.ids = ids
+        self.before = before
+        self.after = after
+
+    def get_size(self):
+        size = self.ids.nbytes
+        for values in [self.before, self.after]:
+            size += values.nbytes if isinstance(values, np.ndarray) else len(values)*VALUE_BYTES
+        return size
+
+class Command:
+    #what one undo takes back: a single edit, a merged drag or a whole batch
+    __slots__ = ('label', 'changes', 'time', 'size')
+
+    def __init__(self, label, changes):
+        self.label = label
+        self.changes = changes
+        self.time = time.perf_counter()
+        self.size = sum(change.get_size() for change in changes)
+
+    def can_merge(self, change):
+        if len(self.changes) != 1 or time.perf_counter()-self.time > MERGE_TIME:
+            return False
+        last = self.changes[0]
+        return last.field == change.field and np.array_equal(last.ids, change.ids)
+
+class CommandLog:
+    #undo / redo of the edits of models, as per field diffs keyed by entity id: nothing holds the models,
+    #a removed model is skipped, and a change of many models is applied as one write of the entity store columns
+    def __init__(self, app):
+        self.app = app
+        self.undo_stack = deque()
+        self.redo_stack = deque()
+        self.size = 0 #bytes of both stacks
+        self.batch_changes = None #changes of the batch being recorded
+
+    #recording
+    def edit(self, field, objs, values, label=None):
+        #sets field of every model to its value and records it, objs[i] gets values[i]
+        ids = np.array([obj.entity_id for obj in objs], dtype=np.int64)
+        before = self.get_current(field, objs)
+        after = get_values(field, values)
+        self.apply(field, ids, after)
+        self.record(field, ids, before, after, label)
+
+    def record(self, field, ids, before, after, label=None):
+        #an edit already applied somewhere else
+        change = Change(field, np.asarray(ids, dtype=np.int64), get_values(field, before), get_values(field, after))
+        if self.batch_changes != None:
+            self.add_to_batch(change)
+            return
+        self.clear_redo()
+        top = self.undo_stack[-1] if len(self.undo_stack) > 0 else None
+        if top != None and top.can_merge(change):
+            #a drag: the first before stays, the last after wins
+            self.size -= top.size
+            top.changes[0].after = change.after
+            top.time = time.perf_counter()
+            top.size = top.changes[0].get_size()
+            self.size += top.size
+        else:
+            self.push(self.undo_stack, Command(label or field, [change]))
+        self.trim()
+
+    def add_to_batch(self, change):
+        for other in self.batch_changes:
+            if other.field == change.field and np.array_equal(other.ids, change.ids):
+                other.after = change.after
+                return
+        self.batch_changes.append(change)
+
+    @contextmanager
+    def batch(self, label):
+        #every edit inside is one command, undone at once; a batch inside a batch is part of it
+        if self.batch_changes != None:
+            yield
+            return
+        self.batch_changes = []
+        try:
+            yield
+        finally:
+            changes, self.batch_changes = self.batch_changes, None
+            if len(changes) > 0:
+                self.clear_redo()
+                self.push(self.undo_stack, Command(label, changes))
+                self.trim()
+
+    def push(self, stack, command):
+        stack.append(command)
+        self.size += command.size
+
+    def clear_redo(self):
+        for command in self.redo_stack:
+            self.size -= command.size
+        self.redo_stack.clear()
+
+    def trim(self):
+        #the oldest undo goes first, the redo stack only shrinks when there is nothing left to undo
+        while len(self.undo_stack)+len(self.redo_stack) > 1 and (self.size > MEMORY_LIMIT or len(self.undo_stack)+len(self.redo_stack) > MAX_COMMANDS):
+            stack = self.undo_stack if len(self.undo_stack) > 0 else self.redo_stack
+            self.size -= stack.popleft().size
+
+    #undo, redo
+    def undo(self):
+        if len(self.undo_stack) == 0:
+            return None
+        command = self.undo_stack.pop()
+        for change in reversed(command.changes):
+            self.apply(change.field, change.ids, change.before)
+        self.redo_stack.append(command)
+        command.time = 0 #an edit right after an undo starts a new command
+        return command.label
+
+    def redo(self):
+        if len(self.redo_stack) == 0:
+            return None
+        command = self.redo_stack.pop()
+        for change in command.changes:
+            self.apply(change.field, change.ids, change.after)
+        self.undo_stack.append(command)
+        return command.label
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.size = 0
+
+    #fields
+    def get_current(self, field, objs):
+        if field in COLUMNS:
+            return getattr(self.app.entities, field)[[obj.slot for obj in objs]].copy()
+        if field == 'texture':
+            return [obj.tex_id for obj in objs]
+        if field == 'vao':
+            return [obj.vao_name for obj in objs]
+        return [getattr(obj, field) for obj in objs]
+
+    def apply(self, field, ids, values):
+        #models still alive get their value, the transforms in one write, the matrices are rebuilt with the frame
+        entities = self.app.entities
+        slots = ids & SLOT_MASK
+        alive = entities.generation[slots] == ids >> SLOT_BITS
+        if field in COLUMNS:
+            getattr(entities, field)[slots[alive]] = values[alive]
+            entities.dirty[slots[alive]] = True
+            return
+        for i in np.flatnonzero(alive).tolist():
+            self.set_field(entities.objs[slots[i]], field, values[i])
+
+    def set_field(self, obj, field, value):
+        if field == 'name':
+            obj.name = value
+        elif field == 'texture':
+            obj.tex_id = value
+            obj.texture = self.app.mesh.texture.textures[value]
+        elif field == 'vao':
+            obj.on_init_vao(value)
+            if hasattr(obj, 'shadow_vao'):
+                obj.shadow_vao = self.app.mesh.vao.vaos['shadow_'+value]
+                obj.shadow_program = obj.shadow_vao.program
+        elif field == 'color':
+            obj.color = glm.vec3(*value)
+        else:
+            setattr(obj, field, value)
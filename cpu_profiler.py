@@ -0,0 +1,255 @@
+import os
+import csv
+import time
+import importlib
+from collections import deque
+
+import numpy as np
+import moderngl as mgl
+
+HISTORY = 600 #frames kept for the queries
+CSV_FILE = "cpu_profile.csv"
+CSV_ROWS = 10000 #frames per log file, the full file becomes cpu_profile.csv.1 and a new one starts
+COUNTERS = ('draw_calls', 'uniform_writes', 'bytes_uploaded', 'texture_binds', 'gpu_objects')
+
+#(module, class, method) timed while profiling, under 'class.method'
+TIMED = [('camera', 'Camera', 'check_keys'),
+         ('model', 'Letter', 'update_writting'),
+         ('model', 'BaseModel', 'update_shadow'),
+         ('uniform_buffers', 'FrameUniforms', 'update'), #the light and camera uniforms (buffer_lights before the uniform buffers)
+         ('lights', 'Light', 'update_light_attributes'),
+         ('clustered_lights', 'ClusteredLights', 'update'),
+         ('asset_loader', 'AssetLoader', 'update'),
+         ('entity_store', 'EntityStore', 'update'),
+         ('culling', 'Culling', 'update'),
+         ('lod', 'LodSelector', 'update'),
+         ('instancing', 'InstanceRenderer', 'update'),
+         ('shadow_state', 'ShadowState', 'update'),
+         ('shadow_cache', 'ShadowCache', 'update'),
+         ('scene_renderer', 'SceneRenderer', 'render_shadow'),
+         ('scene_renderer', 'SceneRenderer', 'render'),
+         ('text_renderer', 'TextRenderer', 'render')]
+
+#context methods creating gpu objects
+CREATORS = ['buffer', 'texture', 'depth_texture', 'texture_cube', 'texture_array', 'vertex_array', 'program',
+            'framebuffer', 'simple_framebuffer', 'renderbuffer', 'depth_renderbuffer', 'sampler', 'query']
+
+def get_size(data):
+    return data.nbytes if hasattr(data, 'nbytes') else len(data)
+
+class UniformCounter:
+    #what Program.__getitem__ hands out while profiling: counts the writes, everything else goes to the member
+    __slots__ = ('member', 'profiler')
+
+    def __init__(self, member, profiler):
+        object.__setattr__(self, 'member', member)
+        object.__setattr__(self, 'profiler', profiler)
+
+    def write(self, data):
+        self.profiler.counters['uniform_writes'] += 1
+        return self.member.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.member, name)
+
+    def __setattr__(self, name, value):
+        if name == 'value':
+            self.profiler.counters['uniform_writes'] += 1
+        setattr(self.member, name, value)
+
+class CpuProfiler:
+    #python time of the frame loop (timed methods and scopes) and counts of the gl work it sends
+    #disabled, nothing is hooked: the only cost left is the check in scope()
+    def __init__(self, app):
+        self.app = app
+        self.enabled = False
+        self.originals = [] #(owner, attribute, original) replaced while enabled
+        self.times = {} #name -> seconds this frame
+        self.calls = {} #name -> calls this frame
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.frame_start = None
+        self.frame_number = 0
+        self.history = deque(maxlen=HISTORY) #one dict per finished frame, like get_frame
+        self.log_path = None #rolling csv when set
+        self.log_file = None
+        self.log_writer = None
+        self.log_columns = None
+        self.log_rows = 0
+
+    #switching
+    def enable(self, log_path=None):
+        if not self.enabled:
+            self.install()
+            self.enabled = True
+            self.frame_start = None
+        self.log_path = log_path
+
+    def disable(self):
+        if self.enabled:
+            self.uninstall()
+            self.enabled = False
+        self.close_log()
+
+    def toggle(self, log_path=CSV_FILE):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable(log_path)
+
+    def replace(self, owner, attribute, function):
+        self.originals.append((owner, attribute, owner.__dict__[attribute]))
+        setattr(owner, attribute, function)
+
+    def install(self):
+        for module, class_name, method in TIMED:
+            owner = getattr(importlib.import_module(module), class_name)
+            self.replace(owner, method, self.get_timed(f"{class_name}.{method}", owner.__dict__[method]))
+        counters = self.counters
+        render, buffer_write = mgl.VertexArray.render, mgl.Buffer.write
+        texture_write, texture_use = mgl.Texture.write, mgl.Texture.use
+        get_member, set_member = mgl.Program.__getitem__, mgl.Program.__setitem__
+
+        def counted_render(vao, *args, **kwargs):
+            counters['draw_calls'] += 1
+            return render(vao, *args, **kwargs)
+        def counted_buffer_write(buffer, data, *args, **kwargs):
+            counters['bytes_uploaded'] += get_size(data)
+            return buffer_write(buffer, data, *args, **kwargs)
+        def counted_texture_write(texture, data, *args, **kwargs):
+            counters['bytes_uploaded'] += get_size(data)
+            return texture_write(texture, data, *args, **kwargs)
+        def counted_texture_use(texture, *args, **kwargs):
+            counters['texture_binds'] += 1
+            return texture_use(texture, *args, **kwargs)
+        def counted_get_member(program, key):
+            return UniformCounter(get_member(program, key), self)
+        def counted_set_member(program, key, value):
+            counters['uniform_writes'] += 1
+            return set_member(program, key, value)
+        self.replace(mgl.VertexArray, 'render', counted_render)
+        self.replace(mgl.Buffer, 'write', counted_buffer_write)
+        self.replace(mgl.Texture, 'write', counted_texture_write)
+        self.replace(mgl.Texture, 'use', counted_texture_use)
+        self.replace(mgl.Program, '__getitem__', counted_get_member)
+        self.replace(mgl.Program, '__setitem__', counted_set_member)
+        for name in CREATORS:
+            self.replace(mgl.Context, name, self.get_counted_creator(mgl.Context.__dict__[name]))
+
+    def uninstall(self):
+        for owner, attribute, original in reversed(self.originals):
+            setattr(owner, attribute, original)
+        self.originals = []
+
+    def get_timed(self, name, function):
+        times, calls = self.times, self.calls
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                times[name] = times.get(name, 0)+time.perf_counter()-start
+                calls[name] = calls.get(name, 0)+1
+        return timed
+
+    def get_counted_creator(self, function):
+        counters = self.counters
+        def created(*args, **kwargs):
+            counters['gpu_objects'] += 1
+            return function(*args, **kwargs)
+        return created
+
+    #recording
+    def scope(self, name):
+        #with profiler.scope(name): the time of the block under name (and its calls)
+        return Scope(self, name) if self.enabled else NULL_SCOPE
+
+    def next_frame(self):
+        #a frame runs from one call to the next (GraphicEngine.render calls it first)
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.frame_start != None:
+            frame = {'frame': self.frame_number, 'frame_ms': (now-self.frame_start)*1000}
+            for name, seconds in self.times.items():
+                frame[f"{name}_ms"] = seconds*1000
+                frame[f"{name}_calls"] = self.calls[name]
+            frame.update(self.counters)
+            self.history.append(frame)
+            self.write_log(frame)
+        self.frame_number += 1
+        self.frame_start = now
+        self.times.clear()
+        self.calls.clear()
+        for name in COUNTERS:
+            self.counters[name] = 0
+
+    #queries
+    def get_frame(self, index=-1):
+        #{'frame', 'frame_ms', '<name>_ms', '<name>_calls', counters...} of a finished frame, the last one by default
+        return dict(self.history[index]) if len(self.history) > 0 else None
+
+    def get(self, name, frames=HISTORY):
+        #values of a column over the last frames, 0 for the frames it did not run in
+        return np.array([frame.get(name, 0) for frame in list(self.history)[-frames:]], dtype='f8')
+
+    def get_stats(self, frames=HISTORY):
+        #column -> {'mean', 'p95', 'max'} over the last frames
+        names = sorted(set(name for frame in self.history for name in frame if name != 'frame'))
+        stats = {}
+        for name in names:
+            values = self.get(name, frames)
+            stats[name] = {'mean': float(values.mean()), 'p95': float(np.percentile(values, 95)), 'max': float(values.max())}
+        return stats
+
+    #rolling log
+    def write_log(self, frame):
+        if self.log_path == None:
+            return
+        columns = ['frame', 'frame_ms']+sorted(name for name in frame if name not in ('frame', 'frame_ms'))
+        if self.log_file == None or self.log_rows >= CSV_ROWS or not set(columns) <= set(self.log_columns):
+            self.open_log(columns)
+        self.log_writer.writerow([round(frame.get(name, 0), 4) for name in self.log_columns])
+        self.log_rows += 1
+
+    def open_log(self, columns):
+        #a full log, or a log without a column that just appeared, is kept as .1 and a new one starts
+        self.close_log()
+        if os.path.exists(self.log_path):
+            os.replace(self.log_path, self.log_path+'.1')
+        self.log_file = open(self.log_path, 'w', newline='', encoding='utf-8')
+        self.log_writer = csv.writer(self.log_file)
+        self.log_columns = columns
+        self.log_writer.writerow(columns)
+        self.log_rows = 0
+
+    def close_log(self):
+        if self.log_file != None:
+            self.log_file.close()
+            self.log_file = None
+            self.log_writer = None
+
+class Scope:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        times, calls = self.profiler.times, self.profiler.calls
+        times[self.name] = times.get(self.name, 0)+time.perf_counter()-self.start
+        calls[self.name] = calls.get(self.name, 0)+1
+
+class NullScope:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+NULL_SCOPE = NullScope()
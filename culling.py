@@ -0,0 +1,69 @@
+import numpy as np
+import glm
+
+def get_matrices(mats):
+    #glm matrices -> (n,4,4) numpy, still column major (mats[k][column][row])
+    if len(mats) == 0:
+        return np.zeros((0,4,4), dtype='f4')
+    return np.frombuffer(glm.array(mats).to_bytes(), dtype='f4').reshape(-1,4,4)
+
+def get_frustum_planes(m_vps):
+    #the 6 planes (a,b,c,d) of every view projection matrix, pointing inside, (n,6,4)
+    rows = m_vps.transpose(0,2,1) #glm is column major
+    planes = np.stack([rows[:,3]+rows[:,0], rows[:,3]-rows[:,0],
+                       rows[:,3]+rows[:,1], rows[:,3]-rows[:,1],
+                       rows[:,3]+rows[:,2], rows[:,3]-rows[:,2]], axis=1)
+    return planes/np.maximum(np.linalg.norm(planes[:,:,:3], axis=2, keepdims=True), 1e-12)
+
+def get_world_spheres(m_models, mesh_spheres):
+    #mesh spheres (x,y,z,r) moved by their model matrix, the biggest axis scales the radius
+    centers = np.einsum('kcr,kc->kr', m_models[:,:3,:3], mesh_spheres[:,:3])+m_models[:,3,:3]
+    scale = np.linalg.norm(m_models[:,:3,:3], axis=2).max(axis=1)
+    return np.hstack([centers, (mesh_spheres[:,3]*scale)[:,None]])
+
+def spheres_in_frustums(planes, spheres):
+    #(frustums, spheres) True where the sphere touches the frustum
+    if len(spheres) == 0:
+        return np.zeros((len(planes), 0), dtype=bool)
+    dist = planes[:,:,:3] @ spheres[:,:3].T + planes[:,:,3:] #(frustums, planes, spheres)
+    return np.all(dist >= -spheres[:,3], axis=1)
+
+class Culling:
+    #bounding spheres of the scene, tested against the camera and the light frustums
+    def __init__(self, app):
+        self.app = app
+        self.mesh_spheres = {} #vao_name -> (x,y,z,r) around the box of the bounds registry
+        self.m_models = np.zeros((0,4,4), dtype='f4') #app.scene order
+        self.spheres = np.zeros((0,4), dtype='f4')
+        self.casters = np.zeros(0, dtype=bool) #everything but the light models
+        self.visible = np.zeros(0, dtype=bool) #inside the camera frustum
+        self.rejected = {} #pass name -> objects culled in that pass, last frame
+
+    def get_mesh_sphere(self, vao_name):
+        bounds = self.app.mesh.vao.bounds[vao_name]
+        if vao_name not in self.mesh_spheres or self.mesh_spheres[vao_name][0] is not bounds:
+            center = (bounds[0]+bounds[1])/2
+            radius = np.linalg.norm(bounds[1]-bounds[0])/2
+            self.mesh_spheres[vao_name] = (bounds, (*center, radius))
+        return self.mesh_spheres[vao_name][1]
+
+    def update(self):
+        #once per frame, before anything is drawn
+        scene = self.app.scene
+        self.m_models = self.app.entities.get_models(self.app.entities.get_scene_slots())
+        mesh_spheres = np.array([self.get_mesh_sphere(obj.vao_name) for obj in scene], dtype='f4').reshape(-1,4)
+        self.spheres = get_world_spheres(self.m_models, mesh_spheres)
+        self.casters = np.array([obj.vao_name != "light" for obj in scene], dtype=bool)
+
+        camera = self.app.camera
+        planes = get_frustum_planes(get_matrices([camera.m_proj*camera.m_view]))
+        self.visible = spheres_in_frustums(planes, self.spheres)[0]
+        self.rejected = {'main': int(len(scene)-self.visible.sum())}
+
+    def get_shadow_visible(self, slots, name):
+        #casters inside at least one of the light face slots (m_light_vp of the shadow state)
+        m_light_vp = self.app.scene_renderer.shadow_state.m_light_vp.reshape(-1,4,4)
+        planes = get_frustum_planes(m_light_vp[slots])
+        visible = spheres_in_frustums(planes, self.spheres).any(axis=0) & self.casters
+        self.rejected[name] = int(self.casters.sum()-visible.sum())
+        return visible
@@ -0,0 +1,253 @@
+import numpy as np
+import glm
+
+SLOT_BITS = 32 #entity id = generation << SLOT_BITS | slot
+SLOT_MASK = (1<<SLOT_BITS)-1
+INSTANCE_FLOATS = 25 #mat4 model + mat3 normal, the per instance layout of the instanced programs
+
+def get_normal_matrices(m_models):
+    #transpose(inverse(mat3(m))) for a whole (n,4,4) batch of column major matrices
+    #the cofactor matrix has the same directions and never breaks on a flat (scale 0) object
+    c0, c1, c2 = m_models[:,0,:3], m_models[:,1,:3], m_models[:,2,:3]
+    normals = np.stack([np.cross(c1, c2), np.cross(c2, c0), np.cross(c0, c1)], axis=1)
+    det = np.einsum('ij,ij->i', c0, normals[:,0])
+    return normals*np.sign(det)[:,None,None]
+
+def get_model_matrices(position, rotation, scale, set_scale, mesh_scale):
+    #BaseModel.get_model_matrix for a whole batch: translate * rotate x, y, z * scale, column major like glm
+    rad = np.radians(rotation)
+    c, s = np.cos(rad), np.sin(rad)
+    one, zero = np.ones(len(rad)), np.zeros(len(rad))
+    rot_x = np.stack([one, zero, zero, zero, c[:,0], -s[:,0], zero, s[:,0], c[:,0]], axis=1).reshape(-1,3,3)
+    rot_y = np.stack([c[:,1], zero, s[:,1], zero, one, zero, -s[:,1], zero, c[:,1]], axis=1).reshape(-1,3,3)
+    rot_z = np.stack([c[:,2], -s[:,2], zero, s[:,2], c[:,2], zero, zero, zero, one], axis=1).reshape(-1,3,3)
+    #scale axes are (x, z, y), imported meshes are brought back to a size of 2 by their mesh scale
+    axes = scale[:,[0,2,1]]
+    axes = np.where(set_scale[:,None], axes/(mesh_scale/2), axes)
+    translation = position.copy()
+    translation[:,1] -= np.where(set_scale, scale[:,1], 0)
+
+    m_models = np.zeros((len(rad),4,4), dtype='f4')
+    m_models[:,:3,:3] = (rot_x @ rot_y @ rot_z * axes[:,None,:]).transpose(0,2,1)
+    m_models[:,3,:3] = translation
+    m_models[:,3,3] = 1
+    return m_models
+
+class EntityStore:
+    #transforms of every model in contiguous arrays, models only keep their slot
+    #slots are reused, so outside references keep the generational entity id
+    def __init__(self, app, capacity=64):
+        self.app = app
+        self.capacity = 0
+        self.next_slot = 0
+        self.free = [] #slots of removed entities
+        self.objs = []
+        self.generation = np.zeros(0, dtype=np.int64)
+        self.position = np.zeros((0,3), dtype='f4')
+        self.rotation = np.zeros((0,3), dtype='f4')
+        self.scale = np.zeros((0,3), dtype='f4')
+        self.set_scale = np.zeros(0, dtype=bool)
+        self.mesh_scale = np.ones((0,3), dtype='f4')
+        self.instance_data = np.zeros((0,INSTANCE_FLOATS), dtype='f4') #model then normal matrix, ready to upload
+        self.dirty = np.zeros(0, dtype=bool) #transform changed, matrices not rebuilt yet
+        self.version = np.zeros(0, dtype=np.int64) #goes up every time the matrix, the mesh or its level of detail changes
+        self.lod = np.zeros(0, dtype=np.int64) #level of detail drawn, -1 until the first frame (see lod.py)
+
+        #indexes, value -> set of entity ids
+        self.names = {}
+        self.textures = {}
+
+        #the scene, dense so it can be iterated and gathered, removal swaps the last object in
+        self.scene = []
+        self.scene_slots = np.zeros(0, dtype=np.int64)
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        old = self.capacity
+        self.capacity = capacity
+        self.objs += [None]*(capacity-old)
+        for name in ['generation', 'position', 'rotation', 'scale', 'set_scale', 'mesh_scale', 'instance_data', 'dirty', 'version', 'lod', 'scene_slots']:
+            array = getattr(self, name)
+            new = np.zeros((capacity,)+array.shape[1:], dtype=array.dtype)
+            new[:old] = array
+            setattr(self, name, new)
+        self.mesh_scale[old:] = 1
+        self.lod[old:] = -1
+
+    #entities
+    def add(self, obj, position, rotation, scale):
+        if len(self.free) > 0:
+            slot = self.free.pop()
+        else:
+            if self.next_slot == self.capacity:
+                self.grow(self.capacity*2)
+            slot = self.next_slot
+            self.next_slot += 1
+        self.objs[slot] = obj
+        self.position[slot] = tuple(position)
+        self.rotation[slot] = tuple(rotation)
+        self.scale[slot] = tuple(scale)
+        self.set_scale[slot] = False
+        self.mesh_scale[slot] = 1
+        self.dirty[slot] = True
+        self.lod[slot] = -1
+        obj.slot = slot
+        obj.entity_id = int(self.generation[slot]) << SLOT_BITS | slot
+        return obj.entity_id
+
+    def add_many(self, objs, positions, rotations, scales):
+        #add for a whole batch: the columns are written once, free slots are taken first like add
+        count = len(objs)
+        reused = [self.free.pop() for _ in range(min(count, len(self.free)))]
+        end = self.next_slot+count-len(reused)
+        if end > self.capacity:
+            self.grow(max(self.capacity*2, end))
+        slots = np.array(reused+list(range(self.next_slot, end)), dtype=np.int64)
+        self.next_slot = end
+        self.position[slots] = positions
+        self.rotation[slots] = rotations
+        self.scale[slots] = scales
+        self.set_scale[slots] = False
+        self.mesh_scale[slots] = 1
+        self.dirty[slots] = True
+        self.lod[slots] = -1
+        ids = (self.generation[slots] << SLOT_BITS | slots).tolist()
+        for obj, slot, entity_id in zip(objs, slots.tolist(), ids):
+            self.objs[slot] = obj
+            obj.slot = slot
+            obj.entity_id = entity_id
+        return slots
+
+    def remove(self, obj):
+        if not self.contains(obj):
+            return
+        if obj.scene_index >= 0:
+            self.remove_from_scene(obj)
+        self.unindex(self.names, obj.name, obj.entity_id)
+        self.unindex(self.textures, obj.tex_id, obj.entity_id)
+        self.app.mesh.vao.registry.release(obj.mesh_name)
+        obj.mesh_name = None
+        self.objs[obj.slot] = None
+        self.generation[obj.slot] += 1 #every old id of this slot is now invalid
+        self.dirty[obj.slot] = False
+        self.free.append(obj.slot)
+
+    def get(self, entity_id):
+        #the model behind an id, None once it has been removed
+        slot = entity_id & SLOT_MASK
+        if slot >= self.capacity or self.generation[slot] != entity_id >> SLOT_BITS:
+            return None
+        return self.objs[slot]
+
+    def contains(self, obj):
+        return self.get(obj.entity_id) is obj
+
+    #scene
+    def add_to_scene(self, obj):
+        obj.scene_index = len(self.scene)
+        self.scene_slots[obj.scene_index] = obj.slot
+        self.scene.append(obj)
+        return obj
+
+    def add_many_to_scene(self, objs):
+        start = len(self.scene)
+        for i, obj in enumerate(objs):
+            obj.scene_index = start+i
+        self.scene_slots[start:start+len(objs)] = [obj.slot for obj in objs]
+        self.scene += objs
+        return objs
+
+    def remove_from_scene(self, obj):
+        last = self.scene.pop()
+        if last is not obj:
+            self.scene[obj.scene_index] = last
+            self.scene_slots[obj.scene_index] = last.slot
+            last.scene_index = obj.scene_index
+        obj.scene_index = -1
+
+    def get_scene_slots(self):
+        return self.scene_slots[:len(self.scene)]
+
+    #indexes
+    def unindex(self, index, key, entity_id):
+        if key in index:
+            index[key].discard(entity_id)
+            if len(index[key]) == 0:
+                index.pop(key)
+
+    def reindex(self, index, old, new, entity_id):
+        self.unindex(index, old, entity_id)
+        index.setdefault(new, set()).add(entity_id)
+
+    def index_many(self, index, keys, entity_ids):
+        #reindex for a batch of new entities, keys[i] is the key of entity_ids[i]
+        for key, entity_id in zip(keys, entity_ids):
+            index.setdefault(key, set()).add(entity_id)
+
+    def get_by_name(self, name):
+        return [self.objs[entity_id & SLOT_MASK] for entity_id in self.names.get(name, ())]
+
+    def get_by_texture(self, tex_id):
+        return [self.objs[entity_id & SLOT_MASK] for entity_id in self.textures.get(tex_id, ())]
+
+    #transforms
+    def set_mesh(self, obj):
+        #the model holds a reference on its mesh in the registry of the vao, moved when it changes mesh
+        registry = self.app.mesh.vao.registry
+        if obj.mesh_name != obj.vao_name:
+            registry.acquire(obj.vao_name)
+            if obj.mesh_name != None:
+                registry.release(obj.mesh_name)
+            obj.mesh_name = obj.vao_name
+        #imported meshes are scaled by their own size (bounds registry of the vao)
+        self.set_scale[obj.slot] = obj.set_scale
+        if obj.set_scale:
+            self.mesh_scale[obj.slot] = tuple(self.app.mesh.vao.scales[obj.vao_name])
+        self.dirty[obj.slot] = True
+        self.version[obj.slot] += 1
+
+    def set_meshes(self, objs, slots):
+        #set_mesh for a batch of new entities (no mesh yet), one registry and bounds lookup per mesh
+        registry = self.app.mesh.vao.registry
+        groups = {}
+        for obj, slot in zip(objs, slots.tolist()):
+            groups.setdefault(obj.vao_name, []).append(slot)
+        for vao_name, group in groups.items():
+            registry.acquire(vao_name, len(group))
+            set_scale = vao_name not in ["cube", "pyramid"]
+            self.set_scale[group] = set_scale
+            if set_scale:
+                self.mesh_scale[group] = tuple(self.app.mesh.vao.scales[vao_name])
+        for obj in objs:
+            obj.mesh_name = obj.vao_name
+            obj.set_scale = obj.vao_name not in ["cube", "pyramid"]
+        self.dirty[slots] = True
+        self.version[slots] += 1
+
+    def update(self):
+        #rebuilds the matrices of every dirty entity in one batch
+        slots = np.flatnonzero(self.dirty[:self.next_slot])
+        if len(slots) == 0:
+            return
+        m_models = get_model_matrices(self.position[slots], self.rotation[slots], self.scale[slots], self.set_scale[slots], self.mesh_scale[slots])
+        self.write_models(slots, m_models)
+
+    def write_models(self, slots, m_models):
+        self.instance_data[slots,:16] = m_models.reshape(-1,16)
+        self.instance_data[slots,16:] = get_normal_matrices(m_models).reshape(-1,9)
+        self.dirty[slots] = False
+        self.version[slots] += 1
+
+    def get_models(self, slots):
+        #(n,4,4) column major model matrices, up to date
+        self.update()
+        return self.instance_data[slots,:16].reshape(-1,4,4)
+
+    def get_model(self, slot):
+        if self.dirty[slot]:
+            self.update()
+        return glm.mat4.from_bytes(self.instance_data[slot,:16].tobytes())
+
+    def set_model(self, slot, m_model):
+        #a matrix written from outside wins over the transform until the transform changes again
+        self.write_models(np.array([slot]), np.frombuffer(m_model.to_bytes(), dtype='f4').reshape(1,4,4))
@@ -0,0 +1,111 @@
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+READBACK_LATENCY = 3 #frames between a query and its readback, the gpu is done with it by then so nothing waits
+TRACE_FRAMES = 600 #frames kept for the trace export
+SMOOTHING = 0.1 #weight of the newest frame in the on screen averages
+TRACE_FILE = "gpu_trace.json"
+
+class GpuTimers:
+    #one time elapsed query per pass (shadow map or cube face, scene, ui, letters, light gizmos)
+    #gl time queries cannot be nested, so the passes are timed one after the other and a scope inside a scope is not timed
+    def __init__(self, app, latency=READBACK_LATENCY):
+        self.app = app
+        self.ctx = app.ctx
+        self.enabled = True
+        self.shown = False #on screen breakdown
+        self.latency = latency
+        self.free = [] #queries read back, ready to be used again
+        self.frame = None #(frame number, cpu start, [(name, query, cpu start, cpu end)]) being recorded
+        self.frame_number = 0
+        self.pending = deque() #recorded frames waiting for their readback
+        self.history = deque(maxlen=TRACE_FRAMES) #(frame number, cpu start, [(name, cpu start, cpu end, gpu ms)])
+        self.averages = {} #pass name -> smoothed gpu ms
+        self.last = {} #pass name -> gpu ms of the last frame read back
+        self.active = False
+
+    def begin_frame(self):
+        #once per frame before any pass, the frames old enough are read back
+        if self.frame != None and len(self.frame[2]) > 0:
+            self.pending.append(self.frame)
+        self.frame_number += 1
+        self.frame = (self.frame_number, time.perf_counter(), []) if self.enabled else None
+        while len(self.pending) > 0 and self.pending[0][0] <= self.frame_number-self.latency:
+            self.read(self.pending.popleft())
+
+    def flush(self):
+        #reads back every frame recorded so far, the current one included (waits for the gpu when it is not done)
+        if self.frame != None and len(self.frame[2]) > 0:
+            self.pending.append(self.frame)
+        self.frame = None
+        while len(self.pending) > 0:
+            self.read(self.pending.popleft())
+
+    def read(self, frame):
+        number, start, scopes = frame
+        passes = []
+        self.last = {}
+        for name, query, cpu_start, cpu_end in scopes:
+            elapsed = query.elapsed/1e6
+            self.free.append(query)
+            passes.append((name, cpu_start, cpu_end, elapsed))
+            self.last[name] = self.last.get(name, 0)+elapsed
+        for name, elapsed in self.last.items():
+            self.averages[name] = self.averages.get(name, elapsed)*(1-SMOOTHING)+elapsed*SMOOTHING
+        #passes that did not run this frame fade out
+        for name in [name for name in self.averages if name not in self.last]:
+            self.averages[name] *= 1-SMOOTHING
+            if self.averages[name] < 1e-3:
+                self.averages.pop(name)
+        self.history.append((number, start, passes))
+
+    @contextmanager
+    def scope(self, name):
+        if self.frame == None or self.active:
+            yield
+            return
+        query = self.free.pop() if len(self.free) > 0 else self.ctx.query(time=True)
+        self.active = True
+        start = time.perf_counter()
+        try:
+            with query:
+                yield
+        finally:
+            self.active = False
+            self.frame[2].append((name, query, start, time.perf_counter()))
+
+    def get_breakdown(self):
+        #(pass name, smoothed gpu ms), heaviest first, then the total
+        rows = sorted(self.averages.items(), key=lambda row: -row[1])
+        return rows+[('total', sum(self.averages.values()))]
+
+    def get_trace(self):
+        #chrome://tracing (or perfetto) events: cpu time of every pass on one track, gpu time on another
+        #the gpu gives durations only, its passes are laid one after the other from the start of the frame
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 1, 'args': {'name': 'cpu'}},
+                  {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 2, 'args': {'name': 'gpu'}}]
+        for number, start, passes in self.history:
+            gpu_time = start
+            for name, cpu_start, cpu_end, elapsed in passes:
+                events.append({'name': name, 'cat': 'cpu', 'ph': 'X', 'pid': 1, 'tid': 1,
+                               'ts': cpu_start*1e6, 'dur': (cpu_end-cpu_start)*1e6, 'args': {'frame': number}})
+                gpu_time = max(gpu_time, cpu_start)
+                events.append({'name': name, 'cat': 'gpu', 'ph': 'X', 'pid': 1, 'tid': 2,
+                               'ts': gpu_time*1e6, 'dur': elapsed*1e3, 'args': {'frame': number}})
+                gpu_time += elapsed/1e3
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_trace(self, path=TRACE_FILE):
+        with open(path, 'w') as file:
+            json.dump(self.get_trace(), file)
+        return path
+
+    def render_breakdown(self):
+        #queued with the other labels, above the fps counter
+        if not self.shown:
+            return
+        for i, (name, elapsed) in enumerate(reversed(self.get_breakdown())):
+            text = f"{name.upper():<22}{elapsed:7.2f} MS"
+            self.app.text_renderer.add(text, (-5.6, -44+2.4*(i+1), 0), (0.150, 0.022, 0), (1,1,1), (20/255, 35/255, 43/255))
@@ -0,0 +1,116 @@
+import numpy as np
+
+INSTANCE_SIZE = 25*4 #mat4 model + mat3 normal, in bytes
+
+class InstanceGroup:
+    #every scene object sharing the same vao, texture and level of detail, drawn with a single call
+    def __init__(self, app, vao_name, tex_id, level=0):
+        self.app = app
+        self.ctx = app.ctx
+        self.vao_name = vao_name
+        self.tex_id = tex_id
+        self.level = level
+        self.objs = []
+        self.indices = [] #place of every obj in app.scene
+        self.data = np.zeros((0,25), dtype='f4')
+        self.uploaded = None #culling mask of what is in the instance buffer right now
+        self.count = 0
+        self.capacity = 16
+        self.instance_buffer = self.ctx.buffer(reserve=self.capacity*INSTANCE_SIZE, dynamic=True)
+        self.vbo = None
+        self.vao = None
+        self.shadow_vao = None
+        self.set_vaos()
+
+    def set_vaos(self):
+        #(re)builds the vaos around the current mesh vbo of this vao_name
+        self.release_vaos()
+        vao = self.app.mesh.vao
+        self.vbo = vao.vbo.vbos[self.vao_name]
+        self.vao = vao.get_instanced_vao(vao.program.programs['default_instanced'], self.vbo, self.instance_buffer)
+        self.shadow_vao = vao.get_instanced_vao(vao.program.programs['shadow_map_instanced'], self.vbo, self.instance_buffer)
+
+    def write(self, instance_data):
+        #model and normal matrices of every object of the group (instance_data in app.scene order)
+        self.uploaded = None
+        if len(self.objs) == 0:
+            return
+        if self.vbo is not self.app.mesh.vao.vbo.vbos[self.vao_name]: #the mesh was reloaded under the same name
+            self.set_vaos()
+        if len(self.objs) > self.capacity:
+            while self.capacity < len(self.objs):
+                self.capacity *= 2
+            self.instance_buffer.orphan(self.capacity*INSTANCE_SIZE)
+
+        self.data = instance_data[self.indices]
+
+    def upload(self, visible):
+        #only the instances that survived the culling of the pass, the buffer is rewritten when the set changes
+        mask = visible[self.indices]
+        if self.uploaded is None or not np.array_equal(mask, self.uploaded):
+            self.count = int(mask.sum())
+            if self.count > 0:
+                self.instance_buffer.write(self.data[mask])
+            self.uploaded = mask
+        return self.count
+
+    def render(self, visible):
+        if len(self.objs) == 0 or self.upload(visible) == 0:
+            return
+        self.app.mesh.texture.textures[self.tex_id].use(location = 0)
+        self.app.scene_renderer.lod.render(self.vao, self.vbo, self.level, instances=self.count)
+
+    def render_shadow(self, visible):
+        if len(self.objs) == 0 or self.upload(visible) == 0:
+            return
+        self.app.scene_renderer.lod.render(self.shadow_vao, self.vbo, self.level, shadow=True, instances=self.count)
+
+    def release_vaos(self):
+        if self.vao != None:
+            self.vao.release()
+            self.shadow_vao.release()
+
+    def destroy(self):
+        self.release_vaos()
+        self.instance_buffer.release()
+
+class InstanceRenderer:
+    #groups app.scene by (vao_name, tex_id, level of detail) so every group costs one draw call per pass
+    def __init__(self, app):
+        self.app = app
+        self.groups = {}
+        self.program = app.mesh.vao.program.programs['default_instanced']
+        self.program['u_texture_0'] = 0
+
+    def update(self, instance_data):
+        #regroup the scene and refill every instance buffer, once per frame
+        for group in self.groups.values():
+            group.objs = []
+            group.indices = []
+        levels = self.app.scene_renderer.lod.levels.tolist()
+        for i, obj in enumerate(self.app.scene):
+            key = (obj.vao_name, obj.tex_id, levels[i])
+            if key not in self.groups:
+                self.groups[key] = InstanceGroup(self.app, obj.vao_name, obj.tex_id, levels[i])
+            self.groups[key].objs.append(obj)
+            self.groups[key].indices.append(i)
+        for key in [key for key, group in self.groups.items() if len(group.objs) == 0]:
+            self.groups.pop(key).destroy()
+        for group in self.groups.values():
+            group.write(instance_data)
+
+    def render(self, visible):
+        #camera, lights and shadow matrices are already in the per frame uniform buffers
+        for group in self.groups.values():
+            group.render(visible)
+
+    def render_shadow(self, visible):
+        #the light and the faces of the pass are set by SceneRenderer.set_shadow_pass
+        for group in self.groups.values():
+            if group.vao_name != "light":
+                group.render_shadow(visible)
+
+    def destroy(self):
+        for group in self.groups.values():
+            group.destroy()
+        self.groups.clear()
@@ -20,33 +20,47 @@ class Light():
         if self.type_of_light == "point":
             self.m_view_l = self.get_point_view_mat()
             self.m_proj_l = self.get_point_proj_mat()
+
+        #goes up every time the light matrices change, its shadow map compares it to the one it was rendered with
+        self.version = 0
+        self.shadow_key = self.get_shadow_key()
         self.app.scene_renderer.add_shadow(param=param)
 
     def delete(self):
+        #the last shadow map takes the place of this one, like the last light in destroy
         self.app.scene_renderer.remove_shadow(self.indexe)
-        #we need to put everything back
-        for light in self.app.lights:
-            if light.indexe>=self.indexe:
-                light.indexe-=1
+        self.app.entities.remove(self.light_ui)
 
 
     def destroy(self):
-        self.app.lights.pop(self.indexe)
+        last = self.app.lights.pop()
+        if last is not self:
+            self.app.lights[self.indexe] = last
+            last.indexe = self.indexe
         self.delete()
 
     def create_ui(self):
         self.light_ui = model.Light(self.app,self,self.position, intensity=self.intensity, color=self.color, name = self.name)
     
     def update_light_attributes(self):
-        if self.type_of_light == 'point':
-            self.set_point_view_mat()
-        else:
-            self.set_dir_view_mat()
-        
         self.position = self.light_ui.position
         self.intensity = self.light_ui.intensity
         self.color = self.light_ui.color
 
+        #the view matrices only depend on the position and direction
+        shadow_key = self.get_shadow_key()
+        if shadow_key != self.shadow_key:
+            self.shadow_key = shadow_key
+            self.version += 1
+            if self.type_of_light == 'point':
+                self.set_point_view_mat()
+            else:
+                self.set_dir_view_mat()
+
+    def get_shadow_key(self):
+        #copied values, position is shared with (and moved through) the light ui
+        return (tuple(self.position), tuple(self.direction))
+
     def set_dir_view_mat(self):
         self.m_view_l = self.get_dir_view_mat()
     def get_dir_view_mat(self):
@@ -0,0 +1,56 @@
+import numpy as np
+
+LOD_SCREEN_SIZES = (0.4, 0.2, 0.08) #screen height covered by an object's bounding sphere under which it drops one more level
+LOD_HYSTERESIS = 0.15 #back to a finer level only this much over its threshold, so an object on the edge does not pop every frame
+SHADOW_LOD_BIAS = 1 #the shadow passes draw this many levels coarser than the camera pass
+
+class LodSelector:
+    #level of detail of every scene object, from the size of its bounding sphere on screen (levels come from mesh_lod.py)
+    def __init__(self, app):
+        self.app = app
+        self.enabled = True
+        self.thresholds = LOD_SCREEN_SIZES
+        self.hysteresis = LOD_HYSTERESIS
+        self.shadow_bias = SHADOW_LOD_BIAS
+        self.levels = np.zeros(0, dtype=np.int64) #app.scene order
+        self.triangles = {'main': 0, 'shadow': 0} #submitted during the last frame
+        self.counting = {'main': 0, 'shadow': 0} #this frame so far
+
+    def get_screen_sizes(self, spheres):
+        #diameter of the spheres over the screen height, m_proj[1][1] is 1/tan(fov/2)
+        camera = self.app.camera
+        distances = np.linalg.norm(spheres[:,:3]-np.array(camera.position), axis=1)
+        return spheres[:,3]*camera.m_proj[1][1]/np.maximum(distances, 1e-6)
+
+    def update(self):
+        #once per frame, after the culling placed the bounding spheres
+        self.triangles, self.counting = self.counting, {'main': 0, 'shadow': 0}
+        entities = self.app.entities
+        slots = entities.get_scene_slots()
+        vbos = self.app.mesh.vao.vbo.vbos
+        counts = np.array([vbos[obj.vao_name].get_lod_count() for obj in self.app.scene], dtype=np.int64)
+        previous = entities.lod[slots]
+        if self.enabled:
+            sizes = self.get_screen_sizes(self.app.scene_renderer.culling.spheres)
+            thresholds = np.array(self.thresholds, dtype='f4')
+            coarse = (sizes[:,None] < thresholds).sum(axis=1)
+            fine = (sizes[:,None] < thresholds*(1+self.hysteresis)).sum(axis=1)
+            #coarser right away, finer once past the threshold and its margin
+            levels = np.where((previous < 0) | (coarse >= previous), coarse, np.minimum(previous, fine))
+        else:
+            levels = np.zeros(len(slots), dtype=np.int64)
+        levels = np.minimum(levels, counts-1)
+        #another level is another shape in the shadow maps
+        entities.version[slots[(previous >= 0) & (previous != levels)]] += 1
+        entities.lod[slots] = levels
+        self.levels = levels
+
+    def render(self, vao, vbo, level, shadow=False, instances=-1):
+        #draws a level of vbo through vao, coarser in the shadow passes, and counts the triangles sent
+        count, first = vbo.get_lod(max(level, 0)+(self.shadow_bias if shadow else 0))
+        vao.render(vertices=count, first=first, instances=instances)
+        self.counting['shadow' if shadow else 'main'] += count//3*max(instances, 1)
+
+    def get_stats(self):
+        return {'triangles': dict(self.triangles),
+                'levels': np.bincount(self.levels, minlength=len(self.thresholds)+1).tolist()}
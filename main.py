@@ -1,6 +1,5 @@
 #imports
 import pygame as pg
-import tkinter as tk
 import moderngl as mgl
 import ctypes
 import copy
@@ -11,29 +10,50 @@ from model import *
 from camera import *
 from lights import *
 from scene_renderer import *
+from uniform_buffers import FrameUniforms
 from mesh import Mesh
-from tkinter import ttk, filedialog 
-from tkinter.filedialog import askopenfile 
+from asset_loader import AssetLoader
+from text_renderer import TextRenderer
+from entity_store import EntityStore
+from gpu_timers import GpuTimers
+from cpu_profiler import CpuProfiler
+from property_editor import PropertyEditor
+from clustered_lights import ClusteredLights
+from world_stream import WorldStreamer, WORLD_DIR
 
 
 #classes
+def get_headless_context():
+    #no window: egl when there is no display server (linux ci), else whatever standalone context the platform has
+    try:
+        return mgl.create_context(standalone=True, backend='egl', require=410)
+    except Exception:
+        return mgl.create_context(standalone=True, require=410)
+
 class GraphicEngine:
-    def __init__(self, win_size=(1000,1000)):
+    def __init__(self, win_size=(1000,1000), headless=False):
         #init pygame modules and set up
         pg.init()
         self.font = pg.font.SysFont('merryweather', 100)
         #window size manager
         self.WIN_SIZE = win_size
-        #opengl attribute with pygame
-        pg.display.set_caption('ARCHEO') #the name of the game engine
-        pg.display.gl_set_attribute(pg.GL_CONTEXT_MAJOR_VERSION, 3)
-        pg.display.gl_set_attribute(pg.GL_CONTEXT_MINOR_VERSION, 3)
-        pg.display.gl_set_attribute(pg.GL_CONTEXT_PROFILE_MASK, pg.GL_CONTEXT_PROFILE_CORE)
-        #opengl context creation
-        
-        self.display_surface = pg.display.set_mode(self.WIN_SIZE, flags=pg.OPENGL | pg.DOUBLEBUF)
-        #detect current opengl for usage
-        self.ctx = mgl.create_context()
+        self.headless = headless #offscreen, for the benchmarks (benchmark.py)
+        if headless:
+            self.ctx = get_headless_context()
+            self.screen = self.ctx.simple_framebuffer(self.WIN_SIZE) #stands for the window
+            self.screen.use()
+        else:
+            #opengl attribute with pygame
+            pg.display.set_caption('ARCHEO') #the name of the game engine
+            pg.display.gl_set_attribute(pg.GL_CONTEXT_MAJOR_VERSION, 3)
+            pg.display.gl_set_attribute(pg.GL_CONTEXT_MINOR_VERSION, 3)
+            pg.display.gl_set_attribute(pg.GL_CONTEXT_PROFILE_MASK, pg.GL_CONTEXT_PROFILE_CORE)
+            #opengl context creation
+
+            self.display_surface = pg.display.set_mode(self.WIN_SIZE, flags=pg.OPENGL | pg.DOUBLEBUF)
+            #detect current opengl for usage
+            self.ctx = mgl.create_context()
+            self.screen = self.ctx.screen
         self.ctx.enable(flags=mgl.DEPTH_TEST | mgl.CULL_FACE)
         #camera
         self.camera = Camera(self)
@@ -44,10 +64,21 @@ class GraphicEngine:
         self.fps = 0 
 
         #mesh, vbo and vao set up
+        self.loader = AssetLoader(self) #obj and image files are parsed on worker pools, uploaded a bit every frame
         self.mesh = Mesh(self) #contains the textures
+        self.text_renderer = TextRenderer(self) #glyph atlas, every letter in one draw call
+        self.frame_uniforms = FrameUniforms(self) #camera and lights, uploaded once per frame
+        self.point_lights = ClusteredLights(self) #shadowless point lights, as many as needed (the shadowed ones are self.lights)
+        self.entities = EntityStore(self) #transforms of every model, ids, name and texture indexes
+        self.gpu_timers = GpuTimers(self) #gpu time of every pass, read back a few frames later (F3 shows it, F4 saves a trace)
+        self.editor = PropertyEditor(self) #property panel next to the window, its edits are applied by the frame loop
+        self.cpu_profiler = CpuProfiler(self) #python time and gl calls per frame, off until F5 (cpu_profile.csv)
+
+        #a world split in chunks is streamed around the camera instead of loaded at once (world_stream.py)
+        self.world = WorldStreamer(self) if os.path.isdir(WORLD_DIR) else None
 
         #saved data loading:
-        self.camera.load_imports()
+        self.camera.load_imports(lazy=self.world != None)
 
         #scene rendering program
         self.scene_renderer = SceneRenderer(self)
@@ -57,7 +88,7 @@ class GraphicEngine:
         self.light_set_up()
 
 
-        self.scene = []
+        self.scene = self.entities.scene #dense list, add and remove through self.entities
         self.scene_set_up()
         self.ui = []
         self.ui_set_up()
@@ -71,11 +102,14 @@ class GraphicEngine:
         self.type_params = 0 #0 => obj nparams 1 => light params
 
     def scene_set_up(self):
+        if self.world != None:
+            self.world.finish() #the chunks around the camera, the others come as it moves
+            return
         self.camera.load_scene()
         
     
     def add_cube(self, pos):
-        self.scene.append(Cube(self, pos, tex_id=0))
+        self.entities.add_to_scene(Cube(self, pos, tex_id=0))
         
     def ui_set_up(self):
         #color palette for uis: 
@@ -175,16 +209,30 @@ class GraphicEngine:
     def add_light(self, pos):
         if len(self.lights)<4:
             self.lights.append(Light(self,pos,(110,120,80),0.5, param = "point"))
+        elif self.point_lights.enabled:
+            self.point_lights.add(tuple(pos), (110,120,80), 0.5) #past the shadowed lights, a shadowless one
         else:
-            l = self.lights.pop(1)
-            l.delete()
+            self.lights[1].destroy()
             self.lights.append(Light(self,pos,(110,120,80),0.5, param = "point"))
 
     
     def render(self):
         #busy with rendering everything on screen
+        self.cpu_profiler.next_frame()
         #clear framebuffer
         self.ctx.clear(color=(0.12,0.11,0.1)) #background color
+        self.gpu_timers.begin_frame()
+        self.mesh.texture.registry.next_frame() #textures bound from now on are this frame's, the others can be evicted
+        self.loader.update() #finished assets, within the upload budget of the frame
+        self.editor.update() #events of the property panel and the edits it queued
+        if self.world != None:
+            self.world.update() #chunks in and out around the camera
+
+        #camera and lights are uploaded once for the whole frame
+        for light in self.lights:
+            light.update_light_attributes()
+        self.point_lights.update()
+        self.frame_uniforms.update()
 
         #render letters/text first
         for id in range(len(self.letter)-1,-1,-1): #we must render them from last to first
@@ -192,24 +240,29 @@ class GraphicEngine:
                 self.letter[id].render()
             if self.type_params==1 and id <6 or self.type_params==1 and id >=10:
                 self.letter[id].render()
+        self.gpu_timers.render_breakdown()
+        with self.gpu_timers.scope('letters'):
+            self.text_renderer.render()
         
         #render ui then
-        for id in range(len(self.ui)-1,-1,-1): #we must render them from last to first
-            if self.type_params==0 and id <17 or self.type_params==0 and id >=19:
-                self.ui[id].render()
-            if self.type_params==1 and id <13 or self.type_params==1 and id >=17:
-                self.ui[id].render()
+        with self.gpu_timers.scope('ui'):
+            for id in range(len(self.ui)-1,-1,-1): #we must render them from last to first
+                if self.type_params==0 and id <17 or self.type_params==0 and id >=19:
+                    self.ui[id].render()
+                if self.type_params==1 and id <13 or self.type_params==1 and id >=17:
+                    self.ui[id].render()
         
-        for light in self.lights:
-            light.light_ui.render()
-            light.update_light_attributes()
+        with self.gpu_timers.scope('light gizmos'):
+            for light in self.lights:
+                light.light_ui.render()
 
         #render every objs
         self.scene_renderer.all_renders()
 
         
         #swap buffers
-        pg.display.flip()
+        if not self.headless:
+            pg.display.flip()
     
 
     def get_time(self):
@@ -229,174 +282,34 @@ class GraphicEngine:
 
 
     def openNewInputWindow(self, name):
-        def open_file():
-            file = filedialog.askopenfile(mode='r', filetypes=[('OBJ', '*.obj')])    
-            if file:
-                input_str.append(f"{os.path.abspath(file.name)}")
-        def open_tex():
-            file = filedialog.askopenfile(mode='r', filetypes=[('PNJ, JPG', '*.png *.jpg')])    
-            if file:
-                input_str.append(f"{os.path.abspath(file.name)}")
-
-        def import_entry(name, id):
-            if name == "TEXTURE":
-                if id == 0:
-                    input_str.append(tk.Entry(newWindow))
-                    input_str[-1].insert(tk.END, "TEXTURE ACCESS NAME")
-                    input_str[-1].grid(row=1+id, column=0) #the actual input place
-                else:
-                    tk.Button(newWindow, padx=10, text="Browse TEX", command=open_tex).grid(row=row_enter) #button enter
-            if name == "MODEL":
-                if id == 0:
-                    input_str.append(tk.Entry(newWindow))
-                    input_str[-1].insert(tk.END, "OBJ ACCESS NAME")
-                    input_str[-1].grid(row=1+id, column=0) #the actual input place
-                else:
-                    tk.Button(newWindow, padx=10, text="Browse OBJ", command=open_file).grid(row=row_enter) #button enter
-            
-        def one_entry(column):
-            input_str.append(tk.Entry(newWindow))
-            if self.camera.selected_obj != None:
-                if name == "name":
-                    input_str[-1].insert(tk.END, str(self.camera.selected_obj.name))
-                if name == "texture":
-                    input_str[-1].insert(tk.END, str(self.camera.selected_obj.tex_id))
-                if name == "vao":
-                    input_str[-1].insert(tk.END, str(self.camera.selected_obj.vao_name))
-                if name == "intensity":
-                    input_str[-1].insert(tk.END, str(self.camera.selected_obj.intensity))
-            input_str[-1].grid(row=1, column=column) #the actual input place
-        def multiple_entry(column):
-            input_str.append(tk.Entry(newWindow))
-            if self.camera.selected_obj != None:
-                if name == "position":
-                    input_str[-1].insert(tk.END, str(self.camera.selected_obj.position[len(input_str)-1]))
-                if name == "rotation":
-                    input_str[-1].insert(tk.END, str(self.camera.selected_obj.rotation[len(input_str)-1]))
-                if name == "scale":
-                    input_str[-1].insert(tk.END, str(self.camera.selected_obj.scale[len(input_str)-1]))
-                if name == "color":
-                    input_str[-1].insert(tk.END, str(self.camera.selected_obj.color[len(input_str)-1]))
-            else:
-                input_str[-1].insert(tk.END, '0')
-            input_str[-1].grid(row=1, column=column) #the actual input place
-        def func():
-            #button was pressed
-            if self.camera.selected_obj != None:
-                self.camera.next.clear()
-                if name == "name":
-                    self.camera.previous.append((name,self.camera.selected_obj,self.camera.selected_obj.name))
-                    self.camera.selected_obj.name = input_str[0].get()
-                if name == "vao":
-                    self.camera.previous.append((name,self.camera.selected_obj,self.camera.selected_obj.vao_name))
-                    self.camera.selected_obj.on_init_vao(input_str[0].get())
-                if name == "position":
-                    self.camera.previous.append((name,self.camera.selected_obj,self.camera.selected_obj.position))
-                    self.camera.selected_obj.position = glm.vec3(float(input_str[0].get()), float(input_str[1].get()), float(input_str[2].get()))
-                if name == "rotation":
-                    self.camera.previous.append((name,self.camera.selected_obj,self.camera.selected_obj.rotation))
-                    self.camera.selected_obj.rotation = glm.vec3(float(input_str[0].get()), float(input_str[1].get()), float(input_str[2].get()))
-                if name == "scale":
-                    self.camera.previous.append((name,self.camera.selected_obj,self.camera.selected_obj.scale))
-                    self.camera.selected_obj.scale = glm.vec3(float(input_str[0].get()), float(input_str[1].get()), float(input_str[2].get()))
-                if name == "texture":
-                    self.camera.previous.append((name,self.camera.selected_obj,self.camera.selected_obj.tex_id))
-                    self.camera.selected_obj.tex_id = input_str[0].get()
-                    to_int = True
-                    for caracters in self.camera.selected_obj.tex_id:
-                        if caracters not in [str(i) for i in range(10)]:
-                            to_int=False
-                    if to_int: #we check if the entered caracters are nbrs, if so we transform the tex_id type to int
-                        self.camera.selected_obj.tex_id = int(self.camera.selected_obj.tex_id)
-                if name == "intensity":
-                    self.camera.previous.append((name,self.camera.selected_obj,self.camera.selected_obj.intensity))
-                    self.camera.selected_obj.intensity = input_str[0].get()
-                if name == "color":
-                    self.camera.previous.append((name,self.camera.selected_obj,self.camera.selected_obj.color))
-                    self.camera.selected_obj.color = glm.vec3(float(input_str[0].get()), float(input_str[1].get()), float(input_str[2].get()))
-
-                self.camera.selected_obj.m_model = self.camera.selected_obj.get_model_matrix(self)
-                self.camera.selected_obj.on_init()
-
-            #imports
-            if name == "TEXTURE":
-                name_obj=input_str[0].get()
-                link_tex = input_str[1]
-                self.mesh.texture.load_texture_obj(f"{name_obj}", f"{link_tex}")
-                self.camera.save_imports(name_obj,link_tex,"None")
-            if name == "MODEL":
-                name_obj=input_str[0].get()
-                link_model = input_str[1]
-                self.mesh.load_texture_obj(f"{name_obj}",link_tex=None, link=f"{link_model}")
-                self.camera.save_imports(name_obj,"None",link_model)
-            
-
-            reset_button()
-
-        def reset_button():
-            newWindow.destroy()
-        # Toplevel object which will 
-        # be treated as a new window
-        
+        #the buttons of the ui: the property and import ones open the editor panel on their field
         if name == "CUBE":
             vector = self.camera.forward
-            new_pos = self.camera.position+vector*3
+            new_pos = self.camera.get_placement(vector, PLACE_CUBE)
             self.add_cube(new_pos)
         elif name == "LIGHT":
             vector = self.camera.forward
-            new_pos = self.camera.position+vector*3
+            new_pos = self.camera.get_placement(vector, PLACE_LIGHT)
             self.add_light(new_pos)
-        else:
-            newWindow = tk.Tk()
-            row_enter = 2
-            # sets the title of the
-            # Toplevel widget
-            newWindow.title("Input")
-            newWindow.wm_attributes("-topmost",True) #keep it on top
-
-            input_str = []
-
-            if name == "name" or name == "texture" or name == "vao" or name == "intensity":
-                newWindow.geometry("125x70")
-                tk.Label(newWindow, text=f"{name}").grid(row=0) #white part
-                one_entry(0)
-
     #destroy button
-            elif name == "destroy":
-                if self.camera.selected_obj != None:
-                    self.camera.selected_obj.destroy()
+        elif name == "destroy":
+            if self.camera.selected_obj != None:
+                self.camera.selected_obj.destroy()
     #for the higher params
-            elif name == "QUIT":
-                self.camera.save_lights()
-                self.camera.save_scene()
-                self.mesh.destroy()
-                self.scene_renderer.destroy()
-                pg.quit()
-                sys.exit()
-            elif name == "TEXTURE":
-                newWindow.geometry("125x90")
-                tk.Label(newWindow, text=f"{name}").grid(row=0) 
-                import_entry(name,0) #texture name
-                import_entry(name,1) #texture link
-                row_enter+=1
-            elif name == "MODEL":
-                newWindow.geometry("125x90")
-                tk.Label(newWindow, text=f"{name}").grid(row=0) 
-                import_entry(name,0) #obj name
-                import_entry(name,1) #obj link
-                row_enter+=1
-            else:
-                newWindow.geometry("375x70")
-                tk.Label(newWindow, text=f"{name}").grid(row=0) #white part
-                for i in range(3):
-                    multiple_entry(i)
-
-            tk.Button(newWindow, 
-                            text="Enter",
-                            padx = 10, 
-                            command = func).grid(row=row_enter) #button enter
-            newWindow.mainloop()   
-            
+        elif name == "QUIT":
+            self.camera.save_lights()
+            self.camera.save_scene()
+            self.loader.destroy()
+            self.mesh.destroy()
+            self.text_renderer.destroy()
+            self.scene_renderer.destroy()
+            self.frame_uniforms.destroy()
+            self.point_lights.destroy()
+            self.editor.destroy()
+            pg.quit()
+            sys.exit()
+        else:
+            self.editor.show(name)
 
 
 if __name__ == "__main__":
@@ -4,12 +4,13 @@ class Mesh:
     def __init__(self, app):
         self.app = app
         self.vao = VAO(app.ctx)
+        self.vao.registry.loader = getattr(app, 'loader', None) #imported meshes stream in behind a cube
         self.texture = Texture(app)
     
-    def load_texture_obj(self, name, link_tex=None, link=None):
-        self.vao.load_vao(name, link)
+    def load_texture_obj(self, name, link_tex=None, link=None, lazy=False):
+        self.vao.load_vao(name, link, lazy)
         if link_tex != None:
-            self.texture.load_texture_obj(name, link_tex)
+            self.texture.load_texture_obj(name, link_tex, lazy)
 
     def load_texture_letter(self, text, col, bg_col):  
         self.texture.load_texture_letter(text, col, bg_col)
@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import struct
+import argparse
+from multiprocessing import Pool
+
+import numpy as np
+
+from mesh_index import index_vertices, get_index_stats
+from mesh_lod import get_lods
+
+MAGIC = b'AMSH'
+VERSION = 3 #2: welded vertices and an index buffer, 3: levels of detail after the full index list
+PREFIX = struct.Struct('<4sII') #magic, version, length of the json header
+ALIGN = 16 #the vertex data starts on a multiple of this, so the memmap is aligned
+EXTENSION = '.mesh'
+
+#every baked mesh has the layout of ObjectVBO
+FORMAT = '2f 3f 3f'
+ATTRIB = ['in_texcoord', 'in_normales', 'in_position']
+FLOATS = 8
+COMPONENTS = {'T2F': (0, 2), 'N3F': (2, 3), 'V3F': (5, 3)} #pywavefront component -> (column, size) in the layout
+
+def get_baked_path(link):
+    return os.path.splitext(link)[0]+EXTENSION
+
+def is_fresh(link, baked=None):
+    #the baked file exists, is of this version and is not older than its obj (a missing obj keeps the baked one)
+    baked = baked or get_baked_path(link)
+    if not os.path.exists(baked):
+        return False
+    if os.path.exists(link):
+        with open(baked, 'rb') as file:
+            prefix = file.read(PREFIX.size)
+        if len(prefix) < PREFIX.size or PREFIX.unpack(prefix)[:2] != (MAGIC, VERSION):
+            return False
+    return not os.path.exists(link) or os.path.getmtime(baked) >= os.path.getmtime(link)
+
+def get_face_normals(positions):
+    #flat normals for the materials exported without any
+    tri = positions.reshape(-1,3,3)
+    normals = np.cross(tri[:,1]-tri[:,0], tri[:,2]-tri[:,0])
+    normals /= np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
+    return np.repeat(normals, 3, axis=0)
+
+def get_material_vertices(vertex_format, vertices):
+    #one material of pywavefront -> (n, FLOATS) in the baked layout
+    parts = vertex_format.split('_')
+    sizes = [int(part[1]) for part in parts]
+    data = np.asarray(vertices, dtype='f4').reshape(-1, sum(sizes))
+    out = np.zeros((len(data), FLOATS), dtype='f4')
+    start = 0
+    for part, size in zip(parts, sizes):
+        if part in COMPONENTS:
+            column, _ = COMPONENTS[part]
+            out[:, column:column+size] = data[:, start:start+size]
+        start += size #colors (C3F) are not used by the engine
+    if 'N3F' not in parts:
+        out[:, 2:5] = get_face_normals(out[:, 5:8])
+    return out
+
+def parse_obj(link):
+    #(vertices, draw ranges), every material one after the other
+    #the numpy reader of obj_parser.py, pywavefront only to read its own cache when the obj is gone
+    if os.path.exists(link):
+        from obj_parser import read_obj
+        return read_obj(link)
+    from pywavefront import Wavefront
+    obj = Wavefront(link, parse=True, cache=True)
+    chunks, ranges = [], []
+    first = 0
+    for name, material in obj.materials.items():
+        chunk = get_material_vertices(material.vertex_format, material.vertices)
+        ranges.append({'material': name, 'first': first, 'count': len(chunk)})
+        chunks.append(chunk)
+        first += len(chunk)
+    vertices = np.concatenate(chunks) if len(chunks) > 0 else np.zeros((0, FLOATS), dtype='f4')
+    return vertices, ranges
+
+def get_header(vertices, ranges, indices=None, source_count=None, lods=None):
+    #vertex layout, bounds of the positions, index buffer, draw range of every material and levels of detail
+    #the ranges count indices when the mesh is indexed, vertices when it is not (the same numbers)
+    #a level is {'first', 'count', 'error', 'ranges'} in the index buffer, the full mesh first
+    positions = vertices[:, 5:8]
+    if len(positions) > 0:
+        bounds = [positions.min(axis=0).tolist(), positions.max(axis=0).tolist()]
+    else:
+        bounds = [[0,0,0], [0,0,0]]
+    source_count = len(vertices) if source_count == None else source_count
+    if lods == None:
+        lods = [{'first': 0, 'count': len(indices) if indices is not None else len(vertices), 'error': 0.0, 'ranges': ranges}]
+    stats = get_index_stats(source_count, vertices, indices)
+    return {'format': FORMAT, 'attrib': ATTRIB, 'vertex_count': len(vertices),
+            'index_count': stats['indices'], 'index_dtype': indices.dtype.str if indices is not None else None,
+            'source_vertex_count': source_count, 'saved_bytes': stats['saved_bytes'],
+            'bounds': bounds, 'ranges': ranges, 'lods': lods}
+
+def write_mesh(path, vertices, ranges, indices=None, source_count=None, lods=None):
+    #written next to the final file then renamed, so a reader never sees half a mesh
+    header = json.dumps(get_header(vertices, ranges, indices, source_count, lods)).encode()
+    header += b' '*(-(PREFIX.size+len(header)) % ALIGN)
+    data = np.ascontiguousarray(vertices, dtype='<f4').tobytes()
+    temp = path+'.tmp'
+    with open(temp, 'wb') as file:
+        file.write(PREFIX.pack(MAGIC, VERSION, len(header)))
+        file.write(header)
+        file.write(data)
+        if indices is not None:
+            file.write(b'\0'*(-len(data) % ALIGN))
+            file.write(np.ascontiguousarray(indices).tobytes())
+    os.replace(temp, path)
+
+def read_mesh(path):
+    #(header, (n, FLOATS) read only memmap of the vertex data, memmap of the indices or None), nothing is copied
+    with open(path, 'rb') as file:
+        magic, version, length = PREFIX.unpack(file.read(PREFIX.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a baked mesh of version {VERSION}")
+        header = json.loads(file.read(length))
+    count = header['vertex_count']
+    if count == 0:
+        return header, np.zeros((0, FLOATS), dtype='f4'), None
+    offset = PREFIX.size+length
+    vertices = np.memmap(path, dtype='<f4', mode='r', offset=offset, shape=(count, FLOATS))
+    if header['index_count'] == 0:
+        return header, vertices, None
+    offset += count*FLOATS*4
+    offset += -offset % ALIGN
+    indices = np.memmap(path, dtype=header['index_dtype'], mode='r', offset=offset, shape=(header['index_count'],))
+    return header, vertices, indices
+
+def index_obj(link):
+    #parsed, welded, reordered and simplified: (vertices, indices or None, ranges, vertex count before welding, levels)
+    vertices, ranges = parse_obj(link)
+    indexed, indices = index_vertices(vertices, ranges)
+    if indices is None:
+        return indexed, None, ranges, len(vertices), None
+    lods = [{'first': 0, 'count': len(indices), 'error': 0.0, 'ranges': ranges}]
+    parts = [indices]
+    first = len(indices)
+    for level, level_ranges, error in get_lods(indexed, indices, ranges):
+        lods.append({'first': first, 'count': len(level), 'error': error, 'ranges': level_ranges})
+        parts.append(level)
+        first += len(level)
+    return indexed, np.concatenate(parts), ranges, len(vertices), lods
+
+def get_report(header):
+    #what indexing did to a baked mesh
+    if header['index_count'] == 0:
+        return f"{header['vertex_count']} vertices, not indexed (nothing to weld)"
+    triangles = '/'.join(str(lod['count']//3) for lod in header['lods'])
+    return (f"{header['source_vertex_count']} -> {header['vertex_count']} vertices, "
+            f"{header['index_count']} indices, {header['saved_bytes']/1024:.0f} KB saved, {triangles} triangles per level")
+
+def bake(link, force=False):
+    #obj -> baked file next to it, skipped when it is already up to date
+    path = get_baked_path(link)
+    if not force and is_fresh(link, path):
+        return path, False
+    vertices, indices, ranges, source_count, lods = index_obj(link)
+    write_mesh(path, vertices, ranges, indices, source_count, lods)
+    return path, True
+
+def bake_job(job):
+    link, force = job
+    try:
+        path, baked = bake(link, force)
+        return link, f"{'baked' if baked else 'up to date'}, {get_report(read_mesh(path)[0])}"
+    except Exception as error:
+        return link, f"failed: {error}"
+
+def bake_directory(directory, force=False, jobs=None):
+    #every obj of the directory (and below), one process per core
+    links = sorted(os.path.join(root, name) for root, _, names in os.walk(directory)
+                   for name in names if name.lower().endswith('.obj'))
+    with Pool(jobs or os.cpu_count()) as pool:
+        for link, result in pool.imap_unordered(bake_job, [(link, force) for link in links]):
+            print(f"{link}: {result}")
+    return links
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="bake the obj files of a directory into memory mapped meshes")
+    parser.add_argument('directory', nargs='?', default='model')
+    parser.add_argument('--force', action='store_true', help="bake again even when the baked file is newer")
+    parser.add_argument('--jobs', type=int, default=None, help="processes, every core by default")
+    args = parser.parse_args()
+    if not os.path.isdir(args.directory):
+        sys.exit(f"{args.directory} is not a directory")
+    bake_directory(args.directory, args.force, args.jobs)
@@ -0,0 +1,116 @@
+import numpy as np
+
+VERTEX_CACHE = 16 #post transform cache entries assumed by the triangle order (tipsify)
+
+def weld(vertices):
+    #bit identical vertices merged: (unique vertices, index of every input vertex)
+    vertices = np.ascontiguousarray(vertices, dtype='f4')
+    rows = vertices.reshape(len(vertices), -1)
+    keys = rows.view(np.dtype((np.void, rows.shape[1]*4))).ravel()
+    _, first, indices = np.unique(keys, return_index=True, return_inverse=True)
+    return rows[first], indices.ravel().astype(np.int64)
+
+def get_adjacency(triangles, vertex_count):
+    #vertex -> triangles using it, as (offsets, triangles) like a csr matrix
+    corners = triangles.ravel()
+    order = np.argsort(corners, kind='stable')
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(corners, minlength=vertex_count))])
+    return offsets, order//3
+
+def optimize_cache(indices, vertex_count, cache_size=VERTEX_CACHE):
+    #triangle order of tipsify (Sander, Nehab and Barczak 2007): fans around the vertex
+    #most likely still in the cache, so the vertex shader runs about once per vertex
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    if len(triangles) == 0:
+        return np.asarray(indices, dtype=np.int64)
+    offsets, adjacent = get_adjacency(triangles, vertex_count)
+    offsets, adjacent, corners = offsets.tolist(), adjacent.tolist(), triangles.tolist()
+    live = np.bincount(triangles.ravel(), minlength=vertex_count).tolist() #triangles not emitted yet per vertex
+    stamps = [-cache_size-1]*vertex_count #time each vertex entered the cache
+    emitted = [False]*len(corners)
+    dead_end = []
+    order = []
+    time = 0
+    fan = int(triangles[0,0])
+    cursor = 0 #next vertex in input order, when both the fan and the dead end stack run out
+    while fan >= 0:
+        candidates = []
+        for t in adjacent[offsets[fan]:offsets[fan+1]]:
+            if emitted[t]:
+                continue
+            emitted[t] = True
+            order.append(t)
+            for v in corners[t]:
+                dead_end.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if time-stamps[v] > cache_size:
+                    stamps[v] = time
+                    time += 1
+        #next fan: the candidate that stays in the cache the longest once its fan is done
+        fan, best = -1, -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = time-stamps[v] if time-stamps[v]+2*live[v] <= cache_size else 0
+                if priority > best:
+                    fan, best = v, priority
+        if fan < 0:
+            while len(dead_end) > 0:
+                v = dead_end.pop()
+                if live[v] > 0:
+                    fan = v
+                    break
+        if fan < 0:
+            while cursor < vertex_count and live[cursor] == 0:
+                cursor += 1
+            fan = cursor if cursor < vertex_count else -1
+    return triangles[order].ravel()
+
+def optimize_fetch(vertices, indices):
+    #vertices renumbered by first use, so the index buffer reads the vertex buffer front to back
+    unique, first = np.unique(indices, return_index=True)
+    order = unique[np.argsort(first)]
+    remap = np.zeros(len(vertices), dtype=np.int64)
+    remap[order] = np.arange(len(order))
+    return vertices[order], remap[indices]
+
+def get_cache_misses(indices, cache_size=VERTEX_CACHE):
+    #vertex shader runs with a fifo cache of cache_size, divide by the triangles for the acmr
+    cache = []
+    misses = 0
+    for v in np.asarray(indices).tolist():
+        if v not in cache:
+            misses += 1
+            cache.append(v)
+            if len(cache) > cache_size:
+                cache.pop(0)
+    return misses
+
+def get_index_dtype(vertex_count):
+    return 'u2' if vertex_count <= 0xffff else 'u4'
+
+def index_vertices(vertices, ranges=None):
+    #flat triangle list -> (vertices, indices), every draw range (first, count in vertices) keeps its place in the index buffer
+    #indices is None when welding frees nothing (flat normals everywhere), the flat list is smaller then
+    source = vertices
+    vertices, indices = weld(vertices)
+    if len(vertices)*vertices.shape[1]*4+len(indices)*np.dtype(get_index_dtype(len(vertices))).itemsize >= source.nbytes:
+        return source, None
+    ranges = ranges or [{'first': 0, 'count': len(indices)}]
+    for draw in ranges:
+        first, count = draw['first'], draw['count']
+        indices[first:first+count] = optimize_cache(indices[first:first+count], len(vertices))
+    vertices, indices = optimize_fetch(vertices, indices)
+    return vertices, indices.astype(get_index_dtype(len(vertices)))
+
+def get_index_stats(source_count, vertices, indices):
+    #what the index buffer saves, in vertices and bytes
+    stride = vertices.shape[1]*vertices.itemsize if len(vertices) > 0 else 0
+    source_bytes = source_count*stride
+    indexed_bytes = len(vertices)*stride+(indices.nbytes if indices is not None else 0)
+    return {'source_vertices': source_count,
+            'vertices': len(vertices),
+            'indices': len(indices) if indices is not None else 0,
+            'source_bytes': source_bytes,
+            'indexed_bytes': indexed_bytes,
+            'saved_bytes': source_bytes-indexed_bytes}
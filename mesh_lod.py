@@ -0,0 +1,150 @@
+import numpy as np
+
+from mesh_index import optimize_cache
+
+LOD_RATIOS = (0.5, 0.25, 0.125) #triangles kept by every level after the full mesh, of the full mesh
+MIN_REDUCTION = 0.8 #a level that cannot get under this share of the previous one ends the chain
+FLIP_LIMIT = 0.2 #a collapse is refused when it turns a triangle further than this (cosine) from its normal
+
+#quadric error simplification (Garland and Heckbert 1997) by half edge collapses:
+#a vertex only ever moves onto one of its neighbours, so every level keeps using the vertex buffer of the full mesh
+#collapses are done in rounds, every round takes the vertices that are the cheapest of their neighbourhood at once
+
+def get_face_planes(positions, triangles):
+    #(unit normals, plane offsets, areas) of the triangles
+    a, b, c = positions[triangles[:,0]], positions[triangles[:,1]], positions[triangles[:,2]]
+    normals = np.cross(b-a, c-a)
+    areas = np.linalg.norm(normals, axis=1)
+    normals = normals/np.maximum(areas, 1e-30)[:,None]
+    return normals, -np.einsum('ij,ij->i', normals, a), areas/2
+
+def get_quadrics(positions, triangles):
+    #(vertices, 4, 4) sum of the squared distance to the planes of the triangles around every vertex, area weighted
+    normals, offsets, areas = get_face_planes(positions, triangles)
+    planes = np.hstack([normals, offsets[:,None]])
+    faces = np.einsum('ki,kj->kij', planes, planes)*areas[:,None,None]
+    quadrics = np.zeros((len(positions), 4, 4))
+    for corner in range(3):
+        np.add.at(quadrics, triangles[:,corner], faces)
+    return quadrics
+
+def get_edges(triangles):
+    #every directed edge of the triangles (both ways), (6*triangles, 2)
+    pairs = [(0,1), (1,2), (2,0), (1,0), (2,1), (0,2)]
+    return np.concatenate([triangles[:,[i,j]] for i, j in pairs])
+
+def get_locked(positions, triangles, materials):
+    #vertices that never move: uv or normal seams, open borders, non manifold edges and material borders
+    #so the levels keep the outline, the texture layout and the draw ranges of the full mesh
+    _, spots = np.unique(positions, axis=0, return_inverse=True)
+    spots = spots.ravel()
+    locked = np.bincount(spots, minlength=len(positions))[spots] > 1
+
+    #edges between positions used by anything but two triangles
+    corners = spots[triangles]
+    edges = np.sort(np.concatenate([corners[:,[0,1]], corners[:,[1,2]], corners[:,[2,0]]]), axis=1)
+    keys, counts = np.unique(edges[:,0]*len(positions)+edges[:,1], return_counts=True)
+    border = np.zeros(len(positions), dtype=bool)
+    border[keys[counts != 2]//len(positions)] = True
+    border[keys[counts != 2]%len(positions)] = True
+    locked |= border[spots]
+
+    first = np.full(len(positions), -1)
+    mixed = np.zeros(len(positions), dtype=bool)
+    for corner in range(3):
+        vertex = triangles[:,corner]
+        unset = first[vertex] < 0
+        first[vertex[unset]] = materials[unset]
+        mixed[vertex[first[vertex] != materials]] = True
+    return locked | mixed
+
+def simplify(positions, triangles, materials, target, quadrics, locked):
+    #triangles collapsed down to target (or as far as the locked vertices allow)
+    #quadrics are accumulated in place, so the next level goes on from this one
+    #returns (triangles, materials of the triangles, largest error of a collapse)
+    error = 0.0
+    rejected = np.zeros(0, dtype=np.int64) #collapses (u*n+w) refused by the flip test
+    n = len(positions)
+    while len(triangles) > target:
+        normals = get_face_planes(positions, triangles)[0]
+        edges = get_edges(triangles)
+        u, w = edges[~locked[edges[:,0]]].T
+        if len(u) == 0:
+            break
+        points = np.hstack([positions[w], np.ones((len(w),1))])
+        costs = np.maximum(np.einsum('ki,kij,kj->k', points, quadrics[u]+quadrics[w], points), 0)
+        costs[np.isin(u*n+w, rejected)] = np.inf
+
+        #cheapest collapse of every vertex
+        order = np.lexsort((costs, u))
+        u, w, costs = u[order], w[order], costs[order]
+        first = np.concatenate([[True], u[1:] != u[:-1]]) & np.isfinite(costs)
+        targets = np.full(n, -1)
+        targets[u[first]] = w[first]
+        best = np.full(n, np.inf)
+        best[u[first]] = costs[first]
+
+        #flip test, on every triangle around a moving vertex that survives the collapse
+        corner_vertices = triangles.ravel()
+        moving = np.flatnonzero(targets[corner_vertices] >= 0)
+        tri, corner = moving//3, moving%3
+        vertex, to = corner_vertices[moving], targets[corner_vertices[moving]]
+        moved = triangles[tri].copy()
+        moved[np.arange(len(tri)), corner] = to
+        kept = ~(triangles[tri] == to[:,None]).any(axis=1)
+        new_normals = get_face_planes(positions, moved)[0]
+        flipped = kept & (np.einsum('ij,ij->i', new_normals, normals[tri]) < FLIP_LIMIT)
+        bad = np.unique(vertex[flipped])
+        rejected = np.concatenate([rejected, bad*n+targets[bad]])
+        best[bad] = np.inf
+
+        #independent set: a vertex collapses when it is cheaper than every neighbour, so no triangle moves twice
+        rank = np.empty(n, dtype=np.int64)
+        rank[np.argsort(best, kind='stable')] = np.arange(n)
+        neighbour = np.full(n, n)
+        np.minimum.at(neighbour, edges[:,0], rank[edges[:,1]])
+        chosen = np.flatnonzero(np.isfinite(best) & (rank < neighbour))
+        if len(chosen) == 0:
+            if len(bad) == 0:
+                break #nothing left that can move
+            continue
+        #an interior collapse removes two triangles, the cheapest ones are enough to reach the target
+        chosen = chosen[np.argsort(best[chosen])][:max(1, (len(triangles)-target+1)//2)]
+        error = max(error, float(best[chosen].max()))
+
+        np.add.at(quadrics, targets[chosen], quadrics[chosen])
+        remap = np.arange(n)
+        remap[chosen] = targets[chosen]
+        triangles = remap[triangles]
+        alive = (triangles[:,0] != triangles[:,1]) & (triangles[:,1] != triangles[:,2]) & (triangles[:,2] != triangles[:,0])
+        triangles, materials = triangles[alive], materials[alive]
+    return triangles, materials, error
+
+def get_lods(vertices, indices, ranges):
+    #coarser index lists of an indexed mesh: [(indices, draw ranges, error)], ordered for the vertex cache
+    positions = np.asarray(vertices[:, 5:8], dtype='f8')
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    materials = np.repeat(np.arange(len(ranges)), [draw['count']//3 for draw in ranges])
+    if len(triangles) == 0:
+        return []
+    locked = get_locked(positions, triangles, materials)
+    quadrics = get_quadrics(positions, triangles)
+    full = len(triangles)
+    lods = []
+    for ratio in LOD_RATIOS:
+        simplified, simplified_materials, error = simplify(positions, triangles, materials, int(full*ratio), quadrics, locked)
+        if len(simplified) > MIN_REDUCTION*len(triangles):
+            break
+        triangles, materials = simplified, simplified_materials
+        #regrouped by material, same order as the full ranges
+        order = np.argsort(materials, kind='stable')
+        level = triangles[order].ravel()
+        counts = np.bincount(materials, minlength=len(ranges))*3
+        level_ranges = []
+        first = 0
+        for draw, count in zip(ranges, counts.tolist()):
+            level[first:first+count] = optimize_cache(level[first:first+count], len(vertices))
+            level_ranges.append({'material': draw.get('material'), 'first': int(first), 'count': int(count)})
+            first += int(count) #python ints, the ranges go to the json header
+        lods.append((level.astype(indices.dtype), level_ranges, error))
+    return lods
@@ -0,0 +1,149 @@
+import os
+import hashlib
+
+HASH_CHUNK = 1<<20 #bytes read at a time when hashing a mesh file
+
+def get_file_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class MeshEntry:
+    #one loaded mesh: its vbo and both vaos, shared by every name that points to the same file
+    def __init__(self, key, vbo, vao, shadow_vao):
+        self.key = key
+        self.vbo = vbo
+        self.vao = vao
+        self.shadow_vao = shadow_vao
+        self.refs = 0 #models using it right now
+        self.names = set()
+        self.pending = False #still the placeholder, the asset loader is on it
+        self.cancelled = False
+
+    def release(self):
+        if self.pending:
+            #the placeholder belongs to the built in meshes
+            self.cancelled = True
+            return
+        self.vao.release()
+        self.shadow_vao.release()
+        self.vbo.destroy()
+
+class MeshRegistry:
+    #imported meshes keyed by (absolute path, content hash), loaded once whatever the number of names and models using them
+    #models take a reference (acquire) for the vao name they use, the gpu memory goes when the last one lets go
+    def __init__(self, vao):
+        self.vao = vao
+        self.entries = {} #key -> MeshEntry
+        self.links = {} #vao name -> link, kept after a release so the mesh can come back
+        self.names = {} #vao name -> key of the entry it points to
+        self.users = {} #vao name -> models using that name
+        self.hashes = {} #absolute path -> (mtime, size, hash), a file is only hashed again when it changed
+        self.loader = None #AssetLoader, when set the meshes load in the background behind the placeholder
+        self.placeholder = 'cube'
+
+    def get_key(self, link):
+        #the obj when it exists, else the baked mesh next to it (see ObjectVBO)
+        from mesh_bake import get_baked_path
+        path = os.path.abspath(link)
+        source = path if os.path.exists(path) else get_baked_path(path)
+        stat = os.stat(source)
+        cached = self.hashes.get(source)
+        if cached == None or cached[:2] != (stat.st_mtime, stat.st_size):
+            cached = (stat.st_mtime, stat.st_size, get_file_hash(source))
+            self.hashes[source] = cached
+        return (path, cached[2])
+
+    def register(self, name, link):
+        #name -> mesh of link, nothing is loaded again when the file is already in the registry
+        self.links[name] = link
+        key = self.get_key(link)
+        old = self.names.get(name)
+        if old == key and key in self.entries:
+            return self.entries[key]
+        entry = self.entries.get(key)
+        if entry == None:
+            entry = self.load(key, name, link)
+        #the models of this name now use the new entry
+        self.names[name] = key
+        entry.names.add(name)
+        entry.refs += self.users.get(name, 0)
+        self.set_handles(name, entry)
+        if old != None and old != key and old in self.entries:
+            old_entry = self.entries[old]
+            old_entry.names.discard(name)
+            old_entry.refs -= self.users.get(name, 0)
+            if old_entry.refs <= 0 and len(old_entry.names) == 0:
+                self.unload(old_entry)
+        return entry
+
+    def declare(self, name, link):
+        #name -> link without loading anything, the mesh comes with the first model using it (acquire)
+        self.links[name] = link
+
+    def load(self, key, name, link):
+        if self.loader != None:
+            entry = MeshEntry(key, self.vao.vbo.vbos[self.placeholder], self.vao.vaos[self.placeholder], self.vao.vaos['shadow_'+self.placeholder])
+            entry.pending = True
+            self.entries[key] = entry
+            self.loader.load_mesh(entry, link)
+            return entry
+        vbo = self.vao.vbo.get_object(link)
+        programs = self.vao.program.programs
+        entry = MeshEntry(key, vbo, self.vao.get_vao(programs['default'], vbo), self.vao.get_vao(programs['shadow_map'], vbo))
+        self.entries[key] = entry
+        return entry
+
+    def finish_load(self, entry, vbo):
+        #the asset loader uploaded the mesh, every name of the entry leaves the placeholder
+        programs = self.vao.program.programs
+        entry.vbo = vbo
+        entry.vao = self.vao.get_vao(programs['default'], vbo)
+        entry.shadow_vao = self.vao.get_vao(programs['shadow_map'], vbo)
+        entry.pending = False
+        for name in entry.names:
+            self.set_handles(name, entry)
+
+    def set_handles(self, name, entry):
+        #the usual vbo / vao dicts keep working, several names simply hold the same objects
+        self.vao.vbo.vbos[name] = entry.vbo
+        self.vao.vaos[name] = entry.vao
+        self.vao.vaos['shadow_'+name] = entry.shadow_vao
+        self.vao.add_bounds(name)
+
+    def unload(self, entry):
+        entry.release()
+        self.entries.pop(entry.key)
+        for name in list(entry.names)+[name for name, key in self.names.items() if key == entry.key]:
+            self.vao.vbo.vbos.pop(name, None)
+            self.vao.vaos.pop(name, None)
+            self.vao.vaos.pop('shadow_'+name, None)
+            self.names.pop(name, None)
+
+    def acquire(self, name, count=1):
+        #count models start using name, the mesh is loaded again if its last user released it
+        if name not in self.links:
+            return #built in meshes (cube, pyramid, light...) are never released
+        if name not in self.names:
+            self.register(name, self.links[name])
+        self.users[name] = self.users.get(name, 0)+count
+        self.entries[self.names[name]].refs += count
+
+    def release(self, name):
+        if name not in self.links or self.users.get(name, 0) == 0:
+            return
+        self.users[name] -= 1
+        entry = self.entries[self.names[name]]
+        entry.refs -= 1
+        if entry.refs <= 0:
+            self.unload(entry)
+
+    def get_refs(self, name):
+        key = self.names.get(name)
+        return self.entries[key].refs if key in self.entries else 0
+
+    def destroy(self):
+        for entry in list(self.entries.values()):
+            self.unload(entry)
@@ -6,88 +6,150 @@ import time
 from function import *
 
 class BaseModel:
+    scene_index = -1 #place in app.scene, -1 when not in it
+    mesh_name = None #vao name this model holds a reference on (MeshRegistry)
+    _name = None
+    _tex_id = None
+
     def __init__(self, app, pos=(0,0,0), rot = (0,0,0), scale = (1,1,1), tex_id=0, vao_name='cube', set_scale=False, name = None):
         self.app = app
-        self.original_pos = glm.vec3(pos)
-        self.position = glm.vec3(pos)
-        self.rotation = glm.vec3(rot)
-        self.scale = glm.vec3(scale)
+        self.vao_name = vao_name
         self.set_scale = set_scale
-        self.m_model = self.get_model_matrix(app)
+        #position, rotation, scale and m_model live in the entity store (see the properties)
+        app.entities.add(self, pos, rot, scale)
+        app.entities.set_mesh(self)
+        self.original_pos = glm.vec3(pos)
         self.tex_id = tex_id
         self.name = vao_name
         if name != None: # if we want a specific name from the start
             self.name = name
         
-        self.vao_name = vao_name
         self.vao = self.app.mesh.vao.vaos[vao_name]
         self.shader_program = self.vao.program 
         self.camera = self.app.camera
 
+    @classmethod
+    def instantiate(cls, app, positions, rotations, scales, tex_ids, vao_names, names=None):
+        #many models of this class at once (scene loading), the same models as the constructor then on_init_vao:
+        #the entity columns and indexes are filled in batch and the vao / texture setup is done once per mesh and texture
+        names = vao_names if names == None else names
+        objs = [cls.__new__(cls) for _ in range(len(vao_names))]
+        camera = app.camera
+        for obj, position, tex_id, vao_name, name in zip(objs, positions.tolist(), tex_ids, vao_names, names):
+            obj.app = app
+            obj.camera = camera
+            obj.vao_name = vao_name
+            obj.original_pos = glm.vec3(position)
+            obj._tex_id = tex_id
+            obj._name = name
+        slots = app.entities.add_many(objs, positions, rotations, scales)
+        entity_ids = [obj.entity_id for obj in objs]
+        app.entities.index_many(app.entities.names, names, entity_ids)
+        app.entities.index_many(app.entities.textures, tex_ids, entity_ids)
+        app.entities.set_meshes(objs, slots)
+        cls.on_init_many(app, objs)
+        return objs
+
+    @classmethod
+    def on_init_many(cls, app, objs):
+        #on_init of the scene models for a batch: the sampler uniform is set once per program and
+        #nothing is bound or written, render() does that every frame anyway
+        vaos = app.mesh.vao.vaos
+        textures = app.mesh.texture.textures
+        meshes = {}
+        for obj in objs:
+            mesh = meshes.get(obj.vao_name)
+            if mesh == None:
+                vao, shadow_vao = vaos[obj.vao_name], vaos['shadow_'+obj.vao_name]
+                mesh = meshes[obj.vao_name] = (vao, vao.program, shadow_vao, shadow_vao.program)
+                vao.program['u_texture_0'] = 0
+            obj.vao, obj.shader_program, obj.shadow_vao, obj.shadow_program = mesh
+            obj.texture = textures[obj.tex_id]
+
+    #transform, read and written in the arrays of the entity store
+    @property
+    def position(self):
+        return glm.vec3(*self.app.entities.position[self.slot])
+    @position.setter
+    def position(self, value):
+        self.app.entities.position[self.slot] = tuple(value)
+        self.app.entities.dirty[self.slot] = True
+
+    @property
+    def rotation(self):
+        return glm.vec3(*self.app.entities.rotation[self.slot])
+    @rotation.setter
+    def rotation(self, value):
+        self.app.entities.rotation[self.slot] = tuple(value)
+        self.app.entities.dirty[self.slot] = True
+
+    @property
+    def scale(self):
+        return glm.vec3(*self.app.entities.scale[self.slot])
+    @scale.setter
+    def scale(self, value):
+        self.app.entities.scale[self.slot] = tuple(value)
+        self.app.entities.dirty[self.slot] = True
+
+    @property
+    def m_model(self):
+        return self.app.entities.get_model(self.slot)
+    @m_model.setter
+    def m_model(self, value):
+        self.app.entities.set_model(self.slot, value)
+
+    #indexed by the entity store
+    @property
+    def name(self):
+        return self._name
+    @name.setter
+    def name(self, value):
+        self.app.entities.reindex(self.app.entities.names, self._name, value, self.entity_id)
+        self._name = value
+
+    @property
+    def tex_id(self):
+        return self._tex_id
+    @tex_id.setter
+    def tex_id(self, value):
+        self.app.entities.reindex(self.app.entities.textures, self._tex_id, value, self.entity_id)
+        self._tex_id = value
+
     def on_init_vao(self, vao_name):
         self.vao_name = vao_name
-        self.vao = self.app.mesh.vao.vaos[vao_name]
-        self.shader_program = self.vao.program 
         self.set_scale = True
         if vao_name in ["cube", "pyramid"]:
             self.set_scale = False
-        self.m_model = self.get_model_matrix(self.app)
+        self.app.entities.set_mesh(self) #takes the mesh from the registry first, it may have been released
+        self.vao = self.app.mesh.vao.vaos[vao_name]
+        self.shader_program = self.vao.program 
         
     def update(self): ...
 
     def get_model_matrix(self, app):
-        m_model = glm.mat4()
-        if self.set_scale:
-            m_model = glm.translate(m_model, glm.vec3(self.position.x, self.position.y-self.scale.y, self.position.z))
-        else:
-            m_model = glm.translate(m_model, self.position)
-
-        m_model = glm.rotate(m_model, glm.radians(self.rotation).x, glm.vec3(1,0,0))
-        m_model = glm.rotate(m_model, glm.radians(self.rotation).y, glm.vec3(0,1,0))
-        m_model = glm.rotate(m_model, glm.radians(self.rotation).z, glm.vec3(0,0,1))
-        
-        if self.set_scale:
-            m_model = glm.scale(m_model, ((self.scale.x,self.scale.z,self.scale.y)/(app.mesh.vao.scales[-1]/2)))
-        else:
-            m_model = glm.scale(m_model, (self.scale.x,self.scale.z,self.scale.y))
-        return m_model
-
-    def buffer_lights(self):
-        LIGHT_POS = []
-        LIGHT_COL = []
-        LIGHT_INT = []
-        for light in self.app.lights:
-            light_pos = light.position
-            light_col = light.color
-            light_int = light.intensity
-            LIGHT_POS.append(light_pos)
-            LIGHT_COL.append(light_col)
-            LIGHT_INT.append(light_int)
-        while len(LIGHT_POS) < 4: #we have 4 lights max
-            light_pos = (0,0,0)
-            light_col = (0,0,0)
-            light_int = 0
-            LIGHT_POS.append(light_pos)
-            LIGHT_COL.append(light_col)
-            LIGHT_INT.append(light_int)
-
-        LIGHT_POS = np.array(LIGHT_POS, dtype = 'f4')
-        LIGHT_COL = np.array(LIGHT_COL, dtype = 'f4')
-        LIGHT_INT = np.array(LIGHT_INT, dtype = 'f4')
-        
-        self.shader_program['light_pos'].write(LIGHT_POS)
-        self.shader_program['light_color'].write(LIGHT_COL)
-        self.shader_program['light_intensity'].write(LIGHT_INT)
+        #translate, rotate x y z then scale, rebuilt in batch for every moved entity (entity_store.get_model_matrices)
+        return app.entities.get_model(self.slot)
 
     def render(self):
         self.update()
-        self.vao.render()
+        #level of detail picked for this frame (lod.py), the full mesh for what is not in the scene
+        self.app.scene_renderer.lod.render(self.vao, self.app.mesh.vao.vbo.vbos[self.vao_name], self.app.entities.lod[self.slot])
+
+    def update_shadow(self):
+        #the light and face of the pass are already selected, only the model matrix changes per object
+        self.shadow_program['m_model'].write(self.m_model)
+
+    def render_shadow(self):
+        self.update_shadow()
+        self.app.scene_renderer.lod.render(self.shadow_vao, self.app.mesh.vao.vbo.vbos[self.vao_name], self.app.entities.lod[self.slot], shadow=True)
     
     def destroy(self):
+        if self.app.camera.selected_obj is self:
+            self.app.camera.selected_obj = None
         if self in [light.light_ui for light in self.app.lights]:
             self.light.destroy()
         else:
-            self.app.scene.remove(self)
+            self.app.entities.remove(self)
 
 class Cube(BaseModel):
     def __init__(self, app, pos=(0,0,0), rot=(0,0,0), scale=(1,1,1), tex_id=0, vao_name='cube', name = None):
@@ -96,96 +158,13 @@ class Cube(BaseModel):
 
     def update(self):
         self.texture.use(location = 0)
-        #matrices
-        self.shader_program['m_proj'].write(self.camera.m_proj)
-        self.shader_program['m_view'].write(self.camera.m_view)
-        self.shader_program['cam_pos'].write(self.camera.position)
+        #camera and lights come from the per frame uniform buffers
         self.shader_program['m_model'].write(self.m_model)
-        #light
-        self.buffer_lights()
-
-    def update_shadow(self, indice, face):
-        number_mat = []
-        number_lights = 0
-        m_views = []
-        m_proj_ls= []
-
-        for i in range(len(self.app.scene_renderer.shadowMapList)):
-            number_lights+=1
-            self.depth_texture = self.app.mesh.texture.textures['depth_texture'][i]
-            nb = 0
-            for e in number_mat:
-                nb+=e
-            if type(self.depth_texture) == list:
-                number_mat.append(6)                    #self.shader_program['number_mat'] = 6
-                                                        #m_view = glm.array(self.app.lights[i].m_view_l)
-                #depth texture
-                for y in range(6):
-                    self.depth_texture[y].use(location=1+y+nb)
-                    if (len(self.app.lights)>i):
-                        m_views.append(self.app.lights[i].m_view_l[y])
-            else:
-                number_mat.append(1)
-                for _ in range(6):
-                    m_views.append(self.app.lights[i].m_view_l)
-                                                               #m_view = glm.array([self.app.lights[i].m_view_l for _ in range(6)])
-                #depth texture
-                self.depth_texture.use(location=1+nb)
-                
-            #self.shader_program['m_view_l'].write(m_view.to_bytes())
-
-            m_proj_ls.append(self.app.lights[i].m_proj_l)
-
-        m_view_l = glm.array(m_views+[glm.mat4() for _ in range(24-len(m_views))])
-        m_proj_l = glm.array(m_proj_ls+[glm.mat4() for _ in range(4-len(m_proj_ls))])
-        self.shader_program['number_mat'] = np.array(number_mat+[0 for _ in range(4-len(number_mat))])
-        self.shader_program['number_lights'] = number_lights
-        self.shader_program['m_view_l'].write(m_view_l.to_bytes())
-        self.shader_program['m_proj_l'].write(m_proj_l.to_bytes())
-        #shadow program (indice)
-        if face != -1:
-            self.shadow_program['m_view_l'].write(self.app.lights[indice].m_view_l[face])
-        else:
-            self.shadow_program['m_view_l'].write(self.app.lights[indice].m_view_l)
-
-        self.shadow_program['m_proj'].write(self.app.lights[indice].m_proj_l)
-        self.shadow_program['m_model'].write(self.m_model)
-
-    def render_shadow(self, indice, face):
-        self.update_shadow(indice, face)
-        self.shadow_vao.render()
 
     def on_init(self):
-        #shadow
+        #shadow (light matrices and depth textures are set once per frame by the shadow state)
         self.shadow_vao = self.app.mesh.vao.vaos['shadow_'+self.vao_name]
         self.shadow_program=self.shadow_vao.program
-
-        self.depth_texture = self.app.mesh.texture.textures['depth_texture'][0]
-        self.shader_program['shadowMap'] = [i for i in range(1,25)]
-        self.shader_program['number_lights'] = 1
-        
-        if self.app.lights[0].type_of_light == 'point':
-            self.shader_program['number_mat'] = [6 for _ in range(4)]
-            mv=[]
-            for i in range(24):
-                mv.append(self.app.lights[0].m_view_l[i%6])
-            m_view = glm.array(mv)
-            #depth texture
-            for i in range(6):
-                self.depth_texture[i].use(location=1+i)
-            self.shader_program['m_view_l'].write(m_view.to_bytes())
-            self.shadow_program['m_view_l'].write(self.app.lights[0].m_view_l[0])
-        else:
-            self.shader_program['number_mat'] = [1 for _ in range(4)]
-            m_view = glm.array([self.app.lights[0].m_view_l for _ in range(24)])
-            #depth texture
-            self.depth_texture.use(location=1)
-            
-            self.shader_program['m_view_l'].write(m_view.to_bytes())
-            self.shadow_program['m_view_l'].write(self.app.lights[0].m_view_l)
-
-        self.shadow_program['m_proj'].write(self.camera.m_proj)
-        self.shadow_program['m_model'].write(self.m_model)
         #texture part
         self.texture = self.app.mesh.texture.textures[self.tex_id]
         self.shader_program['u_texture_0'] = 0
@@ -213,86 +192,80 @@ class UI(BaseModel):
 class Letter(BaseModel):
     def __init__(self, app, pos=(0,0,0), col=(1,1,1), main_col=(0,0,0), bg_col=(1,1,1), scale=(1,1,1), tex_id=0, vao_name='letters', number=-1):
         #number allows us to know what it is going to show
-        if type(tex_id) != int:
-            app.mesh.load_texture_letter(tex_id, col, bg_col) #load both vao and tex
+        #drawn by the text renderer of the app with the glyph atlas, no texture per string
         super().__init__(app, pos, (0,0,0), scale, tex_id, vao_name)
         self.main_color = glm.vec3(main_col)
         self.letter_color = glm.vec3(col)
         self.bg_color = glm.vec3(bg_col)
 
-        self.old_tex_id = "none yet but will be set in futur no worries"
-        self.presentation_tex = tex_id
+        self.old_value = "none yet but will be set in futur no worries"
+        self.presentation_tex = str(tex_id)
         self.number = number
+        self.value = str(tex_id) #the part written over the end of the presentation, tex_id stays the indexed texture key
+        self.text = str(tex_id) #what is shown right now
 
         self.on_init()
 
     def update(self):
-        self.texture.use()
-
-        self.shader_program['pos'].write(self.position)
-        self.shader_program['scale'].write(self.scale)
-        self.shader_program['color'].write(self.main_color)
         self.update_writting()
+
+    def render(self):
+        #queued, all the labels of the frame are drawn in one call by the text renderer
+        self.update()
+        self.app.text_renderer.add(self.text, self.position, self.scale, self.letter_color+self.main_color, self.bg_color+self.main_color)
         
         
     def update_writting(self):
         if self.app.camera.selected_obj != None:
             if self.number == 0: 
-                self.tex_id = f"{self.app.camera.selected_obj.name}"
+                self.value = f"{self.app.camera.selected_obj.name}"
             if self.number == 1: 
-                self.tex_id = f"({round(self.app.camera.selected_obj.position.x,2)}, {round(self.app.camera.selected_obj.position.y,2)}, {round(self.app.camera.selected_obj.position.z,2)})"
+                self.value = f"({round(self.app.camera.selected_obj.position.x,2)}, {round(self.app.camera.selected_obj.position.y,2)}, {round(self.app.camera.selected_obj.position.z,2)})"
             if self.number == 2:
-                self.tex_id = f"({round(self.app.camera.selected_obj.rotation.x,2)}, {round(self.app.camera.selected_obj.rotation.y,2)}, {round(self.app.camera.selected_obj.rotation.z,2)})"
+                self.value = f"({round(self.app.camera.selected_obj.rotation.x,2)}, {round(self.app.camera.selected_obj.rotation.y,2)}, {round(self.app.camera.selected_obj.rotation.z,2)})"
             if self.number == 3:
-                self.tex_id = f"({round(self.app.camera.selected_obj.scale.x,2)}, {round(self.app.camera.selected_obj.scale.y,2)}, {round(self.app.camera.selected_obj.scale.z,2)})"
+                self.value = f"({round(self.app.camera.selected_obj.scale.x,2)}, {round(self.app.camera.selected_obj.scale.y,2)}, {round(self.app.camera.selected_obj.scale.z,2)})"
             if self.number == 4:
-                self.tex_id = f"{self.app.camera.selected_obj.tex_id}"
+                self.value = f"{self.app.camera.selected_obj.tex_id}"
             if self.number == 5:
-                self.tex_id = f"{self.app.camera.selected_obj.vao_name}"
+                self.value = f"{self.app.camera.selected_obj.vao_name}"
             if self.number == 6:
-                self.tex_id = f"({int(self.app.camera.selected_obj.color.x)}, {int(self.app.camera.selected_obj.color.y)}, {int(self.app.camera.selected_obj.color.z)})"
+                self.value = f"({int(self.app.camera.selected_obj.color.x)}, {int(self.app.camera.selected_obj.color.y)}, {int(self.app.camera.selected_obj.color.z)})"
             if self.number == 7:
-                self.tex_id = f"{self.app.camera.selected_obj.intensity}"
+                self.value = f"{self.app.camera.selected_obj.intensity}"
             if self.number == 8:
-                self.tex_id = f"{round(self.app.fps,0)}"
-            if type(self.tex_id) != int and self.old_tex_id != self.tex_id:
-                last_int = -len(self.tex_id)
-
-                self.app.mesh.load_texture_letter(self.presentation_tex[:last_int]+self.tex_id, self.letter_color, self.bg_color) #load both vao and tex
-                self.old_tex_id=self.tex_id
-                self.texture = self.app.mesh.texture.textures[self.presentation_tex[:last_int]+self.tex_id]
-                self.shader_program['u_texture_0'] = 0
+                self.value = f"{round(self.app.fps,0)}"
+            if self.old_value != self.value:
+                last_int = -len(self.value)
+
+                self.text = self.presentation_tex[:last_int]+self.value #a small buffer update, no new texture
+                self.old_value=self.value
         else:
             if self.number == 0: 
-                self.tex_id = "None"
+                self.value = "None"
             if self.number == 1: 
-                self.tex_id = "(0, 0, 0)"
+                self.value = "(0, 0, 0)"
             if self.number == 2:
-                self.tex_id = "(0, 0, 0)"
+                self.value = "(0, 0, 0)"
             if self.number == 3:
-                self.tex_id = "(0, 0, 0)"
+                self.value = "(0, 0, 0)"
             if self.number == 4:
-                self.tex_id = "None"
+                self.value = "None"
             if self.number == 5:
-                self.tex_id = "None"
+                self.value = "None"
             if self.number == 6:
-                self.tex_id = "(0, 0, 0)"
+                self.value = "(0, 0, 0)"
             if self.number == 7:
-                self.tex_id = "None"
+                self.value = "None"
             if self.number == 8:
-                self.tex_id = f"{round(self.app.fps,0)}"
-            if type(self.tex_id) != int and self.old_tex_id != self.tex_id:
-                last_int = -len(self.tex_id)
+                self.value = f"{round(self.app.fps,0)}"
+            if self.old_value != self.value:
+                last_int = -len(self.value)
 
-                self.app.mesh.load_texture_letter(self.presentation_tex[:last_int]+self.tex_id, self.letter_color, self.bg_color) #load both vao and tex
-                self.old_tex_id=self.tex_id
-                self.texture = self.app.mesh.texture.textures[self.presentation_tex[:last_int]+self.tex_id]
-                self.shader_program['u_texture_0'] = 0
+                self.text = self.presentation_tex[:last_int]+self.value #a small buffer update, no new texture
+                self.old_value=self.value
 
     def on_init(self):
-        #texture part
-        self.texture = self.app.mesh.texture.textures[self.tex_id]
-        self.shader_program['u_texture_0'] = 0
         self.update()
 
 
@@ -303,96 +276,13 @@ class Pyramid(BaseModel):
 
     def update(self):
         self.texture.use(location = 0)
-        #matrices
-        self.shader_program['m_proj'].write(self.camera.m_proj)
-        self.shader_program['m_view'].write(self.camera.m_view)
-        self.shader_program['cam_pos'].write(self.camera.position)
+        #camera and lights come from the per frame uniform buffers
         self.shader_program['m_model'].write(self.m_model)
-        #light
-        self.buffer_lights()
-
-    def update_shadow(self, indice, face):
-        number_mat = []
-        number_lights = 0
-        m_views = []
-        m_proj_ls= []
-
-        for i in range(len(self.app.scene_renderer.shadowMapList)):
-            number_lights+=1
-            self.depth_texture = self.app.mesh.texture.textures['depth_texture'][i]
-            nb = 0
-            for e in number_mat:
-                nb+=e
-            if type(self.depth_texture) == list:
-                number_mat.append(6)                    #self.shader_program['number_mat'] = 6
-                                                        #m_view = glm.array(self.app.lights[i].m_view_l)
-                #depth texture
-                for y in range(6):
-                    self.depth_texture[y].use(location=1+y+nb)
-                    if (len(self.app.lights)>i):
-                        m_views.append(self.app.lights[i].m_view_l[y])
-            else:
-                number_mat.append(1)
-                for _ in range(6):
-                    m_views.append(self.app.lights[i].m_view_l)
-                                                               #m_view = glm.array([self.app.lights[i].m_view_l for _ in range(6)])
-                #depth texture
-                self.depth_texture.use(location=1+nb)
-                
-            #self.shader_program['m_view_l'].write(m_view.to_bytes())
-
-            m_proj_ls.append(self.app.lights[i].m_proj_l)
-
-        m_view_l = glm.array(m_views+[glm.mat4() for _ in range(24-len(m_views))])
-        m_proj_l = glm.array(m_proj_ls+[glm.mat4() for _ in range(4-len(m_proj_ls))])
-        self.shader_program['number_mat'] = np.array(number_mat+[0 for _ in range(4-len(number_mat))])
-        self.shader_program['number_lights'] = number_lights
-        self.shader_program['m_view_l'].write(m_view_l.to_bytes())
-        self.shader_program['m_proj_l'].write(m_proj_l.to_bytes())
-        #shadow program (indice)
-        if face != -1:
-            self.shadow_program['m_view_l'].write(self.app.lights[indice].m_view_l[face])
-        else:
-            self.shadow_program['m_view_l'].write(self.app.lights[indice].m_view_l)
-
-        self.shadow_program['m_proj'].write(self.app.lights[indice].m_proj_l)
-        self.shadow_program['m_model'].write(self.m_model)
-
-    def render_shadow(self, indice, face):
-        self.update_shadow(indice, face)
-        self.shadow_vao.render()
 
     def on_init(self):
-        #shadow
+        #shadow (light matrices and depth textures are set once per frame by the shadow state)
         self.shadow_vao = self.app.mesh.vao.vaos['shadow_'+self.vao_name]
         self.shadow_program=self.shadow_vao.program
-
-        self.depth_texture = self.app.mesh.texture.textures['depth_texture'][0]
-        self.shader_program['shadowMap'] = [i for i in range(1,25)]
-        self.shader_program['number_lights'] = 1
-        
-        if self.app.lights[0].type_of_light == 'point':
-            self.shader_program['number_mat'] = [6 for _ in range(4)]
-            mv=[]
-            for i in range(24):
-                mv.append(self.app.lights[0].m_view_l[i%6])
-            m_view = glm.array(mv)
-            #depth texture
-            for i in range(6):
-                self.depth_texture[i].use(location=1+i)
-            self.shader_program['m_view_l'].write(m_view.to_bytes())
-            self.shadow_program['m_view_l'].write(self.app.lights[0].m_view_l[0])
-        else:
-            self.shader_program['number_mat'] = [1 for _ in range(4)]
-            m_view = glm.array([self.app.lights[0].m_view_l for _ in range(24)])
-            #depth texture
-            self.depth_texture.use(location=1)
-            
-            self.shader_program['m_view_l'].write(m_view.to_bytes())
-            self.shadow_program['m_view_l'].write(self.app.lights[0].m_view_l)
-
-        self.shadow_program['m_proj'].write(self.camera.m_proj)
-        self.shadow_program['m_model'].write(self.m_model)
         #texture part
         self.texture = self.app.mesh.texture.textures[self.tex_id]
         self.shader_program['u_texture_0'] = 0
@@ -401,107 +291,24 @@ class Pyramid(BaseModel):
 
 class Object(BaseModel):
     def __init__(self, app, pos=(0,0,0), rot=(0,0,0), scale=(1,1,1), tex_id=0, vao_name='cube', vao_link='cube', name = None):
-        self.tex_id = vao_name
+        obj_tex_id = vao_name
         if type(tex_id) == int:
             app.mesh.load_texture_obj(vao_name, link=vao_link) #only load vao, no tex
-            self.tex_id=tex_id
+            obj_tex_id=tex_id
         else:
             app.mesh.load_texture_obj(vao_name, tex_id, vao_link) #load both vao and tex
-        super().__init__(app, pos, rot, scale, self.tex_id, vao_name, set_scale=True, name=name)
+        super().__init__(app, pos, rot, scale, obj_tex_id, vao_name, set_scale=True, name=name)
         self.on_init()
 
     def update(self):
         self.texture.use(location = 0)
-        #matrices
-        self.shader_program['m_proj'].write(self.camera.m_proj)
-        self.shader_program['m_view'].write(self.camera.m_view)
-        self.shader_program['cam_pos'].write(self.camera.position)
+        #camera and lights come from the per frame uniform buffers
         self.shader_program['m_model'].write(self.m_model)
-        #light
-        self.buffer_lights()
-
-    def update_shadow(self, indice, face):
-        number_mat = []
-        number_lights = 0
-        m_views = []
-        m_proj_ls= []
-
-        for i in range(len(self.app.scene_renderer.shadowMapList)):
-            number_lights+=1
-            self.depth_texture = self.app.mesh.texture.textures['depth_texture'][i]
-            nb = 0
-            for e in number_mat:
-                nb+=e
-            if type(self.depth_texture) == list:
-                number_mat.append(6)                    #self.shader_program['number_mat'] = 6
-                                                        #m_view = glm.array(self.app.lights[i].m_view_l)
-                #depth texture
-                for y in range(6):
-                    self.depth_texture[y].use(location=1+y+nb)
-                    if (len(self.app.lights)>i):
-                        m_views.append(self.app.lights[i].m_view_l[y])
-            else:
-                number_mat.append(1)
-                for _ in range(6):
-                    m_views.append(self.app.lights[i].m_view_l)
-                                                               #m_view = glm.array([self.app.lights[i].m_view_l for _ in range(6)])
-                #depth texture
-                self.depth_texture.use(location=1+nb)
-                
-            #self.shader_program['m_view_l'].write(m_view.to_bytes())
-
-            m_proj_ls.append(self.app.lights[i].m_proj_l)
-
-        m_view_l = glm.array(m_views+[glm.mat4() for _ in range(24-len(m_views))])
-        m_proj_l = glm.array(m_proj_ls+[glm.mat4() for _ in range(4-len(m_proj_ls))])
-        self.shader_program['number_mat'] = np.array(number_mat+[0 for _ in range(4-len(number_mat))])
-        self.shader_program['number_lights'] = number_lights
-        self.shader_program['m_view_l'].write(m_view_l.to_bytes())
-        self.shader_program['m_proj_l'].write(m_proj_l.to_bytes())
-        #shadow program (indice)
-        if face != -1:
-            self.shadow_program['m_view_l'].write(self.app.lights[indice].m_view_l[face])
-        else:
-            self.shadow_program['m_view_l'].write(self.app.lights[indice].m_view_l)
-
-        self.shadow_program['m_proj'].write(self.app.lights[indice].m_proj_l)
-        self.shadow_program['m_model'].write(self.m_model)
-
-    def render_shadow(self, indice, face):
-        self.update_shadow(indice, face)
-        self.shadow_vao.render()
 
     def on_init(self):
-        #shadow
+        #shadow (light matrices and depth textures are set once per frame by the shadow state)
         self.shadow_vao = self.app.mesh.vao.vaos['shadow_'+self.vao_name]
         self.shadow_program=self.shadow_vao.program
-
-        self.depth_texture = self.app.mesh.texture.textures['depth_texture'][0]
-        self.shader_program['shadowMap'] = [i for i in range(1,25)]
-        self.shader_program['number_lights'] = 1
-        
-        if self.app.lights[0].type_of_light == 'point':
-            self.shader_program['number_mat'] = [6 for _ in range(4)]
-            mv=[]
-            for i in range(24):
-                mv.append(self.app.lights[0].m_view_l[i%6])
-            m_view = glm.array(mv)
-            #depth texture
-            for i in range(6):
-                self.depth_texture[i].use(location=1+i)
-            self.shader_program['m_view_l'].write(m_view.to_bytes())
-            self.shadow_program['m_view_l'].write(self.app.lights[0].m_view_l[0])
-        else:
-            self.shader_program['number_mat'] = [1 for _ in range(4)]
-            m_view = glm.array([self.app.lights[0].m_view_l for _ in range(24)])
-            #depth texture
-            self.depth_texture.use(location=1)
-            
-            self.shader_program['m_view_l'].write(m_view.to_bytes())
-            self.shadow_program['m_view_l'].write(self.app.lights[0].m_view_l)
-
-        self.shadow_program['m_proj'].write(self.camera.m_proj)
-        self.shadow_program['m_model'].write(self.m_model)
         #texture part
         self.texture = self.app.mesh.texture.textures[self.tex_id]
         self.shader_program['u_texture_0'] = 0
@@ -511,19 +318,15 @@ class Object(BaseModel):
 class Light(BaseModel):
     def __init__(self, app, light, pos=(0,0,0), rot=(0,0,0), scale=(0.1,0.1,0.1), tex_id=2, vao_name='light', intensity = 1, color = (0,0,0), name=None):
         self.light=light
-        self.tex_id = tex_id
         self.intensity = intensity
         self.color = glm.vec3(color)
-        super().__init__(app, pos, rot, scale, self.tex_id, vao_name, name = name)
+        super().__init__(app, pos, rot, scale, tex_id, vao_name, name = name)
         self.on_init()
 
     def update(self):
         self.texture.use()
-        #matrices
-        self.shader_program['m_proj'].write(self.camera.m_proj)
-        self.shader_program['m_view'].write(self.camera.m_view)
+        #matrices (camera comes from the per frame uniform buffer)
         self.shader_program['m_model'].write(self.m_model)
-        self.shader_program['cam_pos'].write(self.camera.position)
 
     def on_init(self):
         #texture part
@@ -0,0 +1,229 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+from mesh_bake import FLOATS, get_face_normals, get_material_vertices
+
+READ_CHUNK = 4*1024*1024 #bytes of the obj read at a time, only the parsed arrays grow with the file
+KINDS = {b'v ': 1, b'vt': 2, b'vn': 3, b'f ': 4} #first two bytes of a line -> kind, anything else is 0
+
+def read_mtl(path):
+    #name -> {'diffuse': Kd, 'texture': map_Kd}, in the order of the file
+    materials = {}
+    material = None
+    with open(path, 'rb') as file:
+        for line in file:
+            values = line.decode('utf-8', 'replace').split()
+            if len(values) == 0:
+                continue
+            if values[0] == 'newmtl':
+                material = {'diffuse': [0.8, 0.8, 0.8], 'texture': None}
+                materials[' '.join(values[1:])] = material
+            elif material == None:
+                continue
+            elif values[0] == 'Kd' and len(values) >= 4:
+                material['diffuse'] = [float(value) for value in values[1:4]]
+            elif values[0] == 'map_Kd' and len(values) >= 2:
+                material['texture'] = values[-1] #the options (-bm, -s...) come before the file
+    return materials
+
+def get_rows(lines, keyword, columns):
+    #consecutive v / vt / vn lines -> (n, columns) in one numpy parse, the extra values (w, colors) are dropped
+    text = b'\n'.join(lines).replace(keyword, b' '*len(keyword))
+    try:
+        flat = np.fromstring(text, dtype='f4', sep=' ')
+        if len(flat) % len(lines) == 0 and len(flat)//len(lines) >= columns:
+            return flat.reshape(len(lines), -1)[:, :columns]
+    except ValueError:
+        pass
+    #lines of different lengths, one by one
+    rows = np.zeros((len(lines), columns), dtype='f4')
+    for i, line in enumerate(lines):
+        values = line.split()[1:1+columns]
+        rows[i, :len(values)] = [float(value) for value in values]
+    return rows
+
+def get_token_counts(text):
+    #number of whitespace separated tokens on every line of text
+    chars = np.frombuffer(text, dtype='u1')
+    blank = (chars == 32) | (chars == 9) | (chars == 13) | (chars == 10)
+    starts = ~blank & np.concatenate([[True], blank[:-1]])
+    lines = np.concatenate([[0], np.cumsum(chars == 10)[:-1]])
+    return np.bincount(lines[starts], minlength=text.count(b'\n')+1)
+
+def get_faces(lines):
+    #consecutive f lines -> (corners, k) obj indices (v, vt, vn up to k, 0 when missing) and the corner count of every face
+    text = b'\n'.join(lines).replace(b'f ', b'  ')
+    sizes = get_token_counts(text)
+    first = lines[0].split()[1]
+    k = first.count(b'/')+1
+    try:
+        flat = np.fromstring(text.replace(b'//', b'/0/').replace(b'/', b' '), dtype=np.int64, sep=' ')
+        if len(flat) == sizes.sum()*k:
+            return flat.reshape(-1, k), sizes
+    except ValueError:
+        pass
+    #formats mixed in the run, one corner at a time
+    corners = []
+    for line in lines:
+        for corner in line.split()[1:]:
+            parts = corner.split(b'/')
+            corners.append([int(part) if part != b'' else 0 for part in parts[:k]]+[0]*(k-len(parts)))
+    return np.array(corners, dtype=np.int64).reshape(-1, k), sizes
+
+def get_triangles(sizes):
+    #polygons of sizes corners -> (n, 3) corner indices, fans ordered like pywavefront: (1,2,3) then (j,1,j-1)
+    counts = np.maximum(sizes-2, 0)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    polygon = np.repeat(np.arange(len(sizes)), counts)
+    j = np.arange(counts.sum())-np.repeat(np.cumsum(counts)-counts, counts)
+    first = j == 0
+    corners = np.stack([np.where(first, 0, j+2), np.where(first, 1, 0), np.where(first, 2, j+1)], axis=1)
+    return starts[polygon][:, None]+corners
+
+def get_indices(column, count):
+    #obj index (1 based, negative from the end) -> 0 based, -1 when missing
+    return np.where(column > 0, column-1, np.where(column < 0, column+count, -1))
+
+class ObjParser:
+    #streaming reader: the file goes through in chunks, every run of same kind lines is parsed at once
+    def __init__(self, link):
+        self.link = link
+        self.directory = os.path.dirname(link)
+        self.positions, self.texcoords, self.normals = [], [], [] #parsed runs
+        self.counts = [0, 0, 0] #v, vt, vn so far, for the negative indices
+        self.materials = {} #name -> {'diffuse', 'texture', 'chunks'}, mtl order first like pywavefront
+        self.material = None
+
+    def get_material(self, name):
+        if name not in self.materials:
+            self.materials[name] = {'diffuse': [0.8, 0.8, 0.8], 'texture': None, 'chunks': []}
+        return self.materials[name]
+
+    def parse(self):
+        rest = b''
+        with open(self.link, 'rb') as file:
+            while True:
+                data = file.read(READ_CHUNK)
+                if data == b'':
+                    break
+                data = rest+data
+                end = data.rfind(b'\n')+1
+                rest = data[end:]
+                self.parse_lines(data[:end].split(b'\n')[:-1])
+        if rest.strip() != b'':
+            self.parse_lines([rest])
+        return self.get_vertices()
+
+    def parse_lines(self, lines):
+        if len(lines) == 0:
+            return
+        prefixes = np.array(lines, dtype='S2')
+        kinds = np.zeros(len(lines), dtype='i1')
+        for prefix, kind in KINDS.items():
+            kinds[prefixes == prefix] = kind
+        bounds = np.concatenate([[0], np.flatnonzero(kinds[1:] != kinds[:-1])+1, [len(lines)]])
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            run = lines[start:end]
+            kind = kinds[start]
+            if kind == 1:
+                self.add_rows(0, self.positions, get_rows(run, b'v', 3))
+            elif kind == 2:
+                self.add_rows(1, self.texcoords, get_rows(run, b'vt', 2))
+            elif kind == 3:
+                self.add_rows(2, self.normals, get_rows(run, b'vn', 3))
+            elif kind == 4:
+                self.add_faces(run)
+            else:
+                for line in run:
+                    self.parse_statement(line)
+
+    def add_rows(self, i, runs, rows):
+        runs.append(rows)
+        self.counts[i] += len(rows)
+
+    def parse_statement(self, line):
+        values = line.decode('utf-8', 'replace').split()
+        if len(values) == 0:
+            return
+        if values[0] == 'mtllib':
+            path = os.path.join(self.directory, ' '.join(values[1:]))
+            if os.path.exists(path):
+                for name, material in read_mtl(path).items():
+                    self.get_material(name).update(material)
+        elif values[0] in ('usemtl', 'usemat'):
+            self.material = self.get_material(' '.join(values[1:]))
+
+    def get_array(self, runs, columns):
+        #the runs parsed so far as one array, joined once and kept that way
+        if len(runs) != 1:
+            runs[:] = [np.concatenate(runs) if len(runs) > 0 else np.zeros((0, columns), dtype='f4')]
+        return runs[0]
+
+    def add_faces(self, lines):
+        if self.material == None:
+            self.material = self.get_material(f"default{len(self.materials)}")
+        corners, sizes = get_faces(lines)
+        triangles = get_triangles(sizes).reshape(-1)
+        out = np.zeros((len(triangles), FLOATS), dtype='f4')
+        positions = self.get_array(self.positions, 3)
+        out[:, 5:8] = positions[get_indices(corners[triangles, 0], self.counts[0])]
+        if corners.shape[1] > 1:
+            texcoords = self.get_array(self.texcoords, 2)
+            index = get_indices(corners[triangles, 1], self.counts[1])
+            out[index >= 0, 0:2] = texcoords[index[index >= 0]]
+        if corners.shape[1] > 2:
+            normals = self.get_array(self.normals, 3)
+            index = get_indices(corners[triangles, 2], self.counts[2])
+            out[index >= 0, 2:5] = normals[index[index >= 0]]
+        else:
+            #exported without normals: flat ones
+            out[:, 2:5] = get_face_normals(out[:, 5:8])
+        self.material['chunks'].append(out)
+
+    def get_vertices(self):
+        #(vertices, draw ranges) like mesh_bake.parse_obj, every material one after the other
+        chunks, ranges = [], []
+        first = 0
+        for name, material in self.materials.items():
+            count = sum(len(chunk) for chunk in material['chunks'])
+            ranges.append({'material': name, 'first': first, 'count': count,
+                           'diffuse': material['diffuse'], 'texture': material['texture']})
+            chunks += material['chunks']
+            first += count
+        vertices = np.concatenate(chunks) if len(chunks) > 0 else np.zeros((0, FLOATS), dtype='f4')
+        return vertices, ranges
+
+def read_obj(link):
+    return ObjParser(link).parse()
+
+def benchmark(links, repeat):
+    #this parser against pywavefront on the same files, and the largest difference between their vertices
+    from pywavefront import Wavefront
+    for link in links:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            vertices, ranges = read_obj(link)
+        fast = (time.perf_counter()-start)/repeat
+        start = time.perf_counter()
+        for _ in range(repeat):
+            obj = Wavefront(link, parse=True, cache=False)
+            reference = [get_material_vertices(material.vertex_format, material.vertices) for material in obj.materials.values()]
+        slow = (time.perf_counter()-start)/repeat
+        reference = np.concatenate(reference)
+        error = np.abs(reference-vertices).max() if reference.shape == vertices.shape else float('inf')
+        print(f"{link}: {len(vertices)} vertices, numpy {fast*1000:.1f} ms, pywavefront {slow*1000:.1f} ms, "
+              f"x{slow/fast:.1f}, max difference {error:g}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="time the numpy obj parser against pywavefront")
+    parser.add_argument('links', nargs='*', default=['model/Oak.obj', 'model/bamboo.obj', 'model/hedgeTextured.obj'])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    missing = [link for link in args.links if not os.path.exists(link)]
+    if len(missing) > 0:
+        sys.exit(f"missing: {', '.join(missing)}")
+    benchmark(args.links, args.repeat)
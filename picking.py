@@ -0,0 +1,159 @@
+import numpy as np
+import glm
+
+from bvh import BVH, get_inv_dirs, get_nearest, ray_box
+
+PICK_MARGIN = 0.05 #world units added around every box, so the small light gizmos stay easy to click
+
+def get_world_boxes(m_models, local_boxes):
+    #axis aligned world box around every oriented box (local box moved by its model matrix)
+    center = (local_boxes[:,0]+local_boxes[:,1])/2
+    half = (local_boxes[:,1]-local_boxes[:,0])/2
+    world_center = np.einsum('kcr,kc->kr', m_models[:,:3,:3], center)+m_models[:,3,:3]
+    world_half = np.einsum('kcr,kc->kr', np.abs(m_models[:,:3,:3]), half)
+    return np.stack([world_center-world_half, world_center+world_half], axis=1)
+
+class ScenePicker:
+    #bvh over the scene objects and the light gizmos, refitted when something moved since the last query
+    def __init__(self, app):
+        self.app = app
+        self.objs = []
+        self.m_models = np.zeros((0,4,4), dtype='f4')
+        self.mesh_boxes = np.zeros((0,2,3), dtype='f4') #bounds registry box of every obj
+        self.local_boxes = np.zeros((0,2,3), dtype='f4') #the same, grown by the margin
+        self.m_inv = np.zeros((0,4,4), dtype='f4')
+        self.flat = np.zeros(0, dtype=bool) #no inverse (a scale of 0), kept in the tree but never hit
+        self.gizmo = np.zeros(0, dtype=bool) #light gizmos, hit on their grown box instead of their triangles
+        self.bvh = BVH(np.zeros((0,2,3)))
+
+    def get_objs(self):
+        #same objects as the old ray marching: the scene, then the light gizmos
+        return self.app.scene+[light.light_ui for light in self.app.lights]
+
+    def get_mesh_boxes(self, objs):
+        bounds = self.app.mesh.vao.bounds
+        return np.array([bounds[obj.vao_name] for obj in objs], dtype='f4').reshape(-1,2,3)
+
+    def set_inverses(self, indices):
+        #inverse model matrices (still column major), a flat object has none and is only flagged
+        m_models = self.m_models[indices]
+        flat = np.abs(np.linalg.det(m_models)) < 1e-12
+        m_models = np.where(flat[:,None,None], np.eye(4, dtype='f4'), m_models)
+        self.m_inv[indices] = np.linalg.inv(m_models)
+        self.flat[indices] = flat
+
+    def get_boxes(self, indices):
+        #the margin is in world units, so divided by the scale of each axis in local space
+        scale = np.maximum(np.linalg.norm(self.m_models[indices,:3,:3], axis=2), 1e-12)
+        margin = PICK_MARGIN/scale
+        self.local_boxes[indices] = self.mesh_boxes[indices]+np.stack([-margin, margin], axis=1)
+        self.set_inverses(indices)
+        #a flat object still has a finite (degenerate) world box, an infinite one would make the refit nan up to the root
+        return get_world_boxes(self.m_models[indices], self.local_boxes[indices])
+
+    def update(self):
+        objs = self.get_objs()
+        m_models = self.app.entities.get_models([obj.slot for obj in objs])
+        mesh_boxes = self.get_mesh_boxes(objs)
+        same = len(objs) == len(self.objs) and all(a is b for a, b in zip(objs, self.objs))
+        if not same:
+            #objects were added or removed, new tree
+            self.objs = objs
+            self.m_models = m_models.copy()
+            self.mesh_boxes = mesh_boxes
+            self.local_boxes = mesh_boxes.copy()
+            self.m_inv = np.zeros_like(m_models)
+            self.flat = np.zeros(len(objs), dtype=bool)
+            self.gizmo = np.arange(len(objs)) >= len(self.app.scene)
+            self.bvh.build(self.get_boxes(np.arange(len(objs))))
+            return
+        #only the objects that moved or changed mesh are refitted
+        changed = np.flatnonzero(np.any(m_models != self.m_models, axis=(1,2)) | np.any(mesh_boxes != self.mesh_boxes, axis=(1,2)))
+        if len(changed) > 0:
+            self.m_models[changed] = m_models[changed]
+            self.mesh_boxes[changed] = mesh_boxes[changed]
+            self.bvh.refit(changed, self.get_boxes(changed))
+
+    def to_local(self, prims, origins, dirs):
+        #rays in the space of their object, t stays a distance along the world ray
+        m_inv = self.m_inv[prims]
+        local_origins = np.einsum('kcr,kc->kr', m_inv[:,:3,:3], origins)+m_inv[:,3,:3]
+        local_dirs = np.einsum('kcr,kc->kr', m_inv[:,:3,:3], dirs)
+        return local_origins, local_dirs
+
+    def get_box_hits(self, origins, dirs, max_t):
+        #every (ray, object, distance) where the ray crosses the oriented box of the object
+        rays, prims, _ = self.bvh.get_candidates(origins, dirs, max_t)
+        local_origins, local_dirs = self.to_local(prims, origins[rays], dirs[rays])
+        near, far = ray_box(local_origins, get_inv_dirs(local_dirs), self.local_boxes[prims,0], self.local_boxes[prims,1])
+        hit = (far >= np.maximum(near, 0)) & (near <= max_t) & ~self.flat[prims]
+        return rays[hit], prims[hit], np.maximum(near[hit], 0)
+
+    def intersect(self, origins, dirs, max_t=np.inf):
+        #nearest oriented box hit for every ray: (index in self.objs or -1, distance or inf)
+        #origins and dirs are (n,3) arrays, so a whole batch of visibility queries costs one traversal
+        self.update()
+        origins = np.asarray(origins, dtype='f4').reshape(-1,3)
+        dirs = np.asarray(dirs, dtype='f4').reshape(-1,3)
+        rays, prims, near = self.get_box_hits(origins, dirs, max_t)
+        best, best_t = get_nearest(rays, near, len(origins))
+        index = np.full(len(origins), -1, dtype=np.int64)
+        index[best >= 0] = prims[best[best >= 0]]
+        return index, best_t
+
+    def intersect_meshes(self, origins, dirs, max_t=np.inf):
+        #nearest triangle hit for every ray, through the triangle bvh of every mesh whose box is crossed
+        #returns (object index, distance, world point, world normal facing the ray, triangle index), -1/inf when nothing is hit, triangle -1 on a gizmo
+        self.update()
+        origins = np.asarray(origins, dtype='f4').reshape(-1,3)
+        dirs = np.asarray(dirs, dtype='f4').reshape(-1,3)
+        rays, prims, near = self.get_box_hits(origins, dirs, max_t)
+        index = np.full(len(origins), -1, dtype=np.int64)
+        best_t = np.full(len(origins), np.inf)
+        triangle = np.full(len(origins), -1, dtype=np.int64)
+        normals = np.zeros((len(origins),3))
+        #a gizmo counts as hit anywhere inside its grown box, the margin is what keeps it clickable
+        gizmo = self.gizmo[prims]
+        best, t = get_nearest(rays[gizmo], near[gizmo], len(origins))
+        hit = best >= 0
+        index[hit] = prims[gizmo][best[hit]]
+        best_t[hit] = t[hit]
+        normals[hit] = -dirs[hit]
+        rays, prims, near = rays[~gizmo], prims[~gizmo], near[~gizmo]
+        vbos = self.app.mesh.vao.vbo.vbos
+        #closest boxes first, so the far objects are mostly skipped
+        order = np.argsort(near, kind='stable')
+        rays, prims, near = rays[order], prims[order], near[order]
+        for prim in prims[np.sort(np.unique(prims, return_index=True)[1])]:
+            pairs = (prims == prim) & (near < np.minimum(best_t[rays], max_t))
+            if not pairs.any():
+                continue
+            obj_rays = rays[pairs]
+            mesh_bvh = vbos[self.objs[prim].vao_name].get_mesh_bvh()
+            local_origins, local_dirs = self.to_local(np.full(len(obj_rays), prim), origins[obj_rays], dirs[obj_rays])
+            tri, t = mesh_bvh.intersect(local_origins, local_dirs, max_t)
+            better = (tri >= 0) & (t < best_t[obj_rays])
+            obj_rays, tri, t = obj_rays[better], tri[better], t[better]
+            index[obj_rays] = prim
+            best_t[obj_rays] = t
+            triangle[obj_rays] = tri
+            #normal matrix = transpose of the inverse model matrix
+            normals[obj_rays] = mesh_bvh.get_normals(tri) @ self.m_inv[prim,:3,:3].T
+        normals /= np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
+        normals *= np.where(np.einsum('ij,ij->i', normals, dirs) > 0, -1, 1)[:,None]
+        points = origins+dirs*np.where(index >= 0, best_t, 0)[:,None]
+        return index, best_t, points, normals, triangle
+
+    def pick(self, origin, direction, max_t=np.inf):
+        #one ray from the camera, returns (obj, distance) or (None, inf), exact on the triangles (gizmos within the margin)
+        index, t, _, _, _ = self.intersect_meshes(np.array(origin, dtype='f4'), np.array(direction, dtype='f4'), max_t)
+        if index[0] < 0:
+            return None, np.inf
+        return self.objs[index[0]], float(t[0])
+
+    def pick_surface(self, origin, direction, max_t=np.inf):
+        #(point, normal) of the surface under the ray, or None
+        index, _, points, normals, _ = self.intersect_meshes(np.array(origin, dtype='f4'), np.array(direction, dtype='f4'), max_t)
+        if index[0] < 0:
+            return None
+        return glm.vec3(*points[0]), glm.vec3(*normals[0])
@@ -0,0 +1,223 @@
+import os
+from collections import deque
+
+import tkinter as tk
+from tkinter import filedialog
+
+from mesh_bake import get_baked_path
+
+#field -> number of entries, in the order of the panel
+FIELDS = {'name': 1, 'position': 3, 'rotation': 3, 'scale': 3, 'texture': 1, 'vao': 1, 'color': 3, 'intensity': 1}
+OBJECT_FIELDS = ['name', 'position', 'rotation', 'scale', 'texture', 'vao'] #what the panel shows for a model
+LIGHT_FIELDS = ['name', 'position', 'color', 'intensity'] #and for a light gizmo
+IMPORTS = {'TEXTURE': ('TEXTURE ACCESS NAME', [('PNJ, JPG', '*.png *.jpg')]), 'MODEL': ('OBJ ACCESS NAME', [('OBJ', '*.obj')])}
+REFRESH_FRAMES = 10 #the entries follow the selected model (undo, moves) every this many frames
+INVALID_COLOR = '#f2b8b5'
+
+def get_text(field, obj):
+    #values shown in the entries of a field
+    if field == 'texture':
+        return [str(obj.tex_id)]
+    if field == 'vao':
+        return [str(obj.vao_name)]
+    if FIELDS[field] == 3:
+        return [str(round(float(value), 4)) for value in getattr(obj, field)]
+    return [str(getattr(obj, field))]
+
+def parse(field, texts):
+    #entries -> value for CommandLog.edit, ValueError when they are not numbers where numbers are needed
+    if FIELDS[field] == 3:
+        return tuple(float(text) for text in texts)
+    if field == 'intensity':
+        return float(texts[0])
+    if field == 'texture' and texts[0].isdigit():
+        return int(texts[0]) #texture numbers, anything else is the name of an imported texture
+    return texts[0]
+
+class PropertyEditor:
+    #one persistent tk window next to the engine, pumped once per frame instead of running its own mainloop
+    #the widgets only queue edits, the frame loop applies them (through the command log, so they can be undone)
+    def __init__(self, app):
+        self.app = app
+        self.root = None
+        self.title = None #label with the selected model
+        self.failed = False #no display for tk, the editor stays off
+        self.shown = False
+        self.edits = deque() #('edit', field, entity id, value) or ('import', kind, name, link)
+        self.entries = {} #field -> [tk.Entry]
+        self.rows = {} #field -> tk.Frame
+        self.imports = {} #kind -> (name entry, link entry)
+        self.selected = None #model shown in the entries
+        self.kind = None
+        self.frame = 0
+
+    #window
+    def create(self):
+        try:
+            self.root = tk.Tk()
+        except tk.TclError as error:
+            print(f"property editor unavailable: {error}")
+            self.failed = True
+            return
+        self.root.title("Properties")
+        self.root.wm_attributes("-topmost", True) #keep it on top
+        self.root.protocol("WM_DELETE_WINDOW", self.hide) #closing hides it, the next one opens at once
+        self.title = tk.Label(self.root, text="None", anchor='w')
+        self.title.grid(row=0, column=0, sticky='we')
+        for i, (field, count) in enumerate(FIELDS.items()):
+            row = self.rows[field] = tk.Frame(self.root)
+            row.grid(row=1+i, column=0, sticky='we')
+            tk.Label(row, text=field, width=9, anchor='w').grid(row=0, column=0)
+            self.entries[field] = []
+            for j in range(count):
+                entry = tk.Entry(row, width=10 if count == 3 else 32)
+                entry.grid(row=0, column=1+j)
+                entry.bind('<Return>', lambda event, field=field: self.submit(field))
+                self.entries[field].append(entry)
+            tk.Button(row, text="Enter", padx=10, command=lambda field=field: self.submit(field)).grid(row=0, column=4)
+        for i, (kind, (placeholder, filetypes)) in enumerate(IMPORTS.items()):
+            row = tk.Frame(self.root)
+            row.grid(row=1+len(FIELDS)+i, column=0, sticky='we')
+            tk.Label(row, text=kind, width=9, anchor='w').grid(row=0, column=0)
+            name, link = tk.Entry(row, width=16), tk.Entry(row, width=24)
+            name.insert(tk.END, placeholder)
+            name.grid(row=0, column=1)
+            link.grid(row=0, column=2)
+            tk.Button(row, text="Browse", command=lambda link=link, filetypes=filetypes: self.browse(link, filetypes)).grid(row=0, column=3)
+            tk.Button(row, text="Import", padx=10, command=lambda kind=kind: self.submit_import(kind)).grid(row=0, column=4)
+            self.imports[kind] = (name, link)
+        self.selected = self.kind = None
+
+    def show(self, field=None):
+        #opens the panel, with the entry of field focused
+        if self.failed:
+            return
+        if self.root == None:
+            self.create()
+            if self.failed:
+                return
+        self.root.deiconify()
+        self.shown = True
+        self.refresh(force=True)
+        if field in self.entries:
+            self.entries[field][0].focus_set()
+            self.entries[field][0].select_range(0, tk.END)
+        elif field in self.imports:
+            self.imports[field][1].focus_set()
+
+    def hide(self):
+        self.root.withdraw()
+        self.shown = False
+
+    def toggle(self):
+        if self.shown:
+            self.hide()
+        else:
+            self.show()
+
+    def destroy(self):
+        if self.root != None:
+            self.root.destroy()
+            self.root = None
+
+    def browse(self, link, filetypes):
+        file = filedialog.askopenfile(mode='r', filetypes=filetypes)
+        if file:
+            link.delete(0, tk.END)
+            link.insert(tk.END, os.path.abspath(file.name))
+
+    #widgets -> queue
+    def submit(self, field):
+        obj = self.app.camera.selected_obj
+        entries = self.entries[field]
+        if obj == None:
+            return
+        try:
+            value = parse(field, [entry.get() for entry in entries])
+        except ValueError:
+            value = None
+        valid = value != None and self.is_valid(field, value)
+        for entry in entries:
+            entry.config(bg='white' if valid else INVALID_COLOR)
+        if valid:
+            self.edits.append(('edit', field, obj.entity_id, value))
+
+    def submit_import(self, kind):
+        name, link = self.imports[kind]
+        if link.get() == "":
+            return
+        valid = self.is_importable(kind, link.get())
+        link.config(bg='white' if valid else INVALID_COLOR)
+        if valid:
+            self.edits.append(('import', kind, name.get(), link.get()))
+
+    #values the frame loop can apply, anything else would raise inside render
+    def is_valid(self, field, value):
+        if field == 'texture':
+            return value in self.app.mesh.texture.textures and value != 'depth_texture'
+        if field == 'vao':
+            vao = self.app.mesh.vao
+            #built in meshes need their shadow vao too (the ui and letter vaos have none)
+            return value in vao.registry.links or (value in vao.vaos and 'shadow_'+value in vao.vaos)
+        return True
+
+    def is_importable(self, kind, link):
+        if kind == 'TEXTURE':
+            return os.path.isfile(link)
+        return os.path.isfile(link) or os.path.isfile(get_baked_path(link)) #a baked mesh is enough (see ObjectVBO)
+
+    #once per frame
+    def update(self):
+        if self.root != None:
+            try:
+                self.root.update() #tk events of the panel, only what is pending
+            except tk.TclError:
+                self.root = None
+                self.shown = False
+        self.apply()
+        self.frame += 1
+        if self.shown and (self.app.camera.selected_obj is not self.selected or self.frame % REFRESH_FRAMES == 0):
+            self.refresh()
+
+    def apply(self):
+        #queued edits, with the models they were made on (removed ones are dropped)
+        while len(self.edits) > 0:
+            edit = self.edits.popleft()
+            if edit[0] == 'edit':
+                _, field, entity_id, value = edit
+                obj = self.app.entities.get(entity_id)
+                if obj != None and self.is_valid(field, value): #checked again, a mesh or file may be gone since
+                    self.app.camera.commands.edit(field, [obj], [value])
+            else:
+                _, kind, name, link = edit
+                if not self.is_importable(kind, link):
+                    print(f"import skipped, {link} does not exist")
+                elif kind == 'TEXTURE':
+                    self.app.mesh.texture.load_texture_obj(name, link)
+                    self.app.camera.save_imports(name, link, "None")
+                else:
+                    self.app.mesh.load_texture_obj(name, link_tex=None, link=link)
+                    self.app.camera.save_imports(name, "None", link)
+
+    def refresh(self, force=False):
+        #entries of the selected model, the one being typed in is left alone
+        obj = self.app.camera.selected_obj
+        kind = None if obj == None else ('light' if obj in [light.light_ui for light in self.app.lights] else 'object')
+        if kind != self.kind or force:
+            fields = LIGHT_FIELDS if kind == 'light' else OBJECT_FIELDS
+            for field, row in self.rows.items():
+                if field in fields:
+                    row.grid()
+                else:
+                    row.grid_remove()
+            self.kind = kind
+        changed = obj is not self.selected
+        self.selected = obj
+        self.title.config(text="None" if obj == None else f"{kind}: {obj.name}")
+        focus = self.root.focus_get()
+        for field in (LIGHT_FIELDS if kind == 'light' else OBJECT_FIELDS):
+            texts = get_text(field, obj) if obj != None else ['']*FIELDS[field]
+            for entry, text in zip(self.entries[field], texts):
+                if (entry is not focus or changed or force) and entry.get() != text:
+                    entry.delete(0, tk.END)
+                    entry.insert(tk.END, text)
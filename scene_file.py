@@ -0,0 +1,103 @@
+import os
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b'ASCN'
+VERSION = 1
+PREFIX = struct.Struct('<4sII') #magic, version, length of the json header
+ALIGN = 16 #every column starts on a multiple of this
+EXTENSION = '.scene'
+
+#column -> (dtype, values per object), the tables of the header give the meaning of the id columns
+COLUMNS = {'position': ('<f4', 3), 'rotation': ('<f4', 3), 'scale': ('<f4', 3),
+           'texture': ('<u4', 1), 'mesh': ('<u4', 1), 'name': ('<u4', 1)}
+TABLES = {'texture': 'textures', 'mesh': 'meshes', 'name': 'names'}
+
+def get_binary_path(link):
+    return os.path.splitext(link)[0]+EXTENSION
+
+def get_ids(values):
+    #values -> (table of the distinct ones in order of appearance, id of every value in the table)
+    table, ids = {}, []
+    for value in values:
+        ids.append(table.setdefault(value, len(table)))
+    return list(table), np.array(ids, dtype='<u4')
+
+def get_columns(objs):
+    #scene models -> {column: array} plus the tables, like read_scene
+    count = len(objs)
+    entities = objs[0].app.entities if count > 0 else None
+    slots = np.array([obj.slot for obj in objs], dtype=np.int64)
+    columns = {}
+    for name in ['position', 'rotation', 'scale']:
+        columns[name] = getattr(entities, name)[slots] if count > 0 else np.zeros((0, 3), dtype='<f4')
+    tables = {}
+    for column, values in [('texture', [obj.tex_id for obj in objs]), ('mesh', [obj.vao_name for obj in objs]), ('name', [obj.name for obj in objs])]:
+        tables[TABLES[column]], columns[column] = get_ids(values)
+    return columns, tables
+
+def write_scene(path, objs):
+    write_columns(path, *get_columns(objs))
+
+def write_columns(path, columns, tables):
+    #written next to the final file then renamed, so a crash while saving keeps the last scene
+    count = len(columns['position'])
+    header = {'count': count, 'columns': {}, **tables}
+    offset = 0
+    for name, (dtype, size) in COLUMNS.items():
+        header['columns'][name] = {'dtype': dtype, 'size': size, 'offset': offset}
+        offset += count*size*np.dtype(dtype).itemsize
+        offset += -offset % ALIGN
+    data = json.dumps(header).encode()
+    data += b' '*(-(PREFIX.size+len(data)) % ALIGN)
+    temp = path+'.tmp'
+    with open(temp, 'wb') as file:
+        file.write(PREFIX.pack(MAGIC, VERSION, len(data)))
+        file.write(data)
+        for name, (dtype, size) in COLUMNS.items():
+            column = np.ascontiguousarray(columns[name], dtype=dtype).tobytes()
+            file.write(column)
+            file.write(b'\0'*(-len(column) % ALIGN))
+    os.replace(temp, path)
+
+def read_scene(path):
+    #(columns, tables): every column is one read of the file, (count, size) or (count,)
+    with open(path, 'rb') as file:
+        magic, version, length = PREFIX.unpack(file.read(PREFIX.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a scene of version {VERSION}")
+        header = json.loads(file.read(length))
+        start = PREFIX.size+length
+        count = header['count']
+        columns = {}
+        for name, column in header['columns'].items():
+            file.seek(start+column['offset'])
+            array = np.fromfile(file, dtype=column['dtype'], count=count*column['size'])
+            columns[name] = array.reshape(count, column['size']) if column['size'] > 1 else array
+    return columns, {table: header[table] for table in TABLES.values()}
+
+def read_scene_csv(path):
+    #the text format of camera.save_scene before the binary one, class;pos;rot;scale;tex_id;vao_name;name;
+    rows = []
+    with open(path, mode="r", encoding="utf-8") as file:
+        for line in file:
+            l = line.split(';')
+            if len(l) >= 13 and l[0] == 'cube':
+                rows.append(l)
+    columns = {}
+    for name, start in [('position', 1), ('rotation', 4), ('scale', 7)]:
+        columns[name] = np.array([l[start:start+3] for l in rows], dtype='f4').reshape(-1, 3)
+    #texture ids made of digits are texture numbers, anything else the name of an imported texture
+    textures = [int(l[10]) if l[10][:1].isdigit() else l[10] for l in rows]
+    tables = {}
+    for column, values in [('texture', textures), ('mesh', [l[11] for l in rows]), ('name', [l[12] for l in rows])]:
+        tables[TABLES[column]], columns[column] = get_ids(values)
+    return columns, tables
+
+def load_scene_file(path):
+    #binary or csv, from the extension
+    if os.path.splitext(path)[1] == EXTENSION:
+        return read_scene(path)
+    return read_scene_csv(path)
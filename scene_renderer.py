@@ -1,11 +1,35 @@
+import numpy as np
 import glm
 
+from instancing import InstanceRenderer
+from shadow_state import ShadowState
+from shadow_cache import ShadowCache
+from culling import Culling
+from lod import LodSelector
+
+INSTANCED = True #objects sharing a vao and a texture are drawn in one call
+LAYERED = True #the 6 faces of a point light are rendered in one pass over the scene
+SHADOW_CACHE = True #shadow maps are only redrawn where a light or a shadow caster changed
+CULLING = True #objects outside the camera (or light) frustum are skipped, see culling.rejected for the counts
+
+ALL_FACES = 6 #face index of a layered pass
+GL_CLIP_DISTANCE0 = 0x3000
+
 class SceneRenderer:
     def __init__(self, app):
         self.app = app
         self.ctx = app.ctx
         self.mesh = app.mesh
         self.shadowMapList = []
+        self.instanced = INSTANCED
+        self.layered = LAYERED
+        self.shadow_caching = SHADOW_CACHE
+        self.culling_enabled = CULLING
+        self.culling = Culling(app)
+        self.lod = LodSelector(app)
+        self.instance_renderer = InstanceRenderer(app)
+        self.shadow_state = ShadowState(app)
+        self.shadow_cache = ShadowCache(app)
 
     def add_shadow(self, param=""):
         if param == "point":
@@ -14,19 +38,17 @@ class SceneRenderer:
             self.shadowMapList.append(ShadowMap(self.app))
 
     def remove_shadow(self, indexe=-1):
+        #the last shadow map (and its depth texture) moves into the hole, so the light indexes stay paired
+        depth_textures = self.app.mesh.texture.textures['depth_texture']
+        indexe = indexe%len(self.shadowMapList)
         self.shadowMapList[indexe].destroy()
-        self.shadowMapList.pop(indexe)
-        depth_tex = self.app.mesh.texture.textures['depth_texture'].pop(indexe)
-        if type(depth_tex) == list:
-            for elt in depth_tex:
-                elt.release()
-        else:
-            depth_tex.release()
-        
-        #we need to put everything back
-        for shadowMap in self.shadowMapList:
-            if shadowMap.indexe>=indexe:
-                shadowMap.indexe-=1
+        depth_textures[indexe].release()
+        last = self.shadowMapList.pop()
+        last_texture = depth_textures.pop()
+        if indexe < len(self.shadowMapList):
+            self.shadowMapList[indexe] = last
+            depth_textures[indexe] = last_texture
+            last.indexe = indexe
 
     def render_shadow(self):
         # Directions for the cube map faces
@@ -34,12 +56,67 @@ class SceneRenderer:
             shadowMap.render_depth()
 
     def render(self):
-        self.app.ctx.screen.use()
+        self.app.screen.use()
+        if self.culling_enabled:
+            visible = self.culling.visible
+        else:
+            visible = np.ones(len(self.app.scene), dtype=bool)
         #render scene
-        for obj in self.app.scene:
-            obj.render()
+        with self.app.gpu_timers.scope('scene'):
+            if self.instanced:
+                self.instance_renderer.render(visible)
+            else:
+                for obj, obj_visible in zip(self.app.scene, visible):
+                    if obj_visible:
+                        obj.render()
+
+    def set_shadow_pass(self, indice, face, face_mask=0b111111):
+        #face: -1 for a directional light, 0-5 for one face of a point light, ALL_FACES for the 6 at once
+        for name in ['shadow_map', 'shadow_map_instanced']:
+            program = self.mesh.vao.program.programs[name]
+            program['shadow_slot'] = indice*6+(face if face in range(6) else 0)
+            program['face_count'] = 6 if face == ALL_FACES else 1
+            program['tiled'] = face == ALL_FACES
+            program['face_mask'] = face_mask
+
+    def render_scene_shadow(self, indice, face, face_mask=0b111111):
+        #draws every shadow caster for one light (and one face of it if it's a point light)
+        self.set_shadow_pass(indice, face, face_mask)
+        if face == ALL_FACES:
+            slots = [indice*6+face_cube for face_cube in range(6) if face_mask & (1<<face_cube)]
+            name = f"shadow {indice}"
+        elif face in range(6):
+            slots = [indice*6+face]
+            name = f"shadow {indice} face {face}"
+        else:
+            slots = [indice*6]
+            name = f"shadow {indice}"
+        if self.culling_enabled:
+            visible = self.culling.get_shadow_visible(slots, name)
+        else:
+            visible = self.culling.casters
+
+        with self.app.gpu_timers.scope(name):
+            if self.instanced:
+                self.instance_renderer.render_shadow(visible)
+            else:
+                for obj, obj_visible in zip(self.app.scene, visible):
+                    if obj_visible:
+                        obj.render_shadow()
     
     def all_renders(self):
+        #model matrices of every moved entity in one batch, then the bounding spheres of the whole scene
+        self.app.entities.update()
+        self.culling.update()
+        self.lod.update()
+        if self.instanced:
+            self.instance_renderer.update(self.app.entities.instance_data[self.app.entities.get_scene_slots()])
+        #light matrices and depth textures, once for every pass
+        self.shadow_state.update()
+        if self.shadow_caching:
+            self.shadow_cache.update()
+        else:
+            self.shadow_cache.reset()
         #pass 1
         self.render_shadow()
         #pass 2
@@ -48,6 +125,8 @@ class SceneRenderer:
     def destroy(self):
         for shadowMap in self.shadowMapList:
             shadowMap.destroy()
+        self.instance_renderer.destroy()
+        self.shadow_state.destroy()
 
 
 class ShadowCubeMap():
@@ -56,26 +135,46 @@ class ShadowCubeMap():
         #depth buffer / shadows
         self.app.mesh.texture.textures['depth_texture'].append(self.app.mesh.texture.get_cube_depth_tex())
         self.indexe = len(self.app.scene_renderer.shadowMapList)
-        self.depth_texture = self.app.mesh.texture.textures['depth_texture'][self.indexe] # this is an array
+        self.depth_texture = self.app.mesh.texture.textures['depth_texture'][self.indexe] # 3x2 atlas, one tile per face
+        self.face_size = self.depth_texture.width//3
+        #faces to redraw, set by the shadow cache
+        self.dirty_faces = np.ones(6, dtype=bool)
+        self.light_version = -1
         """framebuffer"""
-        self.depth_fbo = [self.app.ctx.framebuffer(
-                depth_attachment=self.depth_texture[i]
-        ) for i in range(6)]
+        self.depth_fbo = self.app.ctx.framebuffer(
+                depth_attachment=self.depth_texture
+        )
 
-    def render_depth(self):
-        # Directions for the cube map faces
-        for face_cube in range(6):
+    def get_face_viewport(self, face_cube):
+        return ((face_cube%3)*self.face_size, (face_cube//3)*self.face_size, self.face_size, self.face_size)
 
-            self.depth_fbo[face_cube].clear()
-            self.depth_fbo[face_cube].use()
+    def render_depth(self):
+        if not self.dirty_faces.any():
+            return #the whole atlas is still valid
+        faces = [face_cube for face_cube in range(6) if self.dirty_faces[face_cube]]
+        self.depth_fbo.viewport = (0, 0, *self.depth_texture.size)
+        self.depth_fbo.use()
+        for face_cube in faces:
+            self.depth_fbo.clear(viewport=self.get_face_viewport(face_cube))
 
-            for obj in self.app.scene:
-                if obj.vao_name != "light":
-                    obj.render_shadow(self.indexe, face_cube) #0 is the indice of the light we are currently on
+        if self.app.scene_renderer.layered:
+            #one pass, the geometry shader sends every triangle to the faces it touches
+            face_mask = sum(1<<face_cube for face_cube in faces)
+            for plane in range(4):
+                self.app.ctx.enable_direct(GL_CLIP_DISTANCE0+plane)
+            self.app.scene_renderer.render_scene_shadow(self.indexe, ALL_FACES, face_mask)
+            for plane in range(4):
+                self.app.ctx.disable_direct(GL_CLIP_DISTANCE0+plane)
+        else:
+            # Directions for the cube map faces
+            for face_cube in faces:
+                self.depth_fbo.viewport = self.get_face_viewport(face_cube)
+                self.app.scene_renderer.render_scene_shadow(self.indexe, face_cube)
+            self.depth_fbo.viewport = (0, 0, *self.depth_texture.size)
+        self.dirty_faces[:] = False
                 
     def destroy(self):
-        for face_cube in range(6):
-            self.depth_fbo[face_cube].release()
+        self.depth_fbo.release()
 
 class ShadowMap():
     def __init__(self, app):
@@ -84,19 +183,22 @@ class ShadowMap():
         self.app.mesh.texture.textures['depth_texture'].append(self.app.mesh.texture.get_depth_tex())
         self.indexe = len(self.app.mesh.texture.textures['depth_texture'])-1
         self.depth_texture =  self.app.mesh.texture.textures['depth_texture'][self.indexe] # this is an array
+        #set by the shadow cache
+        self.dirty_faces = np.ones(1, dtype=bool)
+        self.light_version = -1
         """framebuffer"""
         self.depth_fbo = self.app.ctx.framebuffer(
                 depth_attachment=self.depth_texture
         ) 
 
     def render_depth(self):
-        # Directions for the cube map faces
+        if not self.dirty_faces.any():
+            return #nothing changed in the light frustum, last frame's map is still valid
         self.depth_fbo.clear()
         self.depth_fbo.use()
 
-        for obj in self.app.scene:
-            if obj.vao_name != "light":
-                obj.render_shadow(self.indexe, -1) #-1 => not multiple face
+        self.app.scene_renderer.render_scene_shadow(self.indexe, -1) #-1 => not multiple face
+        self.dirty_faces[:] = False
                 
     def destroy(self):
         self.depth_fbo.release()
\ No newline at end of file
@@ -1,4 +1,4 @@
-
+import os
 
 class Shader_Program:
     def __init__(self, ctx):
@@ -7,16 +7,33 @@ class Shader_Program:
         self.programs['default'] = self.get_program('default')
         self.programs['ui'] = self.get_program('ui')
         self.programs['letters'] = self.get_program('letters')
+        self.programs['text'] = self.get_program('text') #glyph atlas labels
         self.programs['light'] = self.get_program('light_ui')
         self.programs['shadow_map'] = self.get_program('shadow')
+        #instanced versions of the scene programs (model matrix comes from a per-instance buffer)
+        self.programs['default_instanced'] = self.get_program('default', defines=['INSTANCED'])
+        self.programs['shadow_map_instanced'] = self.get_program('shadow', defines=['INSTANCED'])
         
-    def get_program(self, shader_name):
+    def get_program(self, shader_name, defines=()):
         with open(f'shaders/{shader_name}.vert') as file:
-            vertex_shader = file.read()
+            vertex_shader = self.add_defines(file.read(), defines)
         with open(f'shaders/{shader_name}.frag') as file:
-            fragment_shader = file.read()
+            fragment_shader = self.add_defines(file.read(), defines)
+        geometry_shader = None
+        if os.path.exists(f'shaders/{shader_name}.geom'): #optional stage
+            with open(f'shaders/{shader_name}.geom') as file:
+                geometry_shader = self.add_defines(file.read(), defines)
 
-        program = self.ctx.program(vertex_shader=vertex_shader, fragment_shader=fragment_shader)
+        program = self.ctx.program(vertex_shader=vertex_shader, fragment_shader=fragment_shader, geometry_shader=geometry_shader)
         return program
+
+    @staticmethod
+    def add_defines(source, defines):
+        #the #defines have to come right after the #version line
+        if len(defines) == 0:
+            return source
+        version, rest = source.split('\n', 1)
+        return '\n'.join([version]+[f'#define {define}' for define in defines]+[rest])
+
     def destroy(self):
-        [program.release() for program in self.programs.values()]
\ No newline at end of file
+        [program.release() for program in self.programs.values()]
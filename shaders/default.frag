@@ -1,31 +1,45 @@
 #version 410
 #define MAX_SIZE 24
+#define INDEX_WIDTH 4096 //light numbers per row of cluster_indices (clustered_lights.py)
 
 layout (location = 0) in vec2 uv_0;
 layout (location = 1) in vec3 v_pos;
 layout (location = 2) in vec3 v_normals;
 layout (location = 3) in float rd_light_diffraction;
 layout (location = 4) in vec2 pixel_pos;
-in vec4 shadowCoord[MAX_SIZE];
+layout (location = 5) in vec4 shadowCoord[MAX_SIZE];
 
 out vec4 fragColor;
 
 
-uniform vec3 cam_pos;
-
 uniform sampler2D u_texture_0;
-uniform sampler2DShadow shadowMap[MAX_SIZE];
-uniform int number_mat[4];
-uniform int number_lights;
-
-//matrices
-uniform mat4 m_proj;
-uniform mat4 m_view;
-uniform mat4 m_model;
-
-uniform vec3 light_pos[4]; //max number of lights is 4
-uniform vec3 light_color[4];
-uniform float light_intensity[4];
+uniform sampler2DShadow shadowMap[4]; //one per light
+//shadowless point lights sorted into clusters of the view on the cpu (clustered_lights.py)
+uniform sampler2D cluster_lights; //2 texels per light: position and radius, color and intensity
+uniform usampler2D cluster_grid; //offset and count of every cluster in cluster_indices
+uniform usampler2D cluster_indices; //light numbers of every cluster, one after the other
+
+//per frame state (see uniform_buffers.py)
+layout (std140) uniform Camera {
+    mat4 m_proj;
+    mat4 m_view;
+    vec3 cam_pos;
+};
+
+layout (std140) uniform Lights {
+    vec4 light_pos[4]; //max number of lights is 4
+    vec4 light_color[4];
+    vec4 light_intensity;
+    ivec4 cluster_count; //clusters in x, y and z, then the number of point lights
+    vec4 cluster_params; //screen width and height, slice = log(depth)*z+w
+};
+
+layout (std140) uniform Shadows {
+    mat4 m_shadow[MAX_SIZE]; //bias*proj*view of every light face
+    mat4 m_light_vp[MAX_SIZE]; //proj*view, for the depth passes
+    ivec4 number_mat;
+    int number_lights;
+};
 
 
 //light params
@@ -33,29 +47,40 @@ float AMBIANT_LIGHT = 0.04;
 float STRENGTH_DIFFUSE = 13.0; //the diffuse has more impact
 
 vec2 size_tex = vec2(4096,4096);
-vec2 size_tex2 = vec2(1024,1024);
+vec2 size_tex2 = vec2(1024,1024); //one face of a point light atlas
 
-float getSample16X(int ind, bool isPoint){
+float getSample16X(int ind, int map){
     float shadow = 0;
     for (int i = -8; i<=7; i++){
         vec4 pos = (shadowCoord[ind]+vec4((i%4)/size_tex.x,int(i/4)/size_tex.y,0,0));
-        vec4 pos2 = (shadowCoord[ind]+vec4((i%4)/size_tex2.x,int(i/4)/size_tex2.y,0,0));
-        if ((pos.x < 0 || pos.x > size_tex.x) || (pos.y < 0 || pos.y > size_tex.y) && isPoint == false|| (pos.x < 0 || pos.x > size_tex.x) || (pos.y < 0 || pos.y > size_tex.y) && isPoint){
+        if ((pos.x < 0 || pos.x > size_tex.x) || (pos.y < 0 || pos.y > size_tex.y)){
             shadow+=1;
         }
         else{
-            if (isPoint){
-                shadow+=textureProj(shadowMap[ind],shadowCoord[ind]+vec4((i%4)/size_tex2.x,int(i/4)/size_tex2.y,0,0));
-            }
-            else{
-                shadow+=textureProj(shadowMap[ind],shadowCoord[ind]+vec4((i%4)/size_tex.x,int(i/4)/size_tex.y,0,0));
-            }
+            shadow+=textureProj(shadowMap[map],pos);
         }
         
     }
     return shadow/16;
 }
 
+float getSampleFace16X(int ind, int map, int face){
+    //point lights keep their 6 faces in a 3x2 atlas, so we read inside the tile of the face
+    vec4 coord = shadowCoord[ind];
+    vec3 proj = coord.xyz/coord.w;
+    if (coord.w <= 0 || proj.x < 0 || proj.x > 1 || proj.y < 0 || proj.y > 1){
+        return 1.0; //another face covers this fragment
+    }
+    vec2 tile = vec2(face%3, face/3);
+    vec2 half_texel = 0.5/size_tex2;
+    float shadow = 0;
+    for (int i = -8; i<=7; i++){
+        vec2 uv = clamp(proj.xy+vec2(i%4, int(i/4))/size_tex2, half_texel, 1.0-half_texel);
+        shadow+=texture(shadowMap[map], vec3((uv+tile)/vec2(3,2), proj.z));
+    }
+    return shadow/16;
+}
+
 float getShadow(int ind){
     float shadow = 0;
     int new_ind = 0;
@@ -65,15 +90,40 @@ float getShadow(int ind){
     if (number_mat[ind] == 6){
         shadow+=1;
         for (int i = 0; i<number_mat[ind]; i++){
-            shadow *= getSample16X(i+new_ind, true);
+            shadow *= getSampleFace16X(i+new_ind, ind, i);
         }
     }
     else{
-        shadow += getSample16X(new_ind, false);
+        shadow += getSample16X(new_ind, ind);
     }
     return shadow/6;
 }
 
+vec3 getClusterShading(vec3 v_cam){
+    //the point lights reaching the cluster of this fragment, lit like the shadowed ones but faded out at their radius
+    float depth = -(m_view*vec4(v_pos, 1.0)).z;
+    ivec3 cell = ivec3(ivec2(gl_FragCoord.xy/cluster_params.xy*vec2(cluster_count.xy)), int(log(max(depth, 1e-4))*cluster_params.z+cluster_params.w));
+    cell = clamp(cell, ivec3(0), cluster_count.xyz-1);
+    uvec2 range = texelFetch(cluster_grid, ivec2(cell.x+cell.y*cluster_count.x, cell.z), 0).xy;
+    vec3 shading = vec3(0.0);
+    for (uint i = range.x; i<range.x+range.y; i++){
+        int light = int(texelFetch(cluster_indices, ivec2(i%INDEX_WIDTH, i/INDEX_WIDTH), 0).r);
+        vec4 pos_radius = texelFetch(cluster_lights, ivec2(light, 0), 0);
+        vec4 color_intensity = texelFetch(cluster_lights, ivec2(light, 1), 0);
+        vec3 to_light = pos_radius.xyz-v_pos;
+        float d_light = length(to_light);
+        vec3 v_vector_light = to_light/max(d_light, 1e-4);
+        float angle = dot(v_vector_light, v_normals);
+        if (d_light<pos_radius.w && angle>0.002){
+            float fade = clamp(1.0-pow(d_light/pos_radius.w, 4.0), 0.0, 1.0);
+            float diffuse = color_intensity.w*angle/(rd_light_diffraction+d_light*4);
+            float specular = pow(max(dot(reflect(-v_vector_light, v_normals), v_cam), 0.0), 70);
+            shading += color_intensity.rgb/255*(diffuse*STRENGTH_DIFFUSE+specular)*fade*fade;
+        }
+    }
+    return shading;
+}
+
 void main(){
     //lighting
     vec3 TOTAL_SHADING_COLOR = vec3(0.0);
@@ -93,7 +143,7 @@ void main(){
         float d_light = sqrt(pow((light_pos[iteration].x-v_pos.x),2)+pow((light_pos[iteration].y-v_pos.y),2)+pow((light_pos[iteration].z-v_pos.z),2));
 
         //we calculate the diffuse strength (basic intensity based on dot product)
-        vec3 v_vector_light = normalize(light_pos[iteration]-v_pos);
+        vec3 v_vector_light = normalize(light_pos[iteration].xyz-v_pos);
         if (dot(v_vector_light,v_normals)>0.002){ //don't add negative lighting
             DIFFUSE_LIGHT += (1/(rd_light_diffraction+(d_light)*4)); //shading based on the distance and a small number
             DIFFUSE_LIGHT *= light_intensity[iteration]*dot(v_vector_light,v_normals); //multiplied by the light intensity and angle
@@ -110,6 +160,9 @@ void main(){
 
         iteration+=1;
     }
+    if (cluster_count.w>0){
+        TOTAL_SHADING_COLOR += getClusterShading(v_cam);
+    }
     vec3 shading = TOTAL_SHADING_COLOR + vec3(1,1,1)*AMBIANT_LIGHT;
     
 
@@ -5,55 +5,66 @@
 layout (location = 0) in vec2 in_texcoord;
 layout (location = 1) in vec3 in_position;
 layout (location = 2) in vec3 in_normales;
+#ifdef INSTANCED
+//per instance (model matrix and its precomputed normal matrix)
+layout (location = 3) in mat4 in_model;
+layout (location = 7) in mat3 in_normal_matrix;
+#endif
 
 //out
-out vec2 uv_0;
-out vec3 v_pos;
-out vec3 v_normals;
-out float rd_light_diffraction;
-out vec2 pixel_pos;
-out vec4 shadowCoord[MAX_SIZE];
+layout (location = 0) out vec2 uv_0;
+layout (location = 1) out vec3 v_pos;
+layout (location = 2) out vec3 v_normals;
+layout (location = 3) out float rd_light_diffraction;
+layout (location = 4) out vec2 pixel_pos;
+layout (location = 5) out vec4 shadowCoord[MAX_SIZE];
 
 //matrices
-uniform mat4 m_proj;
-uniform mat4 m_view;
+layout (std140) uniform Camera {
+    mat4 m_proj;
+    mat4 m_view;
+    vec3 cam_pos;
+};
 
-uniform mat4 m_view_l[MAX_SIZE];
-uniform int number_mat[4];
-uniform int number_lights;
-uniform mat4 m_proj_l[4];
+layout (std140) uniform Shadows {
+    mat4 m_shadow[MAX_SIZE]; //bias*proj*view of every light face
+    mat4 m_light_vp[MAX_SIZE]; //proj*view, for the depth passes
+    ivec4 number_mat;
+    int number_lights;
+};
+#ifndef INSTANCED
 uniform mat4 m_model;
-
-uniform mat4 m_bias = mat4(
-    0.5,0.0,0.0,0.0,
-    0.0,0.5,0.0,0.0,
-    0.0,0.0,0.5,0.0,
-    0.5,0.5,0.5,1.0
-);
+#endif
 
 float random(vec2 st){
     return fract(sin(dot(st.xy, vec2(12.9898,78.233))) * 43758.5453123);
 }
 
 void main(){
+#ifdef INSTANCED
+    mat4 m_model = in_model;
+    mat3 m_normal = in_normal_matrix;
+#else
+    mat3 m_normal = mat3(transpose(inverse(m_model)));
+#endif
     
     uv_0 = vec2(1.0-in_texcoord);
-    gl_Position = m_proj*m_view*m_model*vec4(in_position, 1.0);//vector4 for vertex pos
+    vec4 world_pos = m_model*vec4(in_position, 1.0);
+    gl_Position = m_proj*m_view*world_pos;//vector4 for vertex pos
     pixel_pos = vec2(gl_Position);
 
-    //depth textures
+    //depth textures (the light matrices are already combined on the cpu)
     int nb = 0;
     for (int y = 0; y<number_lights; y++){
         for (int i = 0; i<number_mat[y]; i++){
-            mat4 shadowMVP = m_proj_l[y]*m_view_l[i+y*6]*m_model;
-            shadowCoord[i+nb] = m_bias*shadowMVP*vec4(in_position,1.0);
+            shadowCoord[i+nb] = m_shadow[i+y*6]*world_pos;
             shadowCoord[i+nb].z-=0.0055;
         }
         nb+=number_mat[y];
     }
     
     //lighting
-    v_pos = vec3(m_model*vec4(in_position, 1.0)); 
-    v_normals = normalize(mat3(transpose(inverse(m_model)))*normalize(in_normales)); //vector4 for the normal of the vertices
+    v_pos = vec3(world_pos); 
+    v_normals = normalize(m_normal*normalize(in_normales)); //vector4 for the normal of the vertices
     rd_light_diffraction = random(vec2(in_texcoord.x*22+41, in_texcoord.y*43+63)); //pseudo-random number generator
 }
\ No newline at end of file
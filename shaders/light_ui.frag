@@ -7,14 +7,14 @@ layout (location = 4) in vec2 pixel_pos;
 
 out vec4 fragColor;
 
-uniform vec3 cam_pos;
-
 uniform sampler2D u_texture_0;
 
 //matrices
-uniform mat4 m_proj;
-uniform mat4 m_view;
-uniform mat4 m_model;
+layout (std140) uniform Camera {
+    mat4 m_proj;
+    mat4 m_view;
+    vec3 cam_pos;
+};
 
 void main(){
     vec3 v_cam = normalize(cam_pos-v_pos); //vector3 for the cam vector
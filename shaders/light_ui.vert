@@ -10,8 +10,11 @@ out vec3 v_pos;
 out vec2 pixel_pos;
 
 //matrices
-uniform mat4 m_proj;
-uniform mat4 m_view;
+layout (std140) uniform Camera {
+    mat4 m_proj;
+    mat4 m_view;
+    vec3 cam_pos;
+};
 uniform mat4 m_model;
 
 void main(){
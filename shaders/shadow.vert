@@ -1,14 +1,19 @@
 #version 410
 
 layout(location = 2) in vec3 in_position;
+#ifdef INSTANCED
+layout(location = 3) in mat4 in_model;
+#endif
 
-uniform mat4 m_proj;
-uniform mat4 m_view_l;
+#ifndef INSTANCED
 uniform mat4 m_model;
+#endif
 
-flat out vec3 fragPositionLightSpace;
+out vec3 v_world_pos; //projected by shadow.geom, once per face
 
 void main(){
-    fragPositionLightSpace = vec3(m_model * vec4(in_position,1.0));
-    gl_Position = m_proj * m_view_l * vec4(fragPositionLightSpace,1.0);
+#ifdef INSTANCED
+    mat4 m_model = in_model;
+#endif
+    v_world_pos = vec3(m_model * vec4(in_position,1.0));
 }
\ No newline at end of file
@@ -0,0 +1,14 @@
+#version 410
+
+in vec2 uv_0;
+in vec3 color;
+in vec3 bg_color;
+
+out vec4 fragColor;
+
+uniform sampler2D u_texture_0; //glyph atlas, coverage in red
+
+void main(){
+    float coverage = texture(u_texture_0, uv_0).r;
+    fragColor = vec4(mix(bg_color, color, coverage), 1.0);
+}
@@ -0,0 +1,19 @@
+#version 410
+
+//in, glyph quads already in clip space (TextRenderer)
+layout (location = 0) in vec2 in_position;
+layout (location = 1) in vec2 in_uv;
+layout (location = 2) in vec3 in_color;
+layout (location = 3) in vec3 in_bg_color;
+
+//out
+out vec2 uv_0;
+out vec3 color;
+out vec3 bg_color;
+
+void main(){
+    uv_0 = in_uv;
+    color = in_color;
+    bg_color = in_bg_color;
+    gl_Position = vec4(in_position, 0.0, 1.0);
+}
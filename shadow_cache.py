@@ -0,0 +1,60 @@
+import numpy as np
+
+from culling import get_frustum_planes, spheres_in_frustums
+
+class ShadowCache:
+    #keeps the shadow maps of the last frame and only marks the faces where something changed
+    def __init__(self, app):
+        self.app = app
+        self.casters = {} #obj -> (vao_name, vbo, transform version, bounding sphere) as it was last drawn in the shadow maps
+        self.spheres = [] #world spheres (x,y,z,r) that changed this frame, old and new places
+
+    def update_casters(self):
+        #compares every shadow caster to the last frame (world spheres come from the culling)
+        self.spheres = []
+        vbos = self.app.mesh.vao.vbo.vbos
+        spheres = self.app.scene_renderer.culling.spheres
+        versions = self.app.entities.version[self.app.entities.get_scene_slots()].tolist()
+        casters = {}
+        for i, obj in enumerate(self.app.scene):
+            if obj.vao_name == "light":
+                continue
+            vbo = vbos[obj.vao_name]
+            old = self.casters.get(obj)
+            if old != None and old[0] == obj.vao_name and old[1] is vbo and old[2] == versions[i]:
+                casters[obj] = old
+                continue
+            casters[obj] = (obj.vao_name, vbo, versions[i], tuple(spheres[i]))
+            self.spheres.append(casters[obj][3])
+            if old != None:
+                self.spheres.append(old[3])
+        #removed objects leave a hole where they were
+        for obj, old in self.casters.items():
+            if obj not in casters:
+                self.spheres.append(old[3])
+        self.casters = casters
+
+    def get_dirty_slots(self):
+        #for every light face slot, does one of the changed spheres touch its frustum
+        m_light_vp = self.app.scene_renderer.shadow_state.m_light_vp.reshape(-1,4,4)
+        spheres = np.array(self.spheres, dtype='f4').reshape(-1,4)
+        return spheres_in_frustums(get_frustum_planes(m_light_vp), spheres).any(axis=1)
+
+    def update(self):
+        #sets the dirty faces of every shadow map, after the shadow state wrote this frame's light matrices
+        self.update_casters()
+        dirty_slots = self.get_dirty_slots()
+        for shadowMap in self.app.scene_renderer.shadowMapList:
+            light = self.app.lights[shadowMap.indexe]
+            if shadowMap.light_version != light.version:
+                #the light moved (or the map is new), every face is redrawn
+                shadowMap.dirty_faces[:] = True
+                shadowMap.light_version = light.version
+            else:
+                shadowMap.dirty_faces |= dirty_slots[shadowMap.indexe*6:shadowMap.indexe*6+len(shadowMap.dirty_faces)]
+
+    def reset(self):
+        #forgets everything, the next frame redraws every shadow map
+        self.casters = {}
+        for shadowMap in self.app.scene_renderer.shadowMapList:
+            shadowMap.dirty_faces[:] = True
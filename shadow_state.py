@@ -0,0 +1,50 @@
+import numpy as np
+import glm
+
+from uniform_buffers import SHADOWS_BINDING
+
+#moves clip space [-1,1] into texture space [0,1]
+M_BIAS = glm.translate(glm.mat4(), glm.vec3(0.5))*glm.scale(glm.mat4(), glm.vec3(0.5))
+
+class ShadowState:
+    #light space matrices of every shadow map face, combined once per frame on the cpu and uploaded once
+    def __init__(self, app):
+        self.app = app
+        self.ctx = app.ctx
+        #std140 layout of the Shadows block (see default.vert)
+        self.data = np.zeros(24*16*2+8, dtype='f4')
+        self.m_shadow = self.data[0:384].reshape(24,16)
+        self.m_light_vp = self.data[384:768].reshape(24,16)
+        self.number_mat = self.data[768:772].view('i4')
+        self.number_lights = self.data[772:773].view('i4')
+        self.ubo = self.ctx.buffer(reserve=self.data.nbytes, dynamic=True)
+
+        #the depth textures always live on units 1 to 4, one per light
+        programs = self.app.mesh.vao.program.programs
+        for name in ['default', 'default_instanced']:
+            programs[name]['shadowMap'] = [i for i in range(1,5)]
+
+    def update(self):
+        self.data.fill(0)
+        depth_textures = self.app.mesh.texture.textures['depth_texture']
+        for i in range(len(self.app.scene_renderer.shadowMapList)):
+            light = self.app.lights[i]
+            depth_textures[i].use(location=1+i)
+            if light.type_of_light == 'point':
+                self.number_mat[i] = 6
+                m_views = light.m_view_l
+            else:
+                self.number_mat[i] = 1
+                m_views = [light.m_view_l for _ in range(6)]
+
+            for face in range(6):
+                m_light_vp = light.m_proj_l*m_views[face]
+                self.m_light_vp[i*6+face] = np.frombuffer(m_light_vp.to_bytes(), dtype='f4')
+                self.m_shadow[i*6+face] = np.frombuffer((M_BIAS*m_light_vp).to_bytes(), dtype='f4')
+        self.number_lights[0] = len(self.app.scene_renderer.shadowMapList)
+
+        self.ubo.write(self.data)
+        self.ubo.bind_to_uniform_block(SHADOWS_BINDING)
+
+    def destroy(self):
+        self.ubo.release()
@@ -0,0 +1,47 @@
+import time
+
+import numpy as np
+
+from bvh import MeshBVH
+
+def get_terrain(triangle_count):
+    #a bumpy grid of about triangle_count triangles over [-10,10] on x and z
+    side = int(np.sqrt(triangle_count/2))
+    x, z = np.meshgrid(np.linspace(-10, 10, side+1), np.linspace(-10, 10, side+1))
+    p = np.stack([x, np.sin(x*3)*np.cos(z*2)*0.3, z], axis=-1).astype('f4')
+    a, b, c, d = p[:-1,:-1], p[:-1,1:], p[1:,1:], p[1:,:-1]
+    return np.concatenate([np.stack([a,b,c], axis=-2).reshape(-1,3,3), np.stack([a,c,d], axis=-2).reshape(-1,3,3)])
+
+def get_layers(triangle_count, layer_count=10):
+    #terrains stacked 0.5 apart, a ray going down crosses the boxes of every layer but only the top one matters
+    layer = get_terrain(triangle_count//layer_count)
+    return np.concatenate([layer-np.array([0, i*0.5, 0], dtype='f4') for i in range(layer_count)])
+
+def get_rays(count):
+    rng = np.random.default_rng(0)
+    origins = np.column_stack([rng.uniform(-9, 9, count), np.full(count, 5.0), rng.uniform(-9, 9, count)]).astype('f4')
+    dirs = np.column_stack([rng.uniform(-0.3, 0.3, count), np.full(count, -1.0), rng.uniform(-0.3, 0.3, count)]).astype('f4')
+    return origins, dirs
+
+def test_single_ray_matches_the_batch():
+    mesh_bvh = MeshBVH(get_layers(20000))
+    origins, dirs = get_rays(100)
+    origins[0,1] = -5 #pointing away, no hit
+    triangles, t = mesh_bvh.intersect(origins, dirs)
+    for i in range(len(origins)):
+        triangle, single_t = mesh_bvh.intersect(origins[i], dirs[i])
+        assert triangle[0] == triangles[i]
+        assert single_t[0] == t[i] or np.isclose(single_t[0], t[i])
+    assert triangles[0] == -1 and (triangles[1:] >= 0).all()
+
+def test_pick_on_millions_of_triangles():
+    #one pick ray on a 2 million triangle mesh stays under a millisecond (median, the tree is built once)
+    mesh_bvh = MeshBVH(get_layers(2000000))
+    origins, dirs = get_rays(100)
+    times = []
+    for origin, direction in zip(origins, dirs):
+        start = time.perf_counter()
+        triangle, _ = mesh_bvh.intersect(origin, direction)
+        times.append(time.perf_counter()-start)
+        assert triangle[0] >= 0
+    assert np.median(times) < 1e-3
@@ -0,0 +1,38 @@
+import json
+
+import numpy as np
+
+from mesh_bake import bake, read_mesh
+
+def write_grid_obj(path, size=24):
+    #a flat grid of size x size quads, the left half in one material and the right half in another
+    lines = ["mtllib grid.mtl"]
+    for z in range(size+1):
+        for x in range(size+1):
+            lines.append(f"v {x} 0 {z}")
+            lines.append(f"vt {x/size} {z/size}")
+    lines.append("vn 0 1 0")
+    for material, columns in [('left', range(size//2)), ('right', range(size//2, size))]:
+        lines.append(f"usemtl {material}")
+        for z in range(size):
+            for x in columns:
+                a, b, c, d = z*(size+1)+x+1, z*(size+1)+x+2, (z+1)*(size+1)+x+2, (z+1)*(size+1)+x+1
+                lines.append(f"f {a}/{a}/1 {c}/{c}/1 {b}/{b}/1")
+                lines.append(f"f {a}/{a}/1 {d}/{d}/1 {c}/{c}/1")
+    path.write_text("\n".join(lines)+"\n")
+    (path.parent/"grid.mtl").write_text("newmtl left\nKd 1 0 0\nnewmtl right\nKd 0 0 1\n")
+
+def test_bake_multi_material(tmp_path):
+    link = tmp_path/"grid.obj"
+    write_grid_obj(link)
+    path, baked = bake(str(link))
+    assert baked
+    header, vertices, indices = read_mesh(path)
+    assert [draw['material'] for draw in header['ranges']] == ['left', 'right']
+    assert len(header['lods']) > 1 #the full list and at least one coarser level
+    for lod in header['lods'][1:]:
+        assert all(isinstance(draw['first'], int) for draw in lod['ranges'])
+        assert sum(draw['count'] for draw in lod['ranges']) == lod['count']
+    json.dumps(header) #the header goes back to json as is
+    assert len(indices) == header['index_count']
+    assert np.asarray(indices).max() < len(vertices)
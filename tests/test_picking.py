@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from bvh import MeshBVH
+from picking import PICK_MARGIN, ScenePicker
+
+def get_cube_triangles():
+    #the 12 triangles of the [-1,1] cube
+    corners = np.array([(x, y, z) for x in (-1,1) for y in (-1,1) for z in (-1,1)], dtype='f4')
+    faces = [(0,1,3,2), (4,6,7,5), (0,4,5,1), (2,3,7,6), (0,2,6,4), (1,5,7,3)]
+    return np.array([corners[[a,b,c]] for a, b, c, d in faces]+[corners[[a,c,d]] for a, b, c, d in faces])
+
+def get_app(scales, gizmos=0):
+    #a row of unit cubes along x, one per scale (the last ones are light gizmos), only what the picker reads from the engine
+    objs = [SimpleNamespace(slot=i, vao_name='cube') for i in range(len(scales))]
+    m_models = np.zeros((len(scales),4,4), dtype='f4')
+    for i, scale in enumerate(scales):
+        m_models[i] = np.diag(list(scale)+[1])
+        m_models[i,3,:3] = (i*3, 0, 0)
+    mesh_bvh = MeshBVH(get_cube_triangles())
+    vbos = {'cube': SimpleNamespace(get_mesh_bvh=lambda: mesh_bvh)}
+    return SimpleNamespace(scene=objs[:len(objs)-gizmos], lights=[SimpleNamespace(light_ui=obj) for obj in objs[len(objs)-gizmos:]],
+                           entities=SimpleNamespace(get_models=lambda slots: m_models[slots]),
+                           mesh=SimpleNamespace(vao=SimpleNamespace(bounds={'cube': [[-1,-1,-1], [1,1,1]]}, vbo=SimpleNamespace(vbos=vbos))))
+
+def test_flat_object_keeps_the_tree_finite():
+    scales = [(1,1,1)]*20
+    scales[5] = (1,0,1)
+    picker = ScenePicker(get_app(scales))
+    picker.update()
+    bvh = picker.bvh
+    assert not np.isnan(bvh.node_min).any() and not np.isnan(bvh.node_max).any()
+    assert np.isfinite(bvh.node_min[1]).all() and np.isfinite(bvh.node_max[1]).all() #the root
+    #rays straight down on every cube, the flat one is never hit, the others are
+    origins = np.array([(i*3, 10, 0) for i in range(20)], dtype='f4')
+    dirs = np.tile(np.array([0, -1, 0], dtype='f4'), (20, 1))
+    index, t = picker.intersect(origins, dirs)
+    expected = np.arange(20)
+    expected[5] = -1
+    assert (index == expected).all()
+    assert np.allclose(t[index >= 0], 9-0.05, atol=1e-4)
+
+def test_object_flattened_after_the_build():
+    app = get_app([(1,1,1)]*20)
+    picker = ScenePicker(app)
+    picker.update()
+    m_models = app.entities.get_models(np.arange(20))
+    m_models[7,1,1] = 0 #same tree, refitted
+    app.entities.get_models = lambda slots: m_models[slots]
+    index, _ = picker.intersect(np.array([(21, 10, 0), (0, 10, 0)], dtype='f4'), np.array([(0, -1, 0)]*2, dtype='f4'))
+    assert index.tolist() == [-1, 0]
+    assert not np.isnan(picker.bvh.node_min).any()
+
+def test_gizmo_is_picked_within_the_margin():
+    #a mesh cube and a small gizmo cube, a ray passing just outside both
+    picker = ScenePicker(get_app([(1,1,1), (0.1,0.1,0.1)], gizmos=1))
+    offset = PICK_MARGIN/2
+    obj, dist = picker.pick((1+offset, 10, 0), (0, -1, 0))
+    assert obj is None #the mesh needs a triangle hit
+    obj, dist = picker.pick((3.1+offset, 10, 0), (0, -1, 0))
+    assert obj is picker.app.lights[0].light_ui
+    assert np.isclose(dist, 10-0.1-PICK_MARGIN, atol=1e-4)
+    #the mesh itself is still exact
+    obj, dist = picker.pick((0.5, 10, 0), (0, -1, 0))
+    assert obj is picker.app.scene[0] and np.isclose(dist, 9, atol=1e-4)
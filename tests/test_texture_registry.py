@@ -0,0 +1,50 @@
+import pytest
+import pygame as pg
+import moderngl as mgl
+
+from texture_registry import TextureRegistry, get_texture_bytes
+
+@pytest.fixture
+def ctx():
+    try:
+        ctx = mgl.create_context(standalone=True, backend='egl')
+    except Exception as error:
+        pytest.skip(f"no standalone gl context: {error}")
+    yield ctx
+    ctx.release()
+
+def get_loader(color):
+    def loader():
+        surface = pg.Surface((256, 256))
+        surface.fill(color)
+        return surface
+    return loader
+
+def test_frame_over_budget_does_not_thrash(ctx):
+    #three textures bound every frame, room for two and a bit: they settle, they are not shrunk and restored every frame
+    full = get_texture_bytes((256, 256), 3, True)
+    registry = TextureRegistry(ctx, budget=int(full*2.5))
+    handles = [registry.load(('test', i), get_loader((i*80, 0, 0)), mipmaps=True) for i in range(3)]
+    counts = []
+    for frame in range(12):
+        registry.next_frame()
+        for handle in handles:
+            handle.use()
+        counts.append((registry.reloads, registry.drops, registry.evictions))
+    assert counts[-1] == counts[4] #nothing moves once settled
+    assert registry.resident_bytes <= registry.budget
+    registry.destroy()
+
+def test_shrunk_texture_comes_back_when_it_fits(ctx):
+    full = get_texture_bytes((256, 256), 3, True)
+    registry = TextureRegistry(ctx, budget=int(full*1.5))
+    first, second = [registry.load(('test', i), get_loader((0, i*80, 0)), mipmaps=True) for i in range(2)]
+    registry.next_frame()
+    registry.next_frame()
+    second.use() #first is not bound for two frames, it is shrunk to make room
+    assert first.dropped > 0
+    second.release()
+    registry.next_frame()
+    first.use()
+    assert first.dropped == 0 and first.texture != None
+    registry.destroy()
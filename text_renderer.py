@@ -0,0 +1,125 @@
+import numpy as np
+import pygame as pg
+import moderngl as mgl
+
+FIRST_CHAR = 32 #printable ascii, anything else is drawn as '?'
+LAST_CHAR = 126
+ATLAS_WIDTH = 2048
+GLYPH_PADDING = 2 #empty pixels around every glyph so the linear filter never reads the next one
+TEXT_FLOATS = 10 #position 2, uv 2, color 3, background color 3
+TEXT_FORMAT = '2f 2f 3f 3f'
+
+class GlyphAtlas:
+    #every printable character of the font rendered once in a single texture
+    def __init__(self, ctx, font):
+        chars = [chr(code) for code in range(FIRST_CHAR, LAST_CHAR+1)]
+        surfaces = [font.render(char, True, (255,255,255), (0,0,0)) for char in chars]
+        self.line_height = max(surface.get_height() for surface in surfaces)
+
+        #rows of glyphs, left to right
+        places = []
+        x, y = 0, 0
+        for surface in surfaces:
+            width = surface.get_width()+2*GLYPH_PADDING
+            if x+width > ATLAS_WIDTH:
+                x, y = 0, y+self.line_height+2*GLYPH_PADDING
+            places.append((x+GLYPH_PADDING, y+GLYPH_PADDING))
+            x += width
+        height = y+self.line_height+2*GLYPH_PADDING
+        atlas = pg.Surface((ATLAS_WIDTH, height))
+        atlas.fill((0,0,0))
+        for surface, place in zip(surfaces, places):
+            atlas.blit(surface, place)
+
+        #coverage only, in the red channel, first row at v = 0
+        data = pg.image.tostring(atlas, 'RGB')[::3]
+        self.texture = ctx.texture(size=(ATLAS_WIDTH, height), components=1, data=data)
+        self.texture.filter = (mgl.LINEAR, mgl.LINEAR)
+        self.texture.repeat_x = False
+        self.texture.repeat_y = False
+
+        #per character code: advance in pixels and uv rectangle (u0, v0, u1, v1) of its cell
+        self.advances = np.zeros(LAST_CHAR+1, dtype='f4')
+        self.uvs = np.zeros((LAST_CHAR+1, 4), dtype='f4')
+        for char, surface, (px, py) in zip(chars, surfaces, places):
+            code = ord(char)
+            self.advances[code] = surface.get_width()
+            self.uvs[code] = (px/ATLAS_WIDTH, py/height, (px+surface.get_width())/ATLAS_WIDTH, (py+self.line_height)/height)
+
+    def get_codes(self, text):
+        codes = np.frombuffer(text.encode('ascii', 'replace'), dtype=np.uint8).astype(np.int64)
+        return np.where((codes >= FIRST_CHAR) & (codes <= LAST_CHAR), codes, ord('?'))
+
+    def destroy(self):
+        self.texture.release()
+
+class TextRenderer:
+    #every label of the frame as glyph quads in one dynamic buffer, drawn in a single call
+    #the buffer is only written again when a label or the set of labels changes
+    def __init__(self, app):
+        self.app = app
+        self.ctx = app.ctx
+        self.atlas = GlyphAtlas(self.ctx, app.font)
+        self.program = app.mesh.vao.program.programs['text']
+        self.program['u_texture_0'] = 0
+        self.capacity = 1024 #glyphs
+        self.vbo = self.ctx.buffer(reserve=self.capacity*6*TEXT_FLOATS*4, dynamic=True)
+        self.vao = self.get_vao()
+        self.labels = [] #labels added this frame
+        self.written = None #labels in the buffer right now
+        self.count = 0 #vertices in the buffer
+
+    def get_vao(self):
+        return self.ctx.vertex_array(self.program, [(self.vbo, TEXT_FORMAT, 'in_position', 'in_uv', 'in_color', 'in_bg_color')], skip_errors = True)
+
+    def add(self, text, pos, scale, color, bg_color):
+        #a label fills the quad of the old letters: (vec3(-1..1, -1..1, 0)+pos)*scale, the text is stretched to it
+        self.labels.append((text, tuple(pos)[:2], tuple(scale)[:2], tuple(color), tuple(bg_color)))
+
+    def get_label_vertices(self, label):
+        text, pos, scale, color, bg_color = label
+        codes = self.atlas.get_codes(text)
+        if len(codes) == 0:
+            return np.zeros((0, TEXT_FLOATS), dtype='f4')
+        advances = self.atlas.advances[codes]
+        edges = np.concatenate([[0], np.cumsum(advances)])/max(advances.sum(), 1)*2-1 #glyph borders in -1..1
+        x0 = (edges[:-1]+pos[0])*scale[0]
+        x1 = (edges[1:]+pos[0])*scale[0]
+        y0 = np.full(len(codes), (-1+pos[1])*scale[1])
+        y1 = np.full(len(codes), (1+pos[1])*scale[1])
+        u0, v0, u1, v1 = self.atlas.uvs[codes].T
+        #two triangles per glyph, the top of the glyph (v0) at the top of the quad (y1)
+        corners = [(x0, y1, u0, v0), (x0, y0, u0, v1), (x1, y0, u1, v1),
+                   (x0, y1, u0, v0), (x1, y0, u1, v1), (x1, y1, u1, v0)]
+        vertices = np.zeros((len(codes), 6, TEXT_FLOATS), dtype='f4')
+        for i, corner in enumerate(corners):
+            vertices[:, i, :4] = np.stack(corner, axis=1)
+        vertices[:, :, 4:7] = color
+        vertices[:, :, 7:10] = bg_color
+        return vertices.reshape(-1, TEXT_FLOATS)
+
+    def write(self):
+        vertices = [self.get_label_vertices(label) for label in self.labels]
+        vertices = np.concatenate(vertices) if len(vertices) > 0 else np.zeros((0, TEXT_FLOATS), dtype='f4')
+        if len(vertices) > self.capacity*6:
+            while self.capacity*6 < len(vertices):
+                self.capacity *= 2
+            self.vbo.orphan(self.capacity*6*TEXT_FLOATS*4)
+        if len(vertices) > 0:
+            self.vbo.write(vertices)
+        self.count = len(vertices)
+        self.written = self.labels
+
+    def render(self):
+        #draws and forgets the labels of this frame
+        if self.labels != self.written:
+            self.write()
+        self.labels = []
+        if self.count > 0:
+            self.atlas.texture.use(location = 0)
+            self.vao.render(vertices=self.count)
+
+    def destroy(self):
+        self.vao.release()
+        self.vbo.release()
+        self.atlas.destroy()
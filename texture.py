@@ -1,14 +1,20 @@
 import pygame as pg
-import moderngl as mgl
+
+from texture_registry import TextureRegistry, TEXTURE_BUDGET
 
 class Texture:
-    def __init__(self, app):
+    def __init__(self, app, budget=TEXTURE_BUDGET):
         self.app = app
         self.ctx = app.ctx
-        self.textures = {}
+        self.registry = TextureRegistry(self.ctx, budget) #image and letter textures, shared, under a memory budget
+        self.textures = {} #name -> TextureHandle (same use() as a texture), the depth textures are plain textures
+        #white is loaded right away, it stands for the other textures while they stream in
+        self.textures[2] = self.registry.load_path('img/white.png', background=False)
+        self.textures[2].pinned = True
+        self.registry.placeholder = self.textures[2]
+        self.registry.loader = getattr(app, 'loader', None)
         self.textures[0] = self.get_texture(path='img/brick.jpg')
         self.textures[1] = self.get_texture(path='img/glass.jpg')
-        self.textures[2] = self.get_texture(path='img/white.png')
         self.textures[3] = self.get_texture(path='img/icon.png')
         self.textures[4] = self.get_texture(path='img/dest.png')
         self.textures['depth_texture']=[]
@@ -20,43 +26,37 @@ class Texture:
         return depth_texture
     
     def get_cube_depth_tex(self):
-        cube_texture = []
-        for _ in range(6):
-            #cube mapping => shadows
-            cube_texture.append(self.ctx.depth_texture((1024,1024)))
-            cube_texture[-1].repeat_x = False
-            cube_texture[-1].repeat_y = False
+        #cube mapping => shadows, the 6 faces of 1024x1024 are tiles of one 3x2 atlas
+        cube_texture = self.ctx.depth_texture((3*1024,2*1024))
+        cube_texture.repeat_x = False
+        cube_texture.repeat_y = False
         return cube_texture
 
-    def load_texture_obj(self, name, link):
-        self.textures[name] = self.get_texture(path=link)
+    def load_texture_obj(self, name, link, lazy=False):
+        self.textures[name] = self.get_texture(path=link, lazy=lazy)
     def load_texture_letter(self, text, col, bg_col):
         self.textures[text] = self.get_texture_letter(text, col, bg_col)
 
-    def get_texture(self,path):
-        texture = pg.image.load(path).convert()
-        texture = pg.transform.flip(texture, flip_x = True, flip_y = False)
-        texture = self.ctx.texture(size = texture.get_size(), components=3,
-                                   data = pg.image.tostring(texture, 'RGB'))
-        #mipmap the best!
-        texture.filter = (mgl.LINEAR_MIPMAP_LINEAR,mgl.LINEAR)
-        texture.build_mipmaps()
-        
-        #anisotropy
-        texture.anisotropy = 32.0
-        return texture
+    def get_texture(self,path, lazy=False):
+        #loaded, mipmapped and flipped by the registry, a path already loaded is not uploaded again
+        return self.registry.load_path(path, lazy=lazy)
     
     def get_texture_letter(self, text, color, bg_color):
-        s_texture = self.drawText(text, color, bg_color)
-        s_texture = pg.transform.flip(s_texture, flip_x = True, flip_y = False)
-        texture  = self.ctx.texture(size=s_texture.get_size(), components=3, data=pg.image.tostring(s_texture, 'RGB'))
-        return texture
+        def loader():
+            s_texture = self.drawText(text, color, bg_color)
+            return pg.transform.flip(s_texture, flip_x = True, flip_y = False)
+        return self.registry.load(('letter', text, tuple(color), tuple(bg_color)), loader)
     
     def drawText(self, text, color, bg_color):
         textSurface = self.app.font.render(text, True, (color[0]*255,color[1]*255,color[2]*255, 255), (bg_color[0]*255, bg_color[1]*255, bg_color[2]*255, 0))
         return textSurface
     
+    def get_stats(self):
+        #residency of the registry textures: counts, bytes, loads, drops and evictions
+        return self.registry.get_stats()
+
     def destroy(self):
+        self.registry.destroy()
         for tex in self.textures.values():
             if type(tex) == list:
                 for i in range(len(tex)):
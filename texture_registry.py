@@ -0,0 +1,201 @@
+import os
+import pygame as pg
+import moderngl as mgl
+
+from mesh_registry import get_file_hash
+
+TEXTURE_BUDGET = 256*1024*1024 #bytes of texture memory (mip levels included) before the least recently bound ones go
+MAX_DROPPED_MIPS = 2 #a texture is shrunk at most this many times before being evicted
+MIN_DROP_SIZE = 64 #below this size (in pixels) a texture is evicted instead of shrunk
+
+def get_texture_bytes(size, components, mipmaps):
+    #every level down to 1x1 when the texture is mipmapped
+    width, height = size
+    total = width*height*components
+    while mipmaps and (width > 1 or height > 1):
+        width, height = max(1, width//2), max(1, height//2)
+        total += width*height*components
+    return total
+
+class TextureHandle:
+    #what the models keep and bind, the gpu texture behind it can be shrunk, evicted and loaded again
+    def __init__(self, registry, key, loader, mipmaps):
+        self.registry = registry
+        self.key = key
+        self.loader = loader #returns the pygame surface of the texture, full size
+        self.mipmaps = mipmaps
+        self.texture = None
+        self.dropped = 0 #top mip levels dropped to stay under the budget
+        self.bytes = 0
+        self.size = (0,0)
+        self.last_bound = -1 #frame of the last use, -1 if never bound
+        self.pending = False #being decoded or uploaded by the asset loader
+        self.pinned = False #never shrunk nor evicted (the placeholder)
+
+    def decode(self, dropped=0):
+        #(size, rgb bytes) of the image, cpu only so it can run on a worker thread
+        surface = self.loader()
+        self.size = surface.get_size()
+        if dropped > 0:
+            size = (max(1, self.size[0]>>dropped), max(1, self.size[1]>>dropped))
+            surface = pg.transform.smoothscale(surface, size)
+        return surface.get_size(), pg.image.tostring(surface, 'RGB')
+
+    def create(self, dropped=0):
+        size, data = self.decode(dropped)
+        self.set_texture(self.registry.ctx.texture(size=size, components=3, data=data), size, dropped)
+
+    def set_texture(self, texture, size, dropped):
+        self.release()
+        if self.mipmaps:
+            #mipmap the best!
+            texture.filter = (mgl.LINEAR_MIPMAP_LINEAR,mgl.LINEAR)
+            texture.build_mipmaps()
+            #anisotropy
+            texture.anisotropy = 32.0
+        self.texture = texture
+        self.dropped = dropped
+        self.bytes = get_texture_bytes(size, 3, self.mipmaps)
+        self.registry.resident_bytes += self.bytes
+
+    def get_full_bytes(self):
+        return get_texture_bytes(self.size, 3, self.mipmaps)
+
+    def use(self, location=0):
+        #an evicted texture comes back, a shrunk one only once its full size fits the budget
+        if not self.pending and (self.texture == None or (self.dropped > 0 and self.registry.has_room(self.get_full_bytes()-self.bytes))):
+            self.registry.restore(self)
+        self.last_bound = self.registry.frame
+        if self.texture == None:
+            #still streaming in, a shrunk texture is kept on screen meanwhile, else the placeholder
+            self.registry.placeholder.texture.use(location=location)
+        else:
+            self.texture.use(location=location)
+
+    def release(self):
+        if self.texture != None:
+            self.texture.release()
+            self.texture = None
+            self.registry.resident_bytes -= self.bytes
+            self.bytes = 0
+
+class TextureRegistry:
+    #image textures deduplicated by path and content, generated ones by their own key
+    #kept under a memory budget: the textures not bound last frame are shrunk then evicted, least recently bound first
+    #(the ones of this frame and the last are left alone, else a frame over the budget shrinks and restores the same ones every frame)
+    def __init__(self, ctx, budget=TEXTURE_BUDGET):
+        self.ctx = ctx
+        self.budget = budget
+        self.handles = {} #key -> TextureHandle
+        self.hashes = {} #absolute path -> (mtime, size, hash)
+        self.frame = 0
+        self.resident_bytes = 0
+        self.peak_bytes = 0
+        self.loads = 0
+        self.reloads = 0
+        self.drops = 0
+        self.evictions = 0
+        self.loader = None #AssetLoader, when set the image files are decoded and uploaded in the background
+        self.placeholder = None #handle shown while a texture is loading
+
+    def next_frame(self):
+        self.frame += 1
+        self.trim() #what could not go during the last frames (all still bound) can go now
+
+    def has_room(self, extra):
+        return self.resident_bytes+extra <= self.budget
+
+    def get_key(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        cached = self.hashes.get(path)
+        if cached == None or cached[:2] != (stat.st_mtime, stat.st_size):
+            cached = (stat.st_mtime, stat.st_size, get_file_hash(path))
+            self.hashes[path] = cached
+        return ('file', cached[2]) #same content under two paths is one texture
+
+    def load_path(self, path, background=True, lazy=False):
+        #an image file, flipped like every texture of the engine, shared with any earlier load of the same content
+        def loader():
+            surface = pg.image.load(path)
+            return pg.transform.flip(surface, flip_x = True, flip_y = False)
+        return self.load(self.get_key(path), loader, mipmaps=True, background=background, lazy=lazy)
+
+    def load(self, key, loader, mipmaps=False, background=False, lazy=False):
+        #lazy: nothing is decoded until the handle is first bound (see TextureHandle.use)
+        handle = self.handles.get(key)
+        if handle == None:
+            handle = TextureHandle(self, key, loader, mipmaps)
+            self.handles[key] = handle
+            if lazy:
+                return handle
+            self.loads += 1
+            if background and self.loader != None and self.placeholder != None:
+                self.loader.load_texture(handle)
+                return handle
+            handle.create()
+            self.trim(handle)
+        return handle
+
+    def restore(self, handle):
+        #full size again on demand, room is made among the textures not bound last frame
+        self.reloads += 1
+        if self.loader != None and self.placeholder != None:
+            self.loader.load_texture(handle)
+            return
+        handle.create()
+        self.trim(handle)
+
+    def trim(self, keep=None):
+        self.peak_bytes = max(self.peak_bytes, self.resident_bytes)
+        if self.resident_bytes <= self.budget:
+            return
+        candidates = sorted([handle for handle in self.handles.values()
+                             if handle.texture != None and handle is not keep and handle.last_bound < self.frame-1
+                             and not handle.pending and not handle.pinned],
+                            key=lambda handle: handle.last_bound)
+        #first their top mip level, then the whole texture
+        #a shrink done by the asset loader only lands later, so the loop counts on what it will free
+        expected = self.resident_bytes
+        for handle in candidates:
+            if expected <= self.budget:
+                return
+            if handle.mipmaps and handle.dropped < MAX_DROPPED_MIPS and min(handle.size)>>handle.dropped > MIN_DROP_SIZE:
+                size = (max(1, handle.size[0]>>(handle.dropped+1)), max(1, handle.size[1]>>(handle.dropped+1)))
+                expected -= handle.bytes-get_texture_bytes(size, 3, True)
+                self.shrink(handle)
+        for handle in candidates:
+            if expected <= self.budget:
+                return
+            if handle.pending:
+                continue #being shrunk
+            expected -= handle.bytes
+            handle.release()
+            self.evictions += 1
+
+    def shrink(self, handle):
+        self.drops += 1
+        if self.loader != None and self.placeholder != None:
+            self.loader.load_texture(handle, handle.dropped+1)
+        else:
+            handle.create(handle.dropped+1)
+
+    def get_stats(self):
+        resident = [handle for handle in self.handles.values() if handle.texture != None]
+        return {'textures': len(self.handles),
+                'resident': len(resident),
+                'shrunk': sum(handle.dropped > 0 for handle in resident),
+                'evicted': len(self.handles)-len(resident)-sum(handle.pending for handle in self.handles.values() if handle.texture == None),
+                'pending': sum(handle.pending for handle in self.handles.values()),
+                'resident_bytes': self.resident_bytes,
+                'peak_bytes': self.peak_bytes,
+                'budget': self.budget,
+                'loads': self.loads,
+                'reloads': self.reloads,
+                'drops': self.drops,
+                'evictions': self.evictions}
+
+    def destroy(self):
+        for handle in self.handles.values():
+            handle.release()
+        self.handles.clear()
@@ -0,0 +1,53 @@
+import numpy as np
+
+CAMERA_BINDING = 0
+LIGHTS_BINDING = 1
+SHADOWS_BINDING = 2 #filled by the shadow state (shadow_state.py)
+MAX_LIGHTS = 4
+
+class FrameUniforms:
+    #camera and light state, filled once per frame and shared by every program through uniform blocks
+    def __init__(self, app):
+        self.app = app
+        self.ctx = app.ctx
+        #std140 layouts, see the Camera and Lights blocks in the shaders
+        self.camera_ubo = self.ctx.buffer(reserve=144, dynamic=True)
+        self.lights_data = np.zeros(44, dtype='f4')
+        self.light_pos = self.lights_data[0:16].reshape(4,4)
+        self.light_color = self.lights_data[16:32].reshape(4,4)
+        self.light_intensity = self.lights_data[32:36]
+        self.cluster_count = self.lights_data[36:40].view('i4') #shadowless point lights (clustered_lights.py)
+        self.cluster_params = self.lights_data[40:44]
+        self.lights_ubo = self.ctx.buffer(reserve=self.lights_data.nbytes, dynamic=True)
+
+        programs = self.app.mesh.vao.program.programs
+        for name in ['default', 'default_instanced', 'light', 'shadow_map', 'shadow_map_instanced']:
+            self.bind_blocks(programs[name])
+
+    def bind_blocks(self, program):
+        #blocks a shader doesn't use are optimised away, so they might be missing
+        if program.get('Camera', None) != None:
+            program['Camera'].binding = CAMERA_BINDING
+        if program.get('Lights', None) != None:
+            program['Lights'].binding = LIGHTS_BINDING
+        if program.get('Shadows', None) != None:
+            program['Shadows'].binding = SHADOWS_BINDING
+
+    def update(self):
+        camera = self.app.camera
+        self.camera_ubo.write(camera.m_proj.to_bytes()+camera.m_view.to_bytes()+camera.position.to_bytes())
+
+        self.lights_data.fill(0)
+        for i, light in enumerate(self.app.lights[:MAX_LIGHTS]):
+            self.light_pos[i,:3] = tuple(light.position)
+            self.light_color[i,:3] = tuple(light.color)
+            self.light_intensity[i] = float(light.intensity)
+        self.cluster_count[:], self.cluster_params[:] = self.app.point_lights.get_block()
+        self.lights_ubo.write(self.lights_data)
+
+        self.camera_ubo.bind_to_uniform_block(CAMERA_BINDING)
+        self.lights_ubo.bind_to_uniform_block(LIGHTS_BINDING)
+
+    def destroy(self):
+        self.camera_ubo.release()
+        self.lights_ubo.release()
@@ -1,15 +1,19 @@
 from vbo import VBO
+from mesh_registry import MeshRegistry
 from shader_program import Shader_Program
+import numpy as np
 import glm
 
 #uses both shader_program and vbo to turn them into a vao
 class VAO:
     def __init__(self, ctx):
         self.ctx = ctx
-        self.scales = [] #every new object will have it's scale here
+        self.scales = {} #every mesh has it's scale here (biggest coordinate on each axis, at least 1)
+        self.bounds = {} #and it's box, [min corner, max corner]
         self.vbo = VBO(self.ctx, self)
         self.program = Shader_Program(self.ctx)
         self.vaos={}
+        self.registry = MeshRegistry(self) #imported meshes, shared and reference counted
 
         #all vao set up 
         self.vaos['cube'] = self.get_vao(
@@ -37,22 +41,43 @@ class VAO:
         self.vaos['light'] = self.get_vao(
             program = self.program.programs['light'],
             vbo = self.vbo.vbos['light'])
+
+        for name in ['cube', 'pyramid', 'light']:
+            self.add_bounds(name)
         
-    def load_vao(self, name, link):
-        #object vao
-        self.vbo.load_object(name, link) #we have created an instance of model
-        self.vaos[name] = self.get_vao(
-            program = self.program.programs['default'],
-            vbo = self.vbo.vbos[name])
-        self.vaos['shadow_'+name] = self.get_vao(
-            program = self.program.programs['shadow_map'],
-            vbo = self.vbo.vbos[name])
+    def load_vao(self, name, link, lazy=False):
+        #object vao, the same file under any name is only loaded once (see MeshRegistry)
+        #lazy: only once a model uses it (streamed worlds)
+        if link == None:
+            link = name #second case senario
+        if lazy:
+            self.registry.declare(name, link)
+        else:
+            self.registry.register(name, link)
+
+    def add_bounds(self, name):
+        #per mesh, a reloaded mesh replaces its own entry only
+        self.bounds[name] = self.vbo.vbos[name].get_bounds()
+        self.scales[name] = glm.vec3(*np.maximum(np.max(np.abs(self.bounds[name]), axis=0), 1.0)) #small meshes are not scaled up
     
     
     def get_vao(self, program, vbo):
-        vao = self.ctx.vertex_array(program, [(vbo.vbo, vbo.format, *vbo.attrib)], skip_errors = True)
+        vao = self.ctx.vertex_array(program, [(vbo.vbo, vbo.format, *vbo.attrib)],
+                                    index_buffer = vbo.ibo, index_element_size = vbo.index_size, skip_errors = True)
         return vao
+
+    def get_instanced_vao(self, program, vbo, instance_buffer):
+        #same mesh, plus one model matrix and one normal matrix per instance
+        vao = self.ctx.vertex_array(program, [(vbo.vbo, vbo.format, *vbo.attrib),
+                                              (instance_buffer, '16f 9f/i', 'in_model', 'in_normal_matrix')],
+                                    index_buffer = vbo.ibo, index_element_size = vbo.index_size, skip_errors = True)
+        return vao
+
+    def get_mesh_stats(self):
+        #per mesh: vertices before and after welding, indices and the bytes the index buffer saves
+        return {name: vbo.get_index_stats() for name, vbo in self.vbo.vbos.items()}
     
     def destroy(self):
+        self.registry.destroy()
         self.vbo.destroy()
         self.program.destroy()
\ No newline at end of file
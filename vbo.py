@@ -1,7 +1,9 @@
 import numpy as np
 import moderngl as mgl
 import glm
-from pywavefront import Wavefront
+from bvh import MeshBVH
+from mesh_bake import get_baked_path, is_fresh, bake, index_obj, get_header, read_mesh
+from mesh_index import index_vertices, get_index_stats
 
 class VBO:
     def __init__(self, ctx, vao):
@@ -15,18 +17,25 @@ class VBO:
         self.vbos['letters'] = LetterVBO(ctx)
         self.vbos['light'] = LightVBO(ctx)
 
-    def load_object(self, name, link=None):
-        if link == None:
-            link=name #second case senario
-        self.vbos[name] = ObjectVBO(self.ctx, f"{link}", self.vao)
+    def get_object(self, link, buffer=None, header=None, vertices=None, index_buffer=None, indices=None):
+        #imported meshes are owned by the mesh registry of the vao, which puts them in self.vbos
+        #the asset loader gives the buffers it already filled, with the header, vertices and indices they came from
+        return ObjectVBO(self.ctx, f"{link}", self.vao, buffer, header, vertices, index_buffer, indices)
 
     def destroy(self):
         [vbo.destroy() for vbo in self.vbos.values()]
 
 class BaseVBO:
+    indexed = False #welded into an index buffer when created (see mesh_index.py)
+    index_data = None #indices of the triangles, None for a flat triangle list
+    source_count = None #vertices before welding
+    lods = None #levels of detail, [{'first', 'count'}] in the index buffer, full mesh first (see mesh_lod.py)
+
     def __init__(self, ctx):
         self.ctx=ctx
+        self.mesh_bvh = None #triangle bvh, built on the first exact ray query
         self.vbo = self.get_vbo()
+        self.ibo = self.get_ibo()
         self.format: str = None
         self.attrib: list = None
     
@@ -37,12 +46,68 @@ class BaseVBO:
     def get_vbo(self):
         #instantiate the tringle in a vertex buffer in GPU
         vertex_data = self.get_vertex_data()
+        if self.indexed:
+            #shared corners only once, the vertex shader (and its shadow loop) runs once per vertex still in the cache
+            self.source_count = len(vertex_data)
+            vertex_data, self.index_data = index_vertices(vertex_data)
+        self.vertex_data = vertex_data #cpu copy, to know the shape of the mesh
         vbo = self.ctx.buffer(vertex_data)
         return vbo
+
+    def get_ibo(self):
+        if self.index_data is None:
+            return None
+        return self.ctx.buffer(np.ascontiguousarray(self.index_data))
+
+    @property
+    def index_size(self):
+        #bytes per index, given to the vertex arrays with the index buffer
+        return self.index_data.itemsize if self.index_data is not None else 4
+
+    def get_lod_count(self):
+        return len(self.lods) if self.lods != None else 1
+
+    def get_lod(self, level=0):
+        #(vertices, first) to draw for a level, past the coarsest one it stays the coarsest
+        if self.lods == None:
+            return (len(self.index_data) if self.index_data is not None else len(self.vertex_data)), 0
+        lod = self.lods[min(level, len(self.lods)-1)]
+        return lod['count'], lod['first']
+
+    def get_index_stats(self):
+        source_count = len(self.vertex_data) if self.source_count == None else self.source_count
+        return get_index_stats(source_count, self.vertex_data.reshape(len(self.vertex_data), -1), self.index_data)
+
+    def get_positions(self):
+        #(n,3) positions of the full triangle list, wherever in_position sits in the format
+        sizes = [int(elt[:-1]) for elt in self.format.split()]
+        start = sum(sizes[:self.attrib.index('in_position')])
+        size = sizes[self.attrib.index('in_position')]
+        positions = self.vertex_data.reshape(-1, sum(sizes))[:, start:start+size]
+        if self.index_data is not None:
+            count, first = self.get_lod(0)
+            positions = positions[self.index_data[first:first+count]]
+        return positions
+
+    def get_mesh_bvh(self):
+        #cached with the mesh, a reloaded mesh is a new vbo so it gets a new one
+        if self.mesh_bvh == None:
+            self.mesh_bvh = MeshBVH(self.get_positions())
+        return self.mesh_bvh
+
+    def get_bounds(self):
+        #[min corner, max corner] of the mesh, before the model matrix
+        positions = self.get_positions()
+        return np.array([positions.min(axis=0), positions.max(axis=0)], dtype='f4')
+
     def destroy(self):
         self.vbo.release()
+        if self.ibo != None:
+            self.ibo.release()
     
 class CubeVBO(BaseVBO):
+    indexed = True
+
     def __init__(self, ctx):
         data = self.get_vertex_data()
         super().__init__(ctx)
@@ -141,6 +206,8 @@ class LetterVBO(BaseVBO):
         return vertex_data
     
 class PyramidVBO(BaseVBO):
+    indexed = True
+
     def __init__(self, ctx):
         data = self.get_vertex_data()
         super().__init__(ctx)
@@ -188,39 +255,56 @@ class PyramidVBO(BaseVBO):
         return vertex_data
 
 class ObjectVBO(BaseVBO):
-    def __init__(self, ctx, link, vao):
+    #indexed when baked (mesh_bake.py), not here
+    def __init__(self, ctx, link, vao, buffer=None, header=None, vertices=None, index_buffer=None, indices=None):
         self.link = link
         self.vao = vao
+        self.buffer = buffer
+        self.header = header
+        self.vertices = vertices
+        self.index_buffer = index_buffer
+        self.index_data = indices
         self.scale = glm.vec3(0.0)
         super().__init__(ctx)
-        self.format = '2f 3f 3f'
-        self.attrib = ['in_texcoord', 'in_normales', 'in_position'] #herrrrreee all problems arise
+        self.format = self.header['format'] #'2f 3f 3f'
+        self.attrib = self.header['attrib'] #['in_texcoord', 'in_normales', 'in_position']
+        self.ranges = self.header['ranges'] #draw range (first, count) of every material
+        self.source_count = self.header['source_vertex_count']
+        self.lods = self.header['lods']
     
+    def get_vbo(self):
+        if self.buffer != None:
+            #uploaded in slices by the asset loader
+            self.vertex_data = self.vertices
+            return self.buffer
+        return super().get_vbo()
+
+    def get_ibo(self):
+        if self.index_buffer != None:
+            return self.index_buffer
+        return super().get_ibo()
+
     def get_vertex_data(self):
-        obj = Wavefront(self.link, parse=True, cache=True)
-        verts = []
-        n=0
-
-        #scale the object correctly
-        scale = [1.0,1.0,1.0]
-
-        for name, material in obj.materials.items():
-            # Contains the vertex format (string) such as "T2F_N3F_V3F"
-            # Contains the vertex list of floats in the format described above
-            if n<250: #we can only load one object for now
-                vert_axe = 0
-                for vert in material.vertices: #A right-hand coordinate system is used
-                    if scale[vert_axe%3]<abs(vert):
-                        scale[vert_axe%3] = abs(vert)
-
-                    vert_axe +=1
-                    verts.append(vert)
-            n+=1
-        verts = np.array(verts, dtype = 'f4')
-        self.vao.scales.append(glm.vec3(scale[0], scale[1], scale[2]))
-        return verts
+        #the baked mesh (mesh_bake.py) is memory mapped and goes to the gpu as it is, baked here first if it is older than the obj
+        baked = get_baked_path(self.link)
+        if not is_fresh(self.link, baked):
+            try:
+                bake(self.link, force=True)
+            except OSError:
+                #read only folder, parsed every time
+                vertices, self.index_data, ranges, source_count, lods = index_obj(self.link)
+                self.header = get_header(vertices, ranges, self.index_data, source_count, lods)
+                return vertices
+        self.header, vertices, self.index_data = read_mesh(baked)
+        return vertices
+
+    def get_bounds(self):
+        #written in the header, no scan of the vertices
+        return np.array(self.header['bounds'], dtype='f4')
     
 class LightVBO(BaseVBO):
+    indexed = True
+
     def __init__(self, ctx):
         self.scale = glm.vec3(0.0)
         super().__init__(ctx)
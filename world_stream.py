@@ -0,0 +1,240 @@
+import os
+import sys
+import math
+import argparse
+
+import numpy as np
+
+from scene_file import EXTENSION, write_columns, read_scene, load_scene_file, get_columns
+from texture_registry import TextureHandle
+
+WORLD_DIR = "saving_sys/world" #one scene file per chunk, the world is streamed when this folder exists
+CHUNK_SIZE = 32.0 #side of a chunk on the ground (x, z), chunks go up and down forever
+LOAD_RADIUS = 96.0 #chunks closer than this to the camera are loaded
+UNLOAD_MARGIN = 32.0 #and unloaded past the radius plus this, so walking on a border does not load and unload every frame
+MEMORY_CEILING = 512*1024*1024 #bytes of meshes and textures on the gpu before the farthest chunks go
+ACTIVATIONS = 1 #chunks read by the workers turned into models per frame at most
+
+def get_chunk_keys(positions, size=CHUNK_SIZE):
+    #(n, 3) positions -> (n, 2) chunk of each on the ground
+    return np.floor(np.asarray(positions)[:, [0,2]]/size).astype(np.int64)
+
+def get_chunk_path(directory, key):
+    return os.path.join(directory, f"{key[0]}_{key[1]}{EXTENSION}")
+
+def get_chunk_distance(key, position, size=CHUNK_SIZE):
+    #ground distance from position to the nearest point of the chunk
+    dx = max(key[0]*size-position[0], 0, position[0]-(key[0]+1)*size)
+    dz = max(key[1]*size-position[2], 0, position[2]-(key[1]+1)*size)
+    return math.hypot(dx, dz)
+
+def partition(path, directory, size=CHUNK_SIZE):
+    #a saved scene (.scene or .csv) split into one file per chunk, the folder WorldStreamer reads
+    columns, tables = load_scene_file(path)
+    os.makedirs(directory, exist_ok=True)
+    keys = get_chunk_keys(columns['position'], size)
+    chunks = np.unique(keys, axis=0) if len(keys) > 0 else []
+    for key in chunks:
+        mask = (keys == key).all(axis=1)
+        write_columns(get_chunk_path(directory, key), {name: column[mask] for name, column in columns.items()}, tables)
+    return len(chunks)
+
+class Chunk:
+    def __init__(self, key, path):
+        self.key = key
+        self.path = path
+        self.state = 'loading' #then 'active', a chunk that is not in WorldStreamer.chunks is on disk only
+        self.columns = None #read by a worker, waiting to be turned into models
+        self.tables = None
+        self.saved = None #(columns, tables) of the models as loaded, a chunk that did not change is not written back
+
+class WorldStreamer:
+    #the scene split in chunks on disk, the ones around the camera are read in the background and turned into models,
+    #the far ones are written back if they changed and their models removed, with their meshes and textures once unused
+    def __init__(self, app, directory=WORLD_DIR):
+        self.app = app
+        self.directory = directory
+        self.chunk_size = CHUNK_SIZE
+        self.load_radius = LOAD_RADIUS
+        self.unload_margin = UNLOAD_MARGIN
+        self.memory_ceiling = MEMORY_CEILING
+        self.chunks = {} #key -> Chunk, loading or active
+        self.stored = set(self.get_stored_keys()) #keys that have a file
+        self.radius_limit = float('inf') #lowered when the memory ceiling is hit, until the camera changes chunk
+        self.camera_key = None
+        self.loads = 0
+        self.unloads = 0
+        self.writes = 0
+
+    def get_stored_keys(self):
+        keys = []
+        for file in os.listdir(self.directory):
+            base, extension = os.path.splitext(file)
+            if extension == EXTENSION:
+                x, z = base.split('_')
+                keys.append((int(x), int(z)))
+        return keys
+
+    def get_path(self, key):
+        return get_chunk_path(self.directory, key)
+
+    def get_near_keys(self, position, radius):
+        reach = int(math.ceil(radius/self.chunk_size))
+        cx, cz = int(math.floor(position[0]/self.chunk_size)), int(math.floor(position[2]/self.chunk_size))
+        return [(x, z) for x in range(cx-reach, cx+reach+1) for z in range(cz-reach, cz+reach+1)
+                if get_chunk_distance((x, z), position, self.chunk_size) < radius]
+
+    def get_scene_keys(self):
+        #chunk of every scene model right now, they may have been moved since their chunk was loaded
+        entities = self.app.entities
+        return get_chunk_keys(entities.position[entities.get_scene_slots()], self.chunk_size)
+
+    def get_members(self, key, keys=None):
+        #scene models in the chunk, by slot so the order does not depend on the other chunks coming and going
+        keys = self.get_scene_keys() if keys is None else keys
+        objs = [self.app.scene[i] for i in np.flatnonzero((keys == key).all(axis=1))]
+        return sorted(objs, key=lambda obj: obj.slot)
+
+    #loading
+    def request(self, key):
+        if key in self.chunks:
+            return
+        chunk = self.chunks[key] = Chunk(key, self.get_path(key))
+        if key not in self.stored:
+            #nothing saved there yet, the models placed in it will be
+            chunk.state = 'active'
+            chunk.saved = get_columns([])
+            return
+        self.app.loader.load_file(read_scene, chunk.path, lambda result: self.on_read(chunk, result))
+
+    def on_read(self, chunk, result):
+        chunk.columns, chunk.tables = result
+
+    def activate(self, chunk):
+        #models of the chunk, all at once (BaseModel.instantiate)
+        from model import Cube
+        columns, tables = chunk.columns, chunk.tables
+        tex_ids = np.array(tables['textures'], dtype=object)[columns['texture']].tolist()
+        vao_names = np.array(tables['meshes'], dtype=object)[columns['mesh']].tolist()
+        names = np.array(tables['names'], dtype=object)[columns['name']].tolist()
+        objs = Cube.instantiate(self.app, columns['position'], columns['rotation'], columns['scale'], tex_ids, vao_names, names)
+        self.app.entities.add_many_to_scene(objs)
+        chunk.saved = get_columns(sorted(objs, key=lambda obj: obj.slot))
+        chunk.columns = chunk.tables = None
+        chunk.state = 'active'
+        self.loads += 1
+
+    #unloading
+    def store(self, chunk, objs):
+        #written back when its models changed (moved in or out, edited, added, destroyed)
+        columns, tables = get_columns(objs)
+        saved_columns, saved_tables = chunk.saved
+        if tables == saved_tables and all(np.array_equal(columns[name], saved_columns[name]) for name in columns):
+            return
+        if len(objs) == 0:
+            if os.path.exists(chunk.path):
+                os.remove(chunk.path)
+            self.stored.discard(chunk.key)
+        else:
+            write_columns(chunk.path, columns, tables)
+            self.stored.add(chunk.key)
+        chunk.saved = (columns, tables)
+        self.writes += 1
+
+    def unload(self, chunk, keys=None):
+        objs = self.get_members(chunk.key, keys)
+        self.store(chunk, objs)
+        self.chunks.pop(chunk.key)
+        tex_ids = set(obj.tex_id for obj in objs)
+        for obj in objs:
+            obj.destroy() #the mesh goes with its last model (MeshRegistry.release)
+        #and the textures nothing uses anymore, they are loaded again the next time they are bound
+        textures = self.app.mesh.texture.textures
+        for tex_id in tex_ids:
+            handle = textures.get(tex_id)
+            if tex_id not in self.app.entities.textures and isinstance(handle, TextureHandle) and not handle.pinned and not handle.pending:
+                handle.release()
+        self.unloads += 1
+
+    def get_resident_bytes(self):
+        #meshes streamed in and textures of the registry, what the memory ceiling is about
+        total = self.app.mesh.texture.registry.resident_bytes
+        for entry in self.app.mesh.vao.registry.entries.values():
+            if not entry.pending:
+                total += entry.vbo.vbo.size+(entry.vbo.ibo.size if entry.vbo.ibo != None else 0)
+        return total
+
+    #once per frame
+    def update(self):
+        position = self.app.camera.position
+        key = (int(math.floor(position[0]/self.chunk_size)), int(math.floor(position[2]/self.chunk_size)))
+        if key != self.camera_key:
+            self.camera_key = key
+            self.radius_limit = float('inf')
+        radius = min(self.load_radius, self.radius_limit)
+        for near in self.get_near_keys(position, radius):
+            self.request(near)
+
+        keys = self.get_scene_keys()
+        #models moved into a chunk that is not loaded: their chunk is loaded, so they can be saved with it
+        for orphan in set(map(tuple, keys.tolist()))-set(self.chunks):
+            self.request(orphan)
+
+        activated = 0
+        for chunk in list(self.chunks.values()):
+            if chunk.state != 'loading' or chunk.columns is None or activated == ACTIVATIONS:
+                continue
+            #read for nothing when the camera went away meanwhile, unless models were moved into it
+            if get_chunk_distance(chunk.key, position, self.chunk_size) > radius+self.unload_margin and not (keys == chunk.key).all(axis=1).any():
+                self.chunks.pop(chunk.key)
+                continue
+            self.activate(chunk)
+            activated += 1
+            keys = self.get_scene_keys()
+
+        #far chunks, then the farthest ones while over the memory ceiling (never the camera chunk)
+        active = sorted([chunk for chunk in self.chunks.values() if chunk.state == 'active'],
+                        key=lambda chunk: -get_chunk_distance(chunk.key, position, self.chunk_size))
+        for chunk in active:
+            distance = get_chunk_distance(chunk.key, position, self.chunk_size)
+            if distance > radius+self.unload_margin:
+                self.unload(chunk, keys)
+                keys = self.get_scene_keys()
+            elif chunk.key != self.camera_key and self.get_resident_bytes() > self.memory_ceiling:
+                self.radius_limit = distance
+                self.unload(chunk, keys)
+                keys = self.get_scene_keys()
+
+    def finish(self):
+        #blocks until every chunk requested so far is in the scene (start up, saving)
+        self.update()
+        while any(chunk.state == 'loading' for chunk in self.chunks.values()):
+            self.app.loader.finish()
+            for chunk in list(self.chunks.values()):
+                if chunk.state == 'loading' and chunk.columns is not None:
+                    self.activate(chunk)
+                elif chunk.state == 'loading':
+                    self.chunks.pop(chunk.key) #the read failed, the asset loader printed why
+
+    def save(self):
+        #every loaded chunk that changed, the others are already on disk
+        self.finish()
+        keys = self.get_scene_keys()
+        for chunk in list(self.chunks.values()):
+            self.store(chunk, self.get_members(chunk.key, keys))
+
+    def get_stats(self):
+        states = [chunk.state for chunk in self.chunks.values()]
+        return {'active': states.count('active'), 'loading': states.count('loading'), 'stored': len(self.stored),
+                'loads': self.loads, 'unloads': self.unloads, 'writes': self.writes,
+                'objects': len(self.app.scene), 'resident_bytes': self.get_resident_bytes(),
+                'memory_ceiling': self.memory_ceiling, 'radius': min(self.load_radius, self.radius_limit)}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="split a saved scene into the chunk files of a streamed world")
+    parser.add_argument('scene', nargs='?', default="saving_sys/saved_scene.scene")
+    parser.add_argument('directory', nargs='?', default=WORLD_DIR)
+    args = parser.parse_args()
+    if not os.path.exists(args.scene):
+        sys.exit(f"missing: {args.scene}")
+    print(f"{partition(args.scene, args.directory)} chunks written to {args.directory}")